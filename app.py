@@ -1,15 +1,44 @@
+import io
 import streamlit as st
 from datetime import date, timedelta
-from pipeline import run_analysis
+from export import FORMATS, write_table
+from pipeline import prepare_daily
+from indicators import compute_kpis
+from plotting import render_png
+from report_builder import render_markdown
 from data_fetch import list_cities, list_sensors_in_city
 
+class _FetchFailed(Exception):
+    """An error result, raised inside a cached function because st.cache_data never caches exceptions."""
+
+def _ok(result):
+    value, err = result
+    if err:
+        raise _FetchFailed(err)
+    return value
+
+def _call(cached_fn, *args):
+    """(value, err) of a cached call: successes are shared, errors are retried on the next run."""
+    try:
+        return cached_fn(*args), None
+    except _FetchFailed as e:
+        return None, str(e)
+
 @st.cache_data(ttl=3600)
 def _cities_cached(iso, param):
-    return list_cities(iso, param)
+    return _ok(list_cities(iso, param))
 
 @st.cache_data(ttl=3600)
 def _sensors_cached(iso, city, param):
-    return list_sensors_in_city(iso, city, param)
+    return _ok(list_sensors_in_city(iso, city, param))
+
+# Keyed by every input that changes the data (sensor selection included) and shared by
+# all sessions. Overlapping date ranges still reuse per-sensor days from the on-disk
+# sensor cache, so a new range only fetches the days it adds. Errors (network, 429,
+# missing key) are not cached, see _ok.
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def _daily_cached(city, country, param, start, end, sensor_ids):
+    return _ok(prepare_daily(city, country, param, start, end, list(sensor_ids)))
 
 st.set_page_config(page_title="AI Environmental Report", page_icon="🌍", layout="wide")
 st.title("🌍 AI Environmental Report Generator (OpenAQ)")
@@ -22,7 +51,7 @@ with st.sidebar:
     param = st.selectbox("Pollutant", ["pm25","pm10","no2","o3","so2","co"], index=0)
 
     # City picker
-    city_opts, c_err = _cities_cached(country, param)
+    city_opts, c_err = _call(_cities_cached, country, param)
     if c_err:
         st.warning(c_err)
         city = st.text_input("City (free text)", value="New Delhi")
@@ -33,7 +62,7 @@ with st.sidebar:
     show_sensors = st.checkbox("Pick specific sensors (optional)")
     selected_sensor_ids = []
     if show_sensors and city:
-        sensors, s_err = _sensors_cached(country, city, param)
+        sensors, s_err = _call(_sensors_cached, country, city, param)
         if s_err:
             st.warning(s_err)
         else:
@@ -54,21 +83,16 @@ with st.sidebar:
 def _dstr(d): return d.strftime("%Y-%m-%d")
 
 if run_btn:
+    city, country = city.strip(), (country.strip() or None)
     with st.spinner("Fetching & analyzing…"):
-        res = run_analysis(
-            city=city.strip(),
-            country=(country.strip() or None),
-            param=param,
-            start=_dstr(start),
-            end=_dstr(end),
-            who_thr=float(who),
-            report_name=report_name
-        )
-
-    if not res or "error" in res:
-        st.warning(res.get("error", "No data returned. Try another city/parameter/date range."))
+        daily, err = _call(_daily_cached, city, country, param, _dstr(start), _dstr(end),
+                           tuple(sorted(selected_sensor_ids)))
+
+    if err:
+        st.warning(err)
     else:
-        k = res["kpis"]
+        # KPI tiles first; charts and the brief fill in below as they are rendered
+        k = compute_kpis(daily, float(who))
         c1, c2, c3, c4 = st.columns(4)
         c1.metric("Days", k["days_total"])
         c2.metric("Exceedance Days", k["days_exceed"], f'{k["exceed_pct"]}%')
@@ -77,18 +101,29 @@ if run_btn:
 
         st.subheader("Charts")
         colA, colB = st.columns(2)
-        with colA: st.pyplot(res["ts_fig"], use_container_width=True)
-        with colB: st.pyplot(res["roll_fig"], use_container_width=True)
+        # render_png keeps an LRU of chart bytes keyed on the plotted data
+        with colA: st.image(render_png("timeseries", daily, f"{city} — {param.upper()} Daily Mean",
+                                       who_guideline=float(who)), use_column_width=True)
+        with colB: st.image(render_png("rolling", daily, f"{city} — {param.upper()} 30-day Rolling Mean",
+                                       window=30), use_column_width=True)
 
         with st.expander("Daily data (download)"):
-            st.dataframe(res["daily"], use_container_width=True)
-            csv = res["daily"].to_csv(index=False).encode("utf-8")
-            st.download_button("Download CSV", csv, file_name=f"{report_name}_daily.csv", mime="text/csv")
-
+            st.dataframe(daily, use_container_width=True)
+            fmt = st.radio("Format", ["parquet", "arrow", "csv"], horizontal=True,
+                           help="Parquet / Arrow keep dtypes and are compressed (need pyarrow)")
+            # the download widget takes the whole file as bytes; the table itself is written chunk by chunk
+            buf = io.BytesIO()
+            write_table(daily, buf, fmt)
+            st.download_button(f"Download {fmt.capitalize()}", buf.getvalue(), file_name=f"{report_name}_daily{FORMATS[fmt][0]}",
+                               mime={"csv": "text/csv", "parquet": "application/vnd.apache.parquet",
+                                     "arrow": "application/vnd.apache.arrow.file"}[fmt])
+
+        report_md = render_markdown(city, param, _dstr(start), _dstr(end), k, float(who), report_name,
+                                    window=30, include_images=False)
         st.subheader("AI-Generated Brief")
-        st.markdown(res["report_md"])
+        st.markdown(report_md)
 
-        md_bytes = res["report_md"].encode("utf-8")
+        md_bytes = report_md.encode("utf-8")
         st.download_button("Download Markdown Report", md_bytes, file_name=f"{report_name}.md", mime="text/markdown")
 else:
     st.info("Set your inputs in the sidebar and click **Generate**.")
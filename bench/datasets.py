@@ -0,0 +1,189 @@
+# bench/datasets.py
+import glob
+import json
+import os
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+PARAMETERS = [("pm25", 2), ("pm10", 1), ("no2", 5)]
+
+class SyntheticDataset:
+    """
+    Deterministic OpenAQ-shaped data generated on demand, so 10 years × hundreds of
+    sensors costs no memory until a slice is asked for. Each location carries one
+    sensor per parameter in PARAMETERS (sensor id = location id * 10 + slot).
+    Daily values are a seasonal cycle plus per-sensor noise, with ~3% of days missing.
+    """
+
+    def __init__(self, n_locations: int = 100, start: str = "2015-01-01", days: int = 3650,
+                 country: str = "SA", cities=("Riyadh", "Jeddah", "Dammam"), seed: int = 7):
+        self.n_locations = n_locations
+        self.start = date.fromisoformat(start)
+        self.days = days
+        self.country = country
+        self.cities = list(cities)
+        self.seed = seed
+        self._locations: Optional[List[Dict[str, Any]]] = None
+
+    def locations(self) -> List[Dict[str, Any]]:
+        if self._locations is None:
+            self._locations = self._build_locations()
+        return self._locations
+
+    def _build_locations(self) -> List[Dict[str, Any]]:
+        rng = np.random.default_rng(self.seed)
+        lat = rng.uniform(16.0, 31.0, self.n_locations)
+        lon = rng.uniform(36.0, 55.0, self.n_locations)
+        out = []
+        for i in range(self.n_locations):
+            city = self.cities[i % len(self.cities)]
+            out.append({
+                "id": i + 1,
+                "name": f"{city} station {i + 1}",
+                "locality": city,
+                "timezone": "Asia/Riyadh",
+                "country": {"id": 1, "code": self.country, "name": self.country},
+                "coordinates": {"latitude": round(float(lat[i]), 5), "longitude": round(float(lon[i]), 5)},
+                "sensors": [
+                    {"id": (i + 1) * 10 + slot, "name": f"{p} µg/m³",
+                     "parameter": {"id": pid, "name": p, "units": "µg/m³", "displayName": p.upper()}}
+                    for slot, (p, pid) in enumerate(PARAMETERS)
+                ],
+            })
+        return out
+
+    def sensors(self, location_id: int) -> List[Dict[str, Any]]:
+        loc = next((l for l in self.locations() if l["id"] == location_id), None)
+        if loc is None:
+            return []
+        return [dict(s, location={"id": location_id}) for s in loc["sensors"]]
+
+    def values(self, sensor_id: int, first: date, last: date):
+        """(days, values) for one sensor over [first, last], clipped to the dataset span."""
+        lo = max(first, self.start)
+        hi = min(last, self.start + timedelta(days=self.days - 1))
+        if hi < lo:
+            return [], np.empty(0)
+        offset = (lo - self.start).days
+        n = (hi - lo).days + 1
+        t = np.arange(offset, offset + n)
+        rng = np.random.default_rng((self.seed, sensor_id))
+        noise = rng.gamma(2.0, 4.0, self.days)[offset:offset + n]
+        missing = rng.random(self.days)[offset:offset + n] < 0.03
+        vals = 12.0 + 8.0 * np.sin(2 * np.pi * t / 365.25) + (sensor_id % 13) + noise
+        days = [lo + timedelta(days=int(k)) for k in range(n)]
+        keep = ~missing
+        return [d for d, k in zip(days, keep) if k], vals[keep]
+
+    def days_results(self, sensor_id: int, first: date, last: date) -> List[Dict[str, Any]]:
+        """/sensors/{id}/days `results` entries for [first, last]."""
+        slot = sensor_id % 10
+        if slot >= len(PARAMETERS):
+            return []
+        p, pid = PARAMETERS[slot]
+        days, vals = self.values(sensor_id, first, last)
+        return [{
+            "value": round(float(v), 2),
+            "parameter": {"id": pid, "name": p, "units": "µg/m³"},
+            "period": {
+                "label": "1 day", "interval": "24:00:00",
+                "datetimeFrom": {"utc": f"{d.isoformat()}T00:00:00Z", "local": f"{d.isoformat()}T03:00:00+03:00"},
+                "datetimeTo": {"utc": f"{(d + timedelta(days=1)).isoformat()}T00:00:00Z",
+                               "local": f"{(d + timedelta(days=1)).isoformat()}T03:00:00+03:00"},
+            },
+        } for d, v in zip(days, vals)]
+
+    def hours_results(self, sensor_id: int, first: date, last: date) -> List[Dict[str, Any]]:
+        """
+        /sensors/{id}/hours `results` for [first, last]: each day's value plus a diurnal
+        swing, with ~10% of hours missing and ~5% of days cut to a few hours.
+        """
+        slot = sensor_id % 10
+        if slot >= len(PARAMETERS):
+            return []
+        p, pid = PARAMETERS[slot]
+        days, vals = self.values(sensor_id, first, last)
+        if not len(days):
+            return []
+        rng = np.random.default_rng((self.seed, sensor_id, 24))
+        hours = np.arange(24)
+        swing = 4.0 * np.sin(2 * np.pi * (hours - 8) / 24)
+        out = []
+        for d, v in zip(days, vals):
+            keep = rng.random(24) >= 0.1
+            if rng.random() < 0.05:
+                keep[6:] = False
+            hv = v + swing + rng.normal(0.0, 1.5, 24)
+            for h in hours[keep]:
+                start = f"{d.isoformat()}T{h:02d}:00:00Z"
+                end = f"{d.isoformat()}T{h + 1:02d}:00:00Z" if h < 23 else f"{(d + timedelta(days=1)).isoformat()}T00:00:00Z"
+                out.append({
+                    "value": round(float(hv[h]), 2),
+                    "parameter": {"id": pid, "name": p, "units": "µg/m³"},
+                    "period": {"label": "1hour", "interval": "01:00:00",
+                               "datetimeFrom": {"utc": start}, "datetimeTo": {"utc": end}},
+                })
+        return out
+
+class RecordedDataset:
+    """
+    Fixtures captured from the real API, laid out as
+    <dir>/locations.json (the /locations `results` list) and
+    <dir>/days/<sensor_id>.json (the /sensors/{id}/days `results` list, any range),
+    optionally <dir>/hours/<sensor_id>.json (the /sensors/{id}/hours `results` list).
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "locations.json"), encoding="utf-8") as f:
+            self._locations = json.load(f)
+        self._days = self._load(path, "days")
+        self._hours = self._load(path, "hours")
+
+    @staticmethod
+    def _load(path: str, kind: str) -> Dict[int, List[Dict[str, Any]]]:
+        out = {}
+        for fp in glob.glob(os.path.join(path, kind, "*.json")):
+            with open(fp, encoding="utf-8") as f:
+                out[int(os.path.splitext(os.path.basename(fp))[0])] = json.load(f)
+        return out
+
+    def locations(self) -> List[Dict[str, Any]]:
+        return self._locations
+
+    def sensors(self, location_id: int) -> List[Dict[str, Any]]:
+        loc = next((l for l in self._locations if l.get("id") == location_id), None)
+        return [] if loc is None else [dict(s, location={"id": location_id}) for s in loc.get("sensors") or []]
+
+    def days_results(self, sensor_id: int, first: date, last: date) -> List[Dict[str, Any]]:
+        return self._between(self._days.get(sensor_id, []), first, last)
+
+    def hours_results(self, sensor_id: int, first: date, last: date) -> List[Dict[str, Any]]:
+        return self._between(self._hours.get(sensor_id, []), first, last)
+
+    @staticmethod
+    def _between(results: List[Dict[str, Any]], first: date, last: date) -> List[Dict[str, Any]]:
+        lo, hi = first.isoformat(), (last + timedelta(days=1)).isoformat()
+        return [r for r in results
+                if lo <= ((r.get("period") or {}).get("datetimeFrom") or {}).get("utc", "")[:10] < hi]
+
+def synthetic_readings(n_sensors: int = 300, days: int = 3650, start: str = "2015-01-01",
+                       seed: Optional[int] = 7) -> pd.DataFrame:
+    """
+    Long frame shaped like fetch_city_parameter_daily's output, built fully in memory,
+    for benchmarking the aggregation / KPI / plotting stages without any HTTP.
+    """
+    rng = np.random.default_rng(seed)
+    dt = pd.date_range(start, periods=days, freq="D", tz="UTC")
+    t = np.arange(days)
+    base = 12.0 + 8.0 * np.sin(2 * np.pi * t / 365.25)
+    values = (base[None, :] + rng.gamma(2.0, 4.0, (n_sensors, days))).ravel()
+    df = pd.DataFrame({
+        "datetime": np.tile(dt, n_sensors),
+        "value": values.astype("float32"),
+        "unit": pd.Categorical(["µg/m³"] * (n_sensors * days)),
+        "sensor_id": np.repeat(np.arange(1, n_sensors + 1, dtype="int32"), days),
+    })
+    return df[rng.random(len(df)) >= 0.03].reset_index(drop=True)
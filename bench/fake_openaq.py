@@ -0,0 +1,176 @@
+# bench/fake_openaq.py
+"""
+Local stand-in for the OpenAQ v3 API, enough for everything data_fetch calls:
+
+    GET /v3/locations?iso=XX&limit=&page=
+    GET /v3/locations/{id}/sensors
+    GET /v3/sensors/{id}/days?datetime_from=&datetime_to=&limit=&page=
+    GET /v3/sensors/{id}/hours (and /measurements, served the same hourly data)
+
+Run it standalone and point the app or CLI at it:
+
+    python -m bench.fake_openaq --port 8765 --latency 0.05
+    OPENAQ_API_BASE=http://127.0.0.1:8765/v3 OPENAQ_API_KEY=bench python main.py
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from collections import Counter
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from bench.datasets import RecordedDataset, SyntheticDataset
+
+class FakeOpenAQ:
+    """
+    Threaded fake server around a SyntheticDataset or RecordedDataset.
+
+    latency:        seconds slept before every response
+    max_page_size:  server-side cap on ?limit= (the real API caps at 1000)
+    rate_limit_every: every Nth request gets a 429 with Retry-After (0 = never)
+    fail_every:     every Nth request gets a 503 without Retry-After (0 = never)
+    """
+
+    def __init__(self, dataset=None, host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0, max_page_size: int = 1000, rate_limit_every: int = 0,
+                 fail_every: int = 0):
+        self.dataset = dataset or SyntheticDataset()
+        self.latency = latency
+        self.max_page_size = max_page_size
+        self.rate_limit_every = rate_limit_every
+        self.fail_every = fail_every
+        self.requests = Counter()       # endpoint → count
+        self.statuses = Counter()       # status code → count
+        self._n = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v3"
+
+    def start(self) -> "FakeOpenAQ":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "FakeOpenAQ":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def reset_counters(self) -> None:
+        with self._lock:
+            self.requests.clear()
+            self.statuses.clear()
+            self._n = 0
+
+    # ---- routing ----
+    def _route(self, path: str, q: dict):
+        """(status, body, endpoint label) for one GET."""
+        limit = min(int(q.get("limit", 100)), self.max_page_size)
+        page = max(int(q.get("page", 1)), 1)
+
+        if path == "/v3/locations":
+            results = self.dataset.locations()
+            if q.get("iso"):
+                results = [l for l in results if (l.get("country") or {}).get("code") == q["iso"]]
+            return 200, _page(results, limit, page), "/locations"
+
+        m = re.fullmatch(r"/v3/locations/(\d+)/sensors", path)
+        if m:
+            results = self.dataset.sensors(int(m.group(1)))
+            return (200 if results else 404), _page(results, limit, page), "/locations/{id}/sensors"
+
+        m = re.fullmatch(r"/v3/sensors/(\d+)/days", path)
+        if m:
+            first = date.fromisoformat(q.get("datetime_from", "2000-01-01")[:10])
+            last = date.fromisoformat(q.get("datetime_to", date.today().isoformat())[:10])
+            results = self.dataset.days_results(int(m.group(1)), first, last)
+            return 200, _page(results, limit, page), "/sensors/{id}/days"
+
+        m = re.fullmatch(r"/v3/sensors/(\d+)/(hours|measurements)", path)
+        if m:
+            first = date.fromisoformat(q.get("datetime_from", "2000-01-01")[:10])
+            last = date.fromisoformat(q.get("datetime_to", date.today().isoformat())[:10])
+            results = self.dataset.hours_results(int(m.group(1)), first, last)
+            return 200, _page(results, limit, page), f"/sensors/{{id}}/{m.group(2)}"
+
+        return 404, {"detail": "Not Found"}, "other"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                url = urlparse(self.path)
+                q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                with server._lock:
+                    server._n += 1
+                    throttled = server.rate_limit_every and server._n % server.rate_limit_every == 0
+                    failed = server.fail_every and server._n % server.fail_every == 0
+                if throttled:
+                    status, body, endpoint = 429, {"detail": "Too Many Requests"}, "throttled"
+                elif failed:
+                    status, body, endpoint = 503, {"detail": "Service Unavailable"}, "failed"
+                else:
+                    status, body, endpoint = server._route(url.path, q)
+                with server._lock:
+                    server.requests[endpoint] += 1
+                    server.statuses[status] += 1
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.send_header("x-ratelimit-limit", "60")
+                self.send_header("x-ratelimit-remaining", "59")
+                self.send_header("x-ratelimit-reset", "60")
+                if status == 429:
+                    self.send_header("Retry-After", "1")
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+def _page(results: list, limit: int, page: int) -> dict:
+    chunk = results[(page - 1) * limit: page * limit]
+    return {"meta": {"name": "openaq-api", "page": page, "limit": limit, "found": len(results)},
+            "results": chunk}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Serve a fake OpenAQ v3 API")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds per response")
+    ap.add_argument("--page-size", type=int, default=1000, help="max results per page")
+    ap.add_argument("--rate-limit-every", type=int, default=0, help="429 every Nth request")
+    ap.add_argument("--fail-every", type=int, default=0, help="503 every Nth request")
+    ap.add_argument("--locations", type=int, default=100, help="synthetic locations")
+    ap.add_argument("--days", type=int, default=3650, help="synthetic days per sensor")
+    ap.add_argument("--fixtures", help="directory of recorded fixtures instead of synthetic data")
+    args = ap.parse_args()
+    ds = RecordedDataset(args.fixtures) if args.fixtures else SyntheticDataset(args.locations, days=args.days)
+    srv = FakeOpenAQ(ds, port=args.port, latency=args.latency,
+                     max_page_size=args.page_size, rate_limit_every=args.rate_limit_every,
+                     fail_every=args.fail_every)
+    print(f"Fake OpenAQ on {srv.base_url}  (Ctrl+C to stop)")
+    try:
+        srv.httpd.serve_forever()
+    except KeyboardInterrupt:
+        srv.stop()
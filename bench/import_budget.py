@@ -0,0 +1,61 @@
+# bench/import_budget.py
+"""
+Import-time budget for the fast paths (cron / health-check callers of main.py --kpis).
+
+    python -m bench.import_budget            # exit 1 if a budget is blown
+
+Each entry point is imported in a fresh interpreter with -X importtime. It fails when
+the cumulative import time is over its budget or when it pulls in a module it must
+not load (matplotlib, jinja2, dotenv, streamlit are only for charts, reports, the
+API key and the app).
+"""
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# module → (budget in seconds, modules it must not import)
+BUDGETS = {
+    "main": (1.0, ("matplotlib", "jinja2", "dotenv", "streamlit")),
+    "pipeline": (1.0, ("matplotlib", "jinja2", "dotenv", "streamlit")),
+    "data_fetch": (1.0, ("matplotlib", "jinja2", "dotenv", "streamlit")),
+    "indicators": (0.8, ("matplotlib", "jinja2", "dotenv", "requests")),
+}
+
+def import_profile(module: str) -> dict:
+    """{imported module: cumulative microseconds} for `import module` in a fresh interpreter."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, capture_output=True, text=True, env=dict(os.environ, PYTHONPATH=str(ROOT)))
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    out = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        try:
+            out[name.strip()] = int(cumulative)
+        except ValueError:          # the header line
+            continue
+    return out
+
+def check(repeats: int = 3) -> bool:
+    ok = True
+    for module, (budget, forbidden) in BUDGETS.items():
+        # best of a few runs, so a cold disk cache does not fail the check
+        profiles = [import_profile(module) for _ in range(repeats)]
+        seconds = min(p.get(module, 0) for p in profiles) / 1e6
+        loaded = sorted({m.split(".")[0] for m in profiles[0]} & set(forbidden))
+        flag = "" if seconds <= budget and not loaded else "  OVER BUDGET"
+        ok = ok and not flag
+        print(f"{module:<12} {seconds * 1000:7.1f} ms  (budget {budget * 1000:.0f} ms)"
+              + (f"  loads {', '.join(loaded)}" if loaded else "") + flag)
+    return ok
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Check import-time budgets")
+    ap.add_argument("--repeats", type=int, default=3)
+    sys.exit(0 if check(ap.parse_args().repeats) else 1)
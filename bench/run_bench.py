@@ -0,0 +1,165 @@
+# bench/run_bench.py
+"""
+Offline benchmarks for the report pipeline, run against bench.fake_openaq.
+
+    python -m bench.run_bench                      # full sizes, writes bench/results/<commit>.json
+    python -m bench.run_bench --quick --only compute_kpis  # smaller data, one benchmark
+    python -m bench.run_bench --compare bench/results/<older>.json
+
+--compare prints new/old timing ratios and exits 1 if any benchmark got slower
+than --tolerance allows.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from bench.datasets import SyntheticDataset, synthetic_readings
+from bench.fake_openaq import FakeOpenAQ
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def _timeit(fn, repeats: int, setup=None) -> dict:
+    times = []
+    for _ in range(repeats):
+        if setup:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return {"median_s": statistics.median(times), "min_s": min(times), "repeats": repeats}
+
+def run(quick: bool = False, only=None, latency: float = 0.02) -> dict:
+    sizes = dict(locations=30, sensors=50, days=730, repeats=3) if quick else \
+            dict(locations=150, sensors=300, days=3650, repeats=5)
+    tmp = tempfile.mkdtemp(prefix="envreport-bench-")
+    dataset = SyntheticDataset(sizes["locations"], start="2015-01-01", days=sizes["days"])
+    server = FakeOpenAQ(dataset, latency=latency).start()
+
+    # data_fetch reads these on first use (set before any request)
+    os.environ.update(OPENAQ_API_BASE=server.base_url, OPENAQ_API_KEY="bench", OPENAQ_RATE_PER_MIN="100000",
+                      OPENAQ_CACHE_PATH=os.path.join(tmp, "openaq.sqlite"))
+    import data_fetch, sensor_cache, plotting, pipeline
+    from indicators import daily_agg, cross_sensor_daily, compute_kpis, compute_kpis_many
+    from report_builder import render_markdown
+
+    start = dataset.start.isoformat()
+    end = (dataset.start + timedelta(days=sizes["days"] - 1)).isoformat()
+    readings = synthetic_readings(sizes["sensors"], sizes["days"])
+    daily = cross_sensor_daily(readings)
+    kpis = compute_kpis(daily, 15.0)
+    # one series per sensor, as a country-wide leaderboard would see them
+    per_sensor = readings.pivot(index="datetime", columns="sensor_id", values="value")
+    from rollups import RollupCube
+    cube = RollupCube(thresholds=(15.0,))
+    cube.update("city", daily)
+    from kpi_state import KpiState
+    kpi_saved = KpiState.from_daily(daily.iloc[:-1], 15.0).to_dict()   # last refresh's state, one day behind
+    q_start = (dataset.start + timedelta(days=40)).isoformat()   # mid-month edges at both ends
+    q_end = (dataset.start + timedelta(days=sizes["days"] - 40)).isoformat()
+
+    def _cold():
+        data_fetch._catalogs.clear()
+        sensor_cache._default = sensor_cache.SensorDayCache(
+            os.path.join(tempfile.mkdtemp(dir=tmp), "openaq.sqlite"))
+
+    def _fetch():
+        df, err = data_fetch.fetch_city_parameter_daily("SA", "Riyadh", "pm25", start, end)
+        assert err is None, err
+
+    def _fetch_hourly():
+        df, err = data_fetch.fetch_city_parameter_hourly("SA", "Riyadh", "pm25", start, end, max_sensors=2)
+        assert err is None, err
+
+    benches = {
+        "fetch_city_cold": (_fetch, _cold),
+        "fetch_city_warm": (_fetch, None),
+        "fetch_city_hourly": (_fetch_hourly, None),
+        "daily_agg": (lambda: daily_agg(readings), None),
+        "cross_sensor_daily": (lambda: cross_sensor_daily(readings), None),
+        "compute_kpis": (lambda: compute_kpis(daily, 15.0), None),
+        "kpi_state_update": (lambda: KpiState.from_dict(kpi_saved).update(daily.iloc[-1:]), None),
+        "rollup_kpis": (lambda: cube.kpis("city", q_start, q_end, 15.0, daily=daily), None),
+        "compute_kpis_many": (lambda: compute_kpis_many(per_sensor, 15.0), None),
+        "plot_timeseries": (lambda: plotting.plot_timeseries(daily, 15.0, "bench", os.path.join(tmp, "ts.png")),
+                            plotting._png_cache.clear),
+        "plot_rolling": (lambda: plotting.plot_rolling(daily, 30, "bench", os.path.join(tmp, "roll.png")),
+                         plotting._png_cache.clear),
+        "render_markdown": (lambda: render_markdown("Riyadh", "pm25", start, end, kpis, 15.0, "bench"), None),
+        "run_analysis": (lambda: pipeline.run_analysis("Riyadh", "SA", "pm25", start, end, 15.0, "bench"), None),
+    }
+    results = {}
+    try:
+        for name, (fn, setup) in benches.items():
+            if only and name not in only:
+                continue
+            server.reset_counters()
+            res = _timeit(fn, sizes["repeats"], setup)
+            res["http_requests"] = dict(server.requests)
+            results[name] = res
+            print(f"{name:<20} median {res['median_s'] * 1000:9.1f} ms   min {res['min_s'] * 1000:9.1f} ms"
+                  + (f"   http {sum(server.requests.values()) / sizes['repeats']:.0f}/run" if server.requests else ""))
+    finally:
+        server.stop()
+
+    return {
+        "commit": _commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "quick": quick,
+        "latency_s": latency,
+        "sizes": sizes,
+        "results": results,
+    }
+
+def compare(new: dict, old: dict, tolerance: float) -> bool:
+    """Print new/old median ratios; True when nothing regressed beyond tolerance."""
+    ok = True
+    print(f"\n{'benchmark':<20} {'old ms':>10} {'new ms':>10} {'ratio':>7}   (old: {old.get('commit')})")
+    for name, res in new["results"].items():
+        if name not in old.get("results", {}):
+            continue
+        o, n = old["results"][name]["median_s"], res["median_s"]
+        ratio = n / o if o else float("inf")
+        flag = "  REGRESSION" if ratio > 1 + tolerance else ""
+        ok = ok and not flag
+        print(f"{name:<20} {o * 1000:10.1f} {n * 1000:10.1f} {ratio:7.2f}{flag}")
+    return ok
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Offline pipeline benchmarks")
+    ap.add_argument("--quick", action="store_true", help="small dataset, fewer repeats")
+    ap.add_argument("--only", nargs="*", help="benchmark names to run")
+    ap.add_argument("--latency", type=float, default=0.02, help="fake server seconds per response")
+    ap.add_argument("--compare", metavar="JSON", help="earlier results file to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before flagging (0.2 = 20%%)")
+    ap.add_argument("--out", help="results path (default: bench/results/<commit>.json)")
+    args = ap.parse_args(argv)
+
+    out = run(quick=args.quick, only=args.only, latency=args.latency)
+    path = Path(args.out) if args.out else RESULTS_DIR / f"{out['commit']}{'-quick' if args.quick else ''}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(out, indent=2))
+    print(f"\nResults → {path}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            return 0 if compare(out, json.load(f), args.tolerance) else 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
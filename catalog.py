@@ -0,0 +1,132 @@
+# catalog.py
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from spatial import GridIndex, haversine_km, spread
+
+def coordinates(loc: Dict[str, Any]) -> Tuple[Optional[float], Optional[float]]:
+    """(latitude, longitude) of a location payload, (None, None) when missing."""
+    c = loc.get("coordinates") or {}
+    lat, lon = c.get("latitude"), c.get("longitude")
+    if lat is None or lon is None:
+        return None, None
+    return float(lat), float(lon)
+
+def _param_names(loc: Dict[str, Any]) -> List[str]:
+    return [(s.get("parameter") or {}).get("name") for s in (loc.get("sensors") or [])]
+
+class LocationsCatalog:
+    """
+    In-memory index over one country's /v3/locations payload (sensors are embedded
+    in each location). Lookups keep the API order of locations, so results match
+    what the old filter-the-whole-response loops returned. Locations with coordinates
+    also go into a GridIndex for nearest / radius queries (built on first use).
+    """
+
+    def __init__(self, locations: List[Dict[str, Any]]):
+        self.locations = locations
+        self.by_parameter: Dict[str, List[int]] = {}
+        self.by_sensor: Dict[int, int] = {}
+        # "locality\nname", lower-cased, for substring matching on either field
+        self._haystack: List[str] = []
+        for i, loc in enumerate(locations):
+            locality = (loc.get("locality") or "").strip()
+            for p in dict.fromkeys(_param_names(loc)):
+                self.by_parameter.setdefault(p, []).append(i)
+            for s in loc.get("sensors") or []:
+                self.by_sensor[s.get("id")] = i
+            self._haystack.append(f"{locality}\n{loc.get('name') or ''}".lower())
+        self._grid: Optional[GridIndex] = None
+
+    def __len__(self) -> int:
+        return len(self.locations)
+
+    def cities(self, parameter_name: str) -> List[str]:
+        """Sorted locality names (falling back to location name) having parameter sensors."""
+        names = set()
+        for i in self.by_parameter.get(parameter_name, []):
+            loc = self.locations[i]
+            nm = (loc.get("locality") or loc.get("name") or "").strip()
+            if nm:
+                names.add(nm)
+        return sorted(names)
+
+    def match(self, city_like: str, parameter_name: str) -> List[Dict[str, Any]]:
+        """Locations whose locality or name contains city_like and that measure parameter_name."""
+        needle = (city_like or "").lower()
+        return [self.locations[i] for i in self.by_parameter.get(parameter_name, [])
+                if needle in self._haystack[i]]
+
+    def location_of(self, sensor_id: int) -> Optional[Dict[str, Any]]:
+        """The location a sensor belongs to, or None if it is not in this catalog."""
+        i = self.by_sensor.get(sensor_id)
+        return None if i is None else self.locations[i]
+
+    # ---- spatial ----
+    @property
+    def grid(self) -> GridIndex:
+        if self._grid is None:
+            rows = [(i, *coordinates(loc)) for i, loc in enumerate(self.locations)]
+            rows = [r for r in rows if r[1] is not None]
+            self._grid = GridIndex([r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows])
+        return self._grid
+
+    def _with_parameter(self, hits, parameter_name: Optional[str]):
+        if parameter_name is None:
+            return hits
+        wanted = set(self.by_parameter.get(parameter_name, []))
+        return [(i, d) for i, d in hits if i in wanted]
+
+    def within(self, lat: float, lon: float, radius_km: float,
+               parameter_name: Optional[str] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """(location, distance_km) within radius_km of a point, nearest first."""
+        hits = self._with_parameter(self.grid.within(lat, lon, radius_km), parameter_name)
+        return [(self.locations[i], d) for i, d in hits]
+
+    def nearest(self, lat: float, lon: float, n: int, parameter_name: Optional[str] = None,
+                max_km: Optional[float] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """The n locations nearest a point (measuring parameter_name, if given), nearest first."""
+        if parameter_name is None:
+            hits = self.grid.nearest(lat, lon, n, max_km)
+        else:
+            # grow n until enough of the nearest measure the parameter (or the grid runs out)
+            k = n
+            while True:
+                raw = self.grid.nearest(lat, lon, k, max_km)
+                hits = self._with_parameter(raw, parameter_name)
+                if len(hits) >= n or len(raw) < k:
+                    break
+                k *= 4
+        return [(self.locations[i], d) for i, d in hits[:n]]
+
+    @staticmethod
+    def spread(locations: List[Dict[str, Any]], k: Optional[int] = None,
+               start: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Reorder locations so the first k cover their area as evenly as possible: start
+        at locations[start] (default: the one nearest their centroid), then repeatedly take
+        the one farthest from all taken so far. The rest keep their order; locations
+        without coordinates go last.
+        """
+        located = [(loc, *coordinates(loc)) for loc in locations]
+        with_xy = [r for r in located if r[1] is not None]
+        if not with_xy:
+            return list(locations)
+        lats = np.array([r[1] for r in with_xy])
+        lons = np.array([r[2] for r in with_xy])
+        if start is None or located[start][1] is None:
+            start = int(np.argmin(haversine_km(float(lats.mean()), float(lons.mean()), lats, lons)))
+        else:
+            start = sum(r[1] is not None for r in located[:start])
+        picked = spread(lats, lons, len(with_xy) if k is None else k, start=start)
+        taken = set(picked)
+        return ([with_xy[i][0] for i in picked]
+                + [r[0] for i, r in enumerate(with_xy) if i not in taken]
+                + [r[0] for r in located if r[1] is None])
+
+    @staticmethod
+    def sensors(loc: Dict[str, Any], parameter_name: str) -> List[Dict[str, Any]]:
+        """Embedded sensors of one location that measure parameter_name."""
+        return [s for s in (loc.get("sensors") or [])
+                if (s.get("parameter") or {}).get("name") == parameter_name]
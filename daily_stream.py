@@ -0,0 +1,88 @@
+# daily_stream.py
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from sketches import QuantileSketch
+
+class DailyAggregator:
+    """
+    Chunked equivalent of indicators.daily_agg for hourly / raw readings that never sit
+    in memory all at once. Feed it frames of (datetime, value, sensor_id) with add(),
+    e.g. one API page at a time, then call result() for the `date, mean, median, n` frame.
+
+    Only per-day running sums, counts and a QuantileSketch are kept, plus the readings of
+    each sensor's current (still open) day, so memory does not grow with the number of
+    readings. A sensor-day counts only when it has readings in at least `min_hours`
+    distinct UTC hours (0 = keep everything); it is judged once the sensor's readings
+    move past that day, so each sensor's readings must arrive oldest first (as pages do).
+    mean and n match daily_agg exactly; median is within `alpha` relative error.
+    """
+
+    def __init__(self, min_hours: int = 0, alpha: float = 0.005):
+        self.min_hours = min_hours
+        self.alpha = alpha
+        self._days: Dict[pd.Timestamp, list] = {}      # day → [sum, count, sketch]
+        self._open: Optional[pd.DataFrame] = None     # readings of each sensor's latest day
+
+    def add(self, chunk: pd.DataFrame) -> None:
+        df = chunk.dropna(subset=["datetime", "value"])
+        if df.empty:
+            return
+        t = df["datetime"].dt.tz_convert(None)
+        part = pd.DataFrame({
+            "sensor_id": df["sensor_id"].to_numpy(),
+            "day": t.dt.floor("D").to_numpy(),
+            "hour": t.dt.hour.to_numpy(dtype="int8"),
+            "value": df["value"].to_numpy(dtype="float64"),
+        })
+        if self._open is not None:
+            part = pd.concat([self._open, part], ignore_index=True)
+        closed = (part["day"] < part.groupby("sensor_id")["day"].transform("max")).to_numpy()
+        self._open = part[~closed]
+        self._fold(part[closed])
+
+    def flush(self) -> None:
+        """Close every open sensor-day (end of stream)."""
+        if self._open is not None:
+            self._fold(self._open)
+            self._open = None
+
+    def _fold(self, rows: pd.DataFrame) -> None:
+        if rows.empty:
+            return
+        if self.min_hours > 0:
+            hours = rows.groupby(["sensor_id", "day"])["hour"].transform("nunique")
+            rows = rows[(hours >= self.min_hours).to_numpy()]
+        for day, vals in rows.groupby("day")["value"]:
+            state = self._days.get(day)
+            if state is None:
+                state = self._days[day] = [0.0, 0, QuantileSketch(self.alpha)]
+            v = vals.to_numpy()
+            state[0] += float(v.sum())
+            state[1] += len(v)
+            state[2].add_many(v)
+
+    def result(self) -> pd.DataFrame:
+        """Flush and return the daily frame; days between the first and last with no complete data get n = 0."""
+        self.flush()
+        if not self._days:
+            return pd.DataFrame(columns=["date", "mean", "median", "n"])
+        days = sorted(self._days)
+        full = pd.date_range(days[0], days[-1], freq="D")
+        mean = np.full(len(full), np.nan)
+        median = np.full(len(full), np.nan)
+        n = np.zeros(len(full), dtype="int64")
+        for day in days:
+            total, count, sketch = self._days[day]
+            i = (day - full[0]).days
+            mean[i], median[i], n[i] = total / count, sketch.quantile(0.5), count
+        return pd.DataFrame({"date": full.date, "mean": mean, "median": median, "n": n})
+
+def daily_agg_stream(frames: Iterable[pd.DataFrame], min_hours: int = 0) -> pd.DataFrame:
+    """daily_agg over an iterable of reading frames, consumed one frame at a time."""
+    agg = DailyAggregator(min_hours=min_hours)
+    for frame in frames:
+        agg.add(frame)
+    return agg.result()
@@ -1,80 +1,255 @@
 # data_fetch.py (OpenAQ v3)
 import os
 import time
+import threading
 import requests
+import numpy as np
 import pandas as pd
-from typing import Optional, Tuple, Dict, Any
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from typing import Optional, Tuple, Dict, Any, Iterator, List
+import instrumentation
+from catalog import LocationsCatalog, coordinates
+from daily_stream import DailyAggregator
+from http_scheduler import RequestScheduler
+from indicators import cross_sensor_daily
+from sensor_cache import default_cache
+from settings import load_env
 
-load_dotenv()
-API_BASE = "https://api.openaq.org/v3"
-API_KEY = os.getenv("OPENAQ_API_KEY", "").strip()
+# Upper bound on concurrent OpenAQ requests (worker threads and pooled connections)
+MAX_WORKERS = 8
+# v3 list endpoints accept at most 1000 results per page
+PAGE_LIMIT = 1000
+# Seconds a downloaded per-country locations catalog is reused before re-download
+CATALOG_TTL = 3600
+
+_catalogs: Dict[str, Tuple[float, LocationsCatalog]] = {}
+_catalog_locks: Dict[str, threading.Lock] = {}
+_catalog_locks_guard = threading.Lock()
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_env: Optional[Dict[str, Any]] = None
+_scheduler: Optional[RequestScheduler] = None
+
+def _settings() -> Dict[str, Any]:
+    """
+    API settings from the environment, read on first use: .env is loaded here rather
+    than at import, so commands that never reach the API never load python-dotenv.
+    """
+    global _env
+    if _env is None:
+        with _session_lock:
+            if _env is None:
+                load_env()
+                _env = {
+                    # OPENAQ_API_BASE points the client at another v3-compatible server (e.g. bench/fake_openaq.py)
+                    "api_base": os.getenv("OPENAQ_API_BASE", "https://api.openaq.org/v3").rstrip("/"),
+                    "api_key": os.getenv("OPENAQ_API_KEY", "").strip(),
+                    # Client-side request budget; OpenAQ's default key allows 60/min (headers refine it at runtime)
+                    "rate_per_min": float(os.getenv("OPENAQ_RATE_PER_MIN", "60")),
+                }
+    return _env
+
+def _api_key() -> str:
+    return _settings()["api_key"]
 
 def _headers():
-    if not API_KEY:
+    if not _api_key():
         # Still return a header object – the app will surface a helpful error
         return {}
-    return {"X-API-Key": API_KEY}
+    return {"X-API-Key": _api_key()}
 
-def _empty_df() -> pd.DataFrame:
-    return pd.DataFrame(columns=["datetime","value","unit","location","latitude","longitude","sensor_id","location_id"])
+def _get_session() -> requests.Session:
+    """One keep-alive session for every OpenAQ call, sized for MAX_WORKERS threads."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                _session = s
+    return _session
 
-def fetch_locations_by_city(country_iso: Optional[str], city_like: str, parameter_name: str, limit: int = 100) -> Tuple[pd.DataFrame, Optional[str]]:
+def _get_scheduler() -> RequestScheduler:
     """
-    v3 has no direct ?city= filter. We:
-    1) call /v3/locations with iso=XX (optional),
-    2) client-filter results where 'locality' OR 'name' contains city_like (case-insensitive),
-    3) keep only locations that have sensors for parameter_name.
+    Every OpenAQ GET goes through this: rate limiting, retries with backoff on 429/5xx,
+    per-host concurrency and coalescing of identical in-flight requests.
     """
-    if not API_KEY:
-        return _empty_df(), "Missing OpenAQ API key. Set OPENAQ_API_KEY in .env."
+    global _scheduler
+    if _scheduler is None:
+        rate = _settings()["rate_per_min"]
+        with _session_lock:
+            if _scheduler is None:
+                _scheduler = RequestScheduler(_get_session, rate_per_min=rate, max_per_host=MAX_WORKERS)
+    return _scheduler
 
-    params: Dict[str, Any] = {
-        "limit": limit
-    }
-    if country_iso:
-        params["iso"] = country_iso
+def _get(path: str, params: Optional[Dict[str, Any]] = None) -> requests.Response:
+    return _get_scheduler().get(f"{_settings()['api_base']}{path}", params=params, headers=_headers(),
+                                timeout=30, label=path)
 
-    try:
-        r = requests.get(f"{API_BASE}/locations", params=params, headers=_headers(), timeout=30)
+class OpenAQError(Exception):
+    """Non-200 or network failure while paging; str(e) is the user-facing message."""
+
+def iter_pages(path: str, params: Optional[Dict[str, Any]] = None,
+               limit: int = PAGE_LIMIT, prefetch: bool = True) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Yield the `results` list of each page of a v3 list endpoint, following
+    ?page=1,2,... until the last one. The server may cap pages below `limit`, so a
+    page is short only against the `meta.limit` it reports; `meta.found`, when it is
+    an exact count, ends paging early. A server reporting neither is paged until it
+    returns an empty page. With prefetch, page n+1 is requested on a background
+    thread while the caller works on page n.
+    Raises OpenAQError on a non-200 response or network error.
+    """
+    base = dict(params or {}, limit=limit)
+
+    def _page(n: int) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        try:
+            r = _get(path, dict(base, page=n))
+        except requests.RequestException as e:
+            raise OpenAQError(f"Network error: {e}")
         if r.status_code != 200:
-            return _empty_df(), f"/locations {r.status_code}: {r.text[:240]}"
-        data = r.json()
-    except requests.RequestException as e:
-        return _empty_df(), f"Network error: {e}"
+            raise OpenAQError(f"{path} {r.status_code}: {r.text[:240]}")
+        body = r.json()
+        return body.get("results", []), body.get("meta") or {}
 
-    locs = []
-    city_like_low = (city_like or "").lower()
-    for loc in data.get("results", []):
-        locality = (loc.get("locality") or "").lower()
-        name = (loc.get("name") or "").lower()
-        sensors = loc.get("sensors") or []
-        has_param = any((s.get("parameter", {}).get("name") == parameter_name) for s in sensors)
-        if (city_like_low in locality or city_like_low in name) and has_param:
-            locs.append({
-                "location_id": loc.get("id"),
-                "location_name": loc.get("name"),
-                "locality": loc.get("locality"),
-                "country": (loc.get("country") or {}).get("code"),
-                "timezone": loc.get("timezone"),
-                "sensors": sensors
-            })
+    def _more(results: List[Dict[str, Any]], meta: Dict[str, Any], n: int) -> bool:
+        if not results:
+            return False
+        found = meta.get("found")
+        page_size = meta.get("limit")
+        if not isinstance(page_size, int) or page_size <= 0:
+            return True                       # unknown page size: stop on an empty page
+        if isinstance(found, int):            # OpenAQ may send ">1000" instead of a count
+            return n * page_size < found
+        return len(results) >= page_size
+
+    prefetched = instrumentation.propagate(_page)
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        page = 1
+        pending = ex.submit(prefetched, page) if prefetch else None
+        while True:
+            results, meta = pending.result() if prefetch else _page(page)
+            more = _more(results, meta, page)
+            if more and prefetch:
+                pending = ex.submit(prefetched, page + 1)
+            if results:
+                yield results
+            if not more:
+                return
+            page += 1
+
+def _empty_df() -> pd.DataFrame:
+    return pd.DataFrame({
+        "datetime": pd.Series(dtype="datetime64[ns, UTC]"),
+        "value": pd.Series(dtype="float64"),
+        "unit": pd.Series(dtype="category"),
+        "sensor_id": pd.Series(dtype="int32"),
+        "location_id": pd.Series(dtype="int32"),
+        "location": pd.Series(dtype="category"),
+        "latitude": pd.Series(dtype="float32"),
+        "longitude": pd.Series(dtype="float32"),
+    })
+
+def get_catalog(country_iso: Optional[str], limit: int = PAGE_LIMIT) -> Tuple[Optional[LocationsCatalog], Optional[str]]:
+    """
+    Locations catalog for one country (all of /v3/locations when country_iso is empty),
+    downloaded once with `limit` results per page and kept for CATALOG_TTL seconds.
+    """
+    if not _api_key():
+        return None, "Missing OpenAQ API key. Set OPENAQ_API_KEY in .env."
+    key = (country_iso or "").upper()
+    with _catalog_locks_guard:
+        lock = _catalog_locks.setdefault(key, threading.Lock())
+    with lock:
+        hit = _catalogs.get(key)
+        fresh = bool(hit) and time.monotonic() - hit[0] < CATALOG_TTL
+        instrumentation.record_cache("catalog", fresh)
+        if fresh:
+            return hit[1], None
+        params: Dict[str, Any] = {"iso": key} if key else {}
+        try:
+            locations = [loc for page in iter_pages("/locations", params, limit=limit) for loc in page]
+        except OpenAQError as e:
+            return None, str(e)
+        catalog = LocationsCatalog(locations)
+        _catalogs[key] = (time.monotonic(), catalog)
+        return catalog, None
+
+def fetch_locations_by_city(country_iso: Optional[str], city_like: str, parameter_name: str, limit: int = PAGE_LIMIT,
+                            spread: Optional[int] = None) -> Tuple[pd.DataFrame, Optional[str]]:
+    """
+    v3 has no direct ?city= filter. We:
+    1) look up the cached /v3/locations catalog for iso=XX (optional),
+    2) match locations where 'locality' OR 'name' contains city_like (case-insensitive),
+    3) keep only locations that have sensors for parameter_name.
+    With spread=k the first k rows are the matches that best cover the city's area
+    (LocationsCatalog.spread) instead of the first k in API order.
+    """
+    catalog, err = get_catalog(country_iso, limit=limit)
+    if err:
+        return _empty_df(), err
+
+    matched = catalog.match(city_like, parameter_name)
+    if spread:
+        matched = catalog.spread(matched, spread)
+    locs = [_location_row(loc) for loc in matched]
 
     if not locs:
         return _empty_df(), "No matching locations with that city + parameter. Try adjusting city text or country ISO."
 
     return pd.DataFrame(locs), None
 
+def _location_row(loc: Dict[str, Any]) -> Dict[str, Any]:
+    lat, lon = coordinates(loc)
+    return {
+        "location_id": loc.get("id"),
+        "location_name": loc.get("name"),
+        "locality": loc.get("locality"),
+        "country": (loc.get("country") or {}).get("code"),
+        "timezone": loc.get("timezone"),
+        "latitude": lat,
+        "longitude": lon,
+        "sensors": loc.get("sensors") or []
+    }
+
+def fetch_locations_near(country_iso: Optional[str], lat: float, lon: float, parameter_name: str,
+                         radius_km: Optional[float] = None, n: int = 20,
+                         spread: Optional[int] = None) -> Tuple[pd.DataFrame, Optional[str]]:
+    """
+    Locations measuring parameter_name around (lat, lon), nearest first, from the catalog's
+    spatial index: all within radius_km, or the n nearest when no radius is given.
+    With spread=k the first k rows are reordered to cover the area (starting at the nearest).
+    Rows carry a distance_km column.
+    """
+    catalog, err = get_catalog(country_iso)
+    if err:
+        return _empty_df(), err
+    if radius_km is not None:
+        hits = catalog.within(lat, lon, radius_km, parameter_name)
+    else:
+        hits = catalog.nearest(lat, lon, n, parameter_name)
+    if not hits:
+        return _empty_df(), "No locations with that parameter near this point."
+    dist = {id(loc): d for loc, d in hits}
+    matched = [loc for loc, _ in hits]
+    if spread:
+        matched = catalog.spread(matched, spread, start=0)
+    return pd.DataFrame([dict(_location_row(loc), distance_km=round(dist[id(loc)], 3)) for loc in matched]), None
+
 def fetch_sensors_for_location(location_id: int, parameter_name: str) -> Tuple[pd.DataFrame, Optional[str]]:
     """
     v3: list sensors under a location, filter by parameter name (e.g., 'pm25').
     """
-    if not API_KEY:
+    if not _api_key():
         return _empty_df(), "Missing OpenAQ API key. Set OPENAQ_API_KEY in .env."
 
     try:
         # docs: GET /v3/locations/{locations_id}/sensors
-        r = requests.get(f"{API_BASE}/locations/{location_id}/sensors", headers=_headers(), timeout=30)
+        r = _get(f"/locations/{location_id}/sensors")
         if r.status_code != 200:
             return _empty_df(), f"/locations/{location_id}/sensors {r.status_code}: {r.text[:240]}"
         data = r.json()
@@ -96,138 +271,339 @@ def fetch_sensors_for_location(location_id: int, parameter_name: str) -> Tuple[p
         return _empty_df(), "No sensors for that parameter at this location."
     return pd.DataFrame(rows), None
 
-def fetch_daily_for_sensor(sensor_id: int, date_from: str, date_to: str) -> Tuple[pd.DataFrame, Optional[str]]:
+def _fetch_daily_remote(sensor_id: int, date_from: str, date_to: str) -> Tuple[pd.DataFrame, Optional[str]]:
     """
-    v3 daily averages for one sensor:
-    GET /v3/sensors/{sensor_id}/days?datetime_from=...&datetime_to=...
+    v3 daily averages for one sensor straight from the API, all pages.
+    An empty frame with no error means the API answered but had no days.
     """
-    if not API_KEY:
-        return _empty_df(), "Missing OpenAQ API key. Set OPENAQ_API_KEY in .env."
+    try:
+        frames = [f for f in iter_daily_for_sensor(sensor_id, date_from, date_to) if not f.empty]
+    except OpenAQError as e:
+        return _empty_df(), str(e)
+    if not frames:
+        return _empty_df(), None
+    df = pd.concat(frames, ignore_index=True)
+    df["unit"] = df["unit"].astype("category")
+    return df, None
 
+def iter_daily_for_sensor(sensor_id: int, date_from: str, date_to: str,
+                          prefetch: bool = True) -> Iterator[pd.DataFrame]:
+    """
+    Stream one sensor's daily averages page by page (oldest first), one frame per page:
+    GET /v3/sensors/{sensor_id}/days?datetime_from=...&datetime_to=...&page=n
+    Raises OpenAQError if a page cannot be fetched.
+    """
     params = {
         "datetime_from": f"{date_from}T00:00:00Z",
         "datetime_to":   f"{date_to}T23:59:59Z",
-        "limit": 1000
     }
-    try:
-        r = requests.get(f"{API_BASE}/sensors/{sensor_id}/days", params=params, headers=_headers(), timeout=30)
-        if r.status_code != 200:
-            return _empty_df(), f"/sensors/{sensor_id}/days {r.status_code}: {r.text[:240]}"
-        data = r.json()
-    except requests.RequestException as e:
-        return _empty_df(), f"Network error: {e}"
+    for results in iter_pages(f"/sensors/{sensor_id}/days", params, prefetch=prefetch):
+        # v3: value is daily mean; parameter object has units & name.
+        # Use the 'from' timestamp—daily mean for that day
+        yield _period_frame(sensor_id, results)
 
-    rows = []
-    for res in data.get("results", []):
-        # v3: value is daily mean; parameter object has units & name
-        value = res.get("value")
-        param = (res.get("parameter") or {}).get("name")
-        units = (res.get("parameter") or {}).get("units")
-        period = res.get("period") or {}
-        dt_from = (period.get("datetimeFrom") or {}).get("utc")
-        # Use the 'to' timestamp or from—daily mean for that day
-        rows.append({
-            "datetime": dt_from,
-            "value": value,
-            "unit": units,
-            "location": None,     # not provided here; optional
-            "latitude": None,
-            "longitude": None,
-            "sensor_id": sensor_id,
-        })
+def iter_hourly_for_sensor(sensor_id: int, date_from: str, date_to: str,
+                           raw: bool = False, prefetch: bool = True) -> Iterator[pd.DataFrame]:
+    """
+    Stream one sensor's hourly averages (raw=True: individual measurements) page by page,
+    oldest first, one frame per page:
+    GET /v3/sensors/{sensor_id}/hours (or /measurements)?datetime_from=...&datetime_to=...&page=n
+    Raises OpenAQError if a page cannot be fetched.
+    """
+    params = {
+        "datetime_from": f"{date_from}T00:00:00Z",
+        "datetime_to":   f"{date_to}T23:59:59Z",
+    }
+    path = f"/sensors/{sensor_id}/{'measurements' if raw else 'hours'}"
+    for results in iter_pages(path, params, prefetch=prefetch):
+        yield _period_frame(sensor_id, results)
 
-    if not rows:
+def _period_frame(sensor_id: int, results: List[Dict[str, Any]]) -> pd.DataFrame:
+    """One page of v3 period results (days, hours, measurements) → frame, stamped by period start."""
+    return _days_frame(
+        sensor_id,
+        [((r.get("period") or {}).get("datetimeFrom") or {}).get("utc") for r in results],
+        [r.get("value") for r in results],
+        [(r.get("parameter") or {}).get("units") for r in results],
+    )
+
+def _days_frame(sensor_id: int, datetimes, values, units) -> pd.DataFrame:
+    """
+    Column lists (UTC ISO timestamps, values, units) → compact daily frame for one sensor,
+    oldest first. location_id/location are filled in by fetch_city_parameter_daily.
+    """
+    if not datetimes:
+        return _empty_df()
+    n = len(datetimes)
+    df = pd.DataFrame({
+        "datetime": pd.to_datetime(datetimes, utc=True, errors="coerce", format="ISO8601"),
+        "value": np.array(values, dtype="float64"),   # None → NaN; full precision for the cache and KPIs
+        "unit": pd.Categorical(units),
+        "sensor_id": np.full(n, sensor_id, dtype="int32"),
+    })
+    if df["datetime"].hasnans:
+        df = df.dropna(subset=["datetime"])
+    if not df["datetime"].is_monotonic_increasing:
+        df = df.sort_values("datetime")
+    return df.reset_index(drop=True)
+
+def _fetch_daily(sensor_id: int, date_from: str, date_to: str,
+                 use_cache: bool = True) -> Tuple[pd.DataFrame, Optional[str]]:
+    """fetch_daily_for_sensor without the empty check: no values is a result, not an error."""
+    if not _api_key():
+        return _empty_df(), "Missing OpenAQ API key. Set OPENAQ_API_KEY in .env."
+
+    cache = default_cache() if use_cache else None
+    if cache is None:
+        df, err = _fetch_daily_remote(sensor_id, date_from, date_to)
+    else:
+        gaps = cache.missing_ranges(sensor_id, date_from, date_to)
+        instrumentation.record_cache("sensor_days", not gaps)
+        for gap_from, gap_to in gaps:
+            gap_df, err = _fetch_daily_remote(sensor_id, gap_from, gap_to)
+            if err:
+                return _empty_df(), err
+            cache.store(sensor_id, gap_df, gap_from, gap_to)
+        rows = cache.read(sensor_id, date_from, date_to)
+        df, err = _days_frame(sensor_id, *(map(list, zip(*rows)) if rows else ([], [], []))), None
+    return (_empty_df(), err) if err else (df, None)
+
+def fetch_daily_for_sensor(sensor_id: int, date_from: str, date_to: str,
+                           use_cache: bool = True) -> Tuple[pd.DataFrame, Optional[str]]:
+    """
+    Daily averages for one sensor over [date_from, date_to] (YYYY-MM-DD).
+    With use_cache, days already held in the local sensor cache are served from
+    disk and only the missing sub-ranges are requested from the API.
+    """
+    df, err = _fetch_daily(sensor_id, date_from, date_to, use_cache)
+    if err:
+        return _empty_df(), err
+    if df.empty:
         return _empty_df(), "No daily values for this sensor & period."
+    return df, None
 
-    df = pd.DataFrame(rows)
-    df["datetime"] = pd.to_datetime(df["datetime"], utc=True, errors="coerce")
-    df = df.dropna(subset=["datetime"]).sort_values("datetime").reset_index(drop=True)
+def fetch_daily_stored(store, parameter_name: str, sensor_id: int, date_from: str,
+                       date_to: str) -> Tuple[pd.DataFrame, Optional[str]]:
+    """
+    fetch_daily_for_sensor through a series_store.SeriesStore: days the store already
+    holds for (parameter, sensor) are read from its files, only the missing sub-ranges
+    are fetched and written back, so a later report over the same days makes no request.
+    """
+    gaps = store.missing_ranges(parameter_name, sensor_id, date_from, date_to)
+    instrumentation.record_cache("series_store", not gaps)
+    for gap_from, gap_to in gaps:
+        gap_df, err = _fetch_daily(sensor_id, gap_from, gap_to)
+        if err:
+            return _empty_df(), err
+        unit = str(gap_df["unit"].iloc[0]) if len(gap_df) else None
+        store.write(parameter_name, sensor_id, gap_df["datetime"], gap_df["value"], unit, held=(gap_from, gap_to))
+    df = store.read_long(parameter_name, [sensor_id], date_from, date_to)
+    if df.empty:
+        return _empty_df(), "No daily values for this sensor & period."
     return df, None
 
 def fetch_city_parameter_daily(country_iso: Optional[str],
                                city_like: str,
                                parameter_name: str,
                                date_from: str,
-                               date_to: str) -> Tuple[pd.DataFrame, Optional[str]]:
+                               date_to: str,
+                               max_sensors: int = 5,
+                               max_workers: int = MAX_WORKERS,
+                               spread: bool = True,
+                               store=None) -> Tuple[pd.DataFrame, Optional[str]]:
     """
     High level: find locations that match city & parameter → pick a few sensors → concat daily series.
+    With spread (default) sensors come from the matched locations that best cover the
+    city's area, one per location before any location's second sensor; spread=False
+    keeps the old API-order walk (up to 3 sensors per location).
+    Requests run on a pool of max_workers threads (1 = serial). Sensors are still
+    picked in candidate order, so the result matches a serial walk.
+    With a SeriesStore, sensor days are read from and written back to it (fetch_daily_stored).
     """
-    locs, err = fetch_locations_by_city(country_iso, city_like, parameter_name)
+    locs, err = fetch_locations_by_city(country_iso, city_like, parameter_name,
+                                        spread=max_sensors if spread else None)
     if err:
         return _empty_df(), err
+    candidates = _sensor_candidates(locs, parameter_name, interleave=spread)
+    return _fetch_candidates(candidates, date_from, date_to, max_sensors, max_workers,
+                             store=store, parameter_name=parameter_name)
+
+def fetch_near_parameter_daily(country_iso: Optional[str],
+                               lat: float,
+                               lon: float,
+                               parameter_name: str,
+                               date_from: str,
+                               date_to: str,
+                               radius_km: Optional[float] = None,
+                               max_sensors: int = 5,
+                               spread: bool = True,
+                               max_workers: int = MAX_WORKERS,
+                               store=None) -> Tuple[pd.DataFrame, Optional[str]]:
+    """
+    Daily series for sensors around a point rather than a city name: the locations within
+    radius_km (or the nearest ones), spread over the area (or simply nearest first when
+    spread=False). Same output (and store handling) as fetch_city_parameter_daily.
+    """
+    locs, err = fetch_locations_near(country_iso, lat, lon, parameter_name, radius_km,
+                                     n=max(4 * max_sensors, 20), spread=max_sensors if spread else None)
+    if err:
+        return _empty_df(), err
+    candidates = _sensor_candidates(locs, parameter_name, interleave=spread)
+    return _fetch_candidates(candidates, date_from, date_to, max_sensors, max_workers,
+                             store=store, parameter_name=parameter_name)
+
+def _sensor_candidates(locs: pd.DataFrame, parameter_name: str, interleave: bool):
+    """
+    (location row, sensor_id) pairs, up to 3 sensors per location. interleave takes every
+    location's first sensor, then every second one, …, so sensors stay spread out.
+    """
+    per_loc = [[(loc, int(s["id"])) for s in LocationsCatalog.sensors(loc, parameter_name)[:3]]
+               for _, loc in locs.iterrows()]
+    if not interleave:
+        return [c for group in per_loc for c in group]
+    return [group[k] for k in range(3) for group in per_loc if k < len(group)]
+
+def fetch_sensors_daily(country_iso: Optional[str],
+                        sensor_ids,
+                        date_from: str,
+                        date_to: str,
+                        max_workers: int = MAX_WORKERS) -> Tuple[pd.DataFrame, Optional[str]]:
+    """
+    Daily series for explicitly chosen sensors (e.g. the app's sensor picker), in the
+    given order, labelled with their location from the country's catalog.
+    """
+    catalog, err = get_catalog(country_iso)
+    if err:
+        return _empty_df(), err
+    candidates = []
+    for sid in sensor_ids:
+        loc = catalog.location_of(int(sid))
+        if loc is not None:
+            candidates.append((_location_row(loc), int(sid)))
+    if not candidates:
+        return _empty_df(), "None of the selected sensors were found in this country."
+    return _fetch_candidates(candidates, date_from, date_to, len(candidates), max_workers)
+
+def _fetch_candidates(candidates, date_from: str, date_to: str, max_sensors: int, max_workers: int,
+                      store=None, parameter_name: Optional[str] = None,
+                      fetch=None) -> Tuple[pd.DataFrame, Optional[str]]:
+    """
+    Fetch (location, sensor_id) candidates in order until max_sensors series are in hand.
+    Sensors are fetched in waves of the still-missing count, so we never request much
+    more than a serial walk would, and the picked set is the one a serial walk would pick.
+    A sensor whose fetch fails is skipped and the next candidate takes its place.
+    fetch(sensor_id) → (frame, err) replaces the default per-sensor daily fetch.
+    """
+    def _daily(candidate):
+        loc, sensor_id = candidate
+        if fetch is not None:
+            sd, derr = fetch(sensor_id)
+        elif store is not None:
+            sd, derr = fetch_daily_stored(store, parameter_name, sensor_id, date_from, date_to)
+        else:
+            sd, derr = fetch_daily_for_sensor(sensor_id, date_from, date_to)
+        return None if derr else (loc, sd)
 
-    # pick up to 3 sensors across the first few locations to build a representative city series
     daily_frames = []
-    picked = 0
-    for _, loc in locs.iterrows():
-        sensors_df, serr = fetch_sensors_for_location(int(loc["location_id"]), parameter_name)
-        if serr:
-            # just continue; maybe another location has sensors
-            continue
-        for _, srow in sensors_df.head(3).iterrows():
-            sd, derr = fetch_daily_for_sensor(int(srow["sensor_id"]), date_from, date_to)
-            if derr:
-                continue
-            sd["location_id"] = loc["location_id"]
-            sd["location"] = loc["location_name"]
-            daily_frames.append(sd)
-            picked += 1
-            if picked >= 5:  # cap requests a bit
-                break
-        if picked >= 5:
-            break
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        while candidates and len(daily_frames) < max_sensors:
+            need = max_sensors - len(daily_frames)
+            wave, candidates = candidates[:need], candidates[need:]
+            daily_frames.extend(res for res in pool.map(instrumentation.propagate(_daily), wave) if res is not None)
 
     if not daily_frames:
         return _empty_df(), "Found locations, but could not fetch daily series for sensors in this period."
 
-    df = pd.concat(daily_frames, ignore_index=True)
+    # location columns are attached once, after the concat, rather than per sensor frame
+    lengths = [len(sd) for _, sd in daily_frames]
+    df = pd.concat([sd for _, sd in daily_frames], ignore_index=True)
+    df["unit"] = df["unit"].astype("category")
+    df["location_id"] = np.repeat([int(loc["location_id"]) for loc, _ in daily_frames], lengths).astype("int32")
+    df["location"] = pd.Categorical(np.repeat([loc["location_name"] for loc, _ in daily_frames], lengths))
+    for col in ("latitude", "longitude"):
+        df[col] = np.repeat([np.nan if loc.get(col) is None else loc[col] for loc, _ in daily_frames],
+                            lengths).astype("float32")
     return df, None
 
+def _hourly_sensor_days(sensor_id: int, date_from: str, date_to: str, min_hours: int,
+                        raw: bool = False) -> Tuple[pd.DataFrame, Optional[str]]:
+    """
+    One sensor's daily means built from its hourly averages (raw=True: raw measurements),
+    streamed page by page through a DailyAggregator; days with readings in fewer than
+    min_hours UTC hours are dropped. Same frame as fetch_daily_for_sensor.
+    """
+    agg, unit = DailyAggregator(min_hours=min_hours), None
+    try:
+        for frame in iter_hourly_for_sensor(sensor_id, date_from, date_to, raw=raw):
+            agg.add(frame)
+            if unit is None and len(frame):
+                unit = frame["unit"].iloc[0]
+    except OpenAQError as e:
+        return _empty_df(), str(e)
+    daily = agg.result()
+    daily = daily[daily["n"] > 0]
+    if daily.empty:
+        return _empty_df(), f"No day reached {min_hours} hours of data in this period."
+    return _days_frame(sensor_id, [f"{d}T00:00:00Z" for d in daily["date"]], daily["mean"].tolist(),
+                       [unit] * len(daily)), None
+
+def fetch_city_parameter_hourly(country_iso: Optional[str],
+                                city_like: str,
+                                parameter_name: str,
+                                date_from: str,
+                                date_to: str,
+                                max_sensors: int = 5,
+                                min_hours: int = 18,
+                                raw: bool = False,
+                                max_workers: int = MAX_WORKERS) -> Tuple[pd.DataFrame, Optional[str]]:
+    """
+    Like fetch_city_parameter_daily, but builds the daily series locally from hourly
+    averages (raw=True: raw measurements) instead of the API's /days means, so the
+    completeness rule is ours: a sensor-day needs readings in >= min_hours UTC hours.
+    Each sensor's pages stream through its own DailyAggregator, so memory stays flat
+    however long the range, and sensors run on the same bounded pool as the /days path.
+    The sensor-day means are then combined by cross_sensor_daily: date, mean, median,
+    n (sensors reporting), min, max, coverage, as prepare_daily returns for /days.
+    As there, a sensor that fails or has no complete day is skipped for the next candidate.
+    """
+    locs, err = fetch_locations_by_city(country_iso, city_like, parameter_name, spread=max_sensors)
+    if err:
+        return _empty_df(), err
+
+    candidates = _sensor_candidates(locs, parameter_name, interleave=True)
+    df, err = _fetch_candidates(candidates, date_from, date_to, max_sensors, max_workers,
+                                fetch=lambda sid: _hourly_sensor_days(sid, date_from, date_to, min_hours, raw))
+    if err:
+        return _empty_df(), (f"Found locations, but no sensor had a day with {min_hours}+ hours of data "
+                             "in this period.")
+    return cross_sensor_daily(df), None
+
 # ---- City & Sensor picker helpers (v3) ----
-def list_cities(country_iso: str, parameter_name: str, limit: int = 200):
+def list_cities(country_iso: str, parameter_name: str, limit: int = PAGE_LIMIT):
     """
     Returns a sorted list of unique city/locality names in a country that have the given parameter sensors.
     """
-    if not API_KEY:
-        return [], "Missing OpenAQ API key. Set OPENAQ_API_KEY in .env."
-    params = {"iso": country_iso, "limit": limit}
-    try:
-        r = requests.get(f"{API_BASE}/locations", params=params, headers=_headers(), timeout=30)
-        if r.status_code != 200:
-            return [], f"/locations {r.status_code}: {r.text[:240]}"
-        data = r.json()
-    except requests.RequestException as e:
-        return [], f"Network error: {e}"
-
-    names = set()
-    for loc in data.get("results", []):
-        sensors = loc.get("sensors") or []
-        has_param = any((s.get("parameter", {}).get("name") == parameter_name) for s in sensors)
-        if has_param:
-            # prefer 'locality'; fall back to location 'name'
-            nm = (loc.get("locality") or loc.get("name") or "").strip()
-            if nm:
-                names.add(nm)
-    out = sorted(names)
+    catalog, err = get_catalog(country_iso, limit=limit)
+    if err:
+        return [], err
+    out = catalog.cities(parameter_name)
     if not out:
         return [], "No cities with that pollutant in this country."
     return out, None
 
-def list_sensors_in_city(country_iso: str, city_like: str, parameter_name: str, limit: int = 200):
+def list_sensors_in_city(country_iso: str, city_like: str, parameter_name: str, limit: int = PAGE_LIMIT):
     """
     Returns a list of (sensor_id, label) for sensors that match city & parameter.
+    Sensors are read from the locations catalog, no per-location requests.
     """
-    locs_df, err = fetch_locations_by_city(country_iso, city_like, parameter_name, limit=limit)
+    catalog, err = get_catalog(country_iso, limit=limit)
     if err:
         return [], err
     sensors = []
-    for _, loc in locs_df.iterrows():
-        s_df, s_err = fetch_sensors_for_location(int(loc["location_id"]), parameter_name)
-        if s_err or s_df.empty:
-            continue
-        for _, row in s_df.iterrows():
-            label = f"{loc['location_name']} • {row['parameter']} • sensor {row['sensor_id']}"
-            sensors.append((int(row["sensor_id"]), label))
+    for loc in catalog.match(city_like, parameter_name):
+        for s in catalog.sensors(loc, parameter_name):
+            label = f"{loc.get('name')} • {parameter_name} • sensor {s.get('id')}"
+            sensors.append((int(s["id"]), label))
     if not sensors:
         return [], "No sensors found for that city + pollutant."
     return sensors, None
@@ -0,0 +1,170 @@
+# export.py
+"""
+Table exports: daily, raw-sensor and KPI frames as CSV, Parquet or Arrow IPC (Feather v2).
+
+    write_table(daily, "out/Riyadh_pm25_daily.parquet")
+    write_table(frames_iter, "out/raw.arrow", fmt="arrow")   # any iterable of frames
+
+Data is written one chunk (CHUNK_ROWS rows, or one frame of an iterable) at a time, so an
+export never exists whole in memory as a bytes blob. The binary formats keep dtypes:
+dates as date32, UTC timestamps as timestamp[ns, UTC], categories as strings, and are
+zstd-compressed. CSV is plain unless compression is gzip, bz2 or xz. pyarrow is
+optional and only imported by the Parquet / Arrow writers.
+"""
+import bz2
+import gzip
+import io
+import lzma
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+CHUNK_ROWS = 65_536
+
+Frames = Union[pd.DataFrame, Iterable[pd.DataFrame]]
+
+# CSV compression → (file suffix export_report adds, binary sink → compressing writer)
+CSV_COMPRESSION = {
+    "gzip": (".gz", lambda f: gzip.GzipFile(fileobj=f, mode="wb")),
+    "bz2": (".bz2", lambda f: bz2.BZ2File(f, "wb")),
+    "xz": (".xz", lambda f: lzma.LZMAFile(f, "wb")),
+}
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet / Arrow export needs pyarrow (pip install pyarrow)") from None
+    return pyarrow
+
+def _chunks(data: Frames, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    if isinstance(data, pd.DataFrame):
+        for i in range(0, max(len(data), 1), chunk_rows):
+            yield data.iloc[i:i + chunk_rows]
+    else:
+        yield from data
+
+def _arrow_batches(chunks: Iterator[pd.DataFrame]):
+    """
+    (schema, record batches). The schema is the first chunk's, with dictionary columns as
+    plain values; a column that is all null there takes its type from the first later
+    chunk that has one (chunks are held until then), so later chunks still cast to it.
+    """
+    pa = _pyarrow()
+
+    def plain(schema):
+        return pa.schema([pa.field(f.name, f.type.value_type if pa.types.is_dictionary(f.type) else f.type)
+                          for f in schema])
+
+    tables, schema = [], None
+    for chunk in chunks:
+        tables.append(pa.Table.from_pandas(chunk, preserve_index=False))
+        schema = plain(tables[-1].schema) if schema is None else pa.unify_schemas([schema, plain(tables[-1].schema)])
+        if not any(pa.types.is_null(f.type) for f in schema):
+            break
+    if not tables:
+        raise ValueError("nothing to export")
+    schema = schema.with_metadata(tables[0].schema.metadata)
+
+    def batches():
+        for table in tables:
+            yield from table.cast(schema).to_batches()
+        for chunk in chunks:
+            yield from pa.Table.from_pandas(chunk, preserve_index=False).cast(schema).to_batches()
+    return schema, batches()
+
+def _write_csv(chunks: Iterator[pd.DataFrame], sink, compression: Optional[str]) -> int:
+    if compression not in (None, "none") and compression not in CSV_COMPRESSION:
+        raise ValueError(f"unknown CSV compression {compression!r} (known: {', '.join(CSV_COMPRESSION)})")
+    rows, header = 0, True
+    raw = CSV_COMPRESSION[compression][1](sink) if compression in CSV_COMPRESSION else sink
+    text = io.TextIOWrapper(raw, encoding="utf-8", newline="", write_through=True)
+    try:
+        for chunk in chunks:
+            chunk.to_csv(text, index=False, header=header)
+            rows, header = rows + len(chunk), False
+    finally:
+        text.detach()
+        if raw is not sink:
+            raw.close()
+    return rows
+
+def _write_parquet(chunks: Iterator[pd.DataFrame], sink, compression: Optional[str]) -> int:
+    pa = _pyarrow()
+    schema, batches = _arrow_batches(chunks)
+    rows = 0
+    with pa.parquet.ParquetWriter(sink, schema, compression=compression or "zstd") as w:
+        for batch in batches:
+            w.write_batch(batch)
+            rows += batch.num_rows
+    return rows
+
+def _write_arrow(chunks: Iterator[pd.DataFrame], sink, compression: Optional[str]) -> int:
+    pa = _pyarrow()
+    schema, batches = _arrow_batches(chunks)
+    rows = 0
+    options = pa.ipc.IpcWriteOptions(compression=None if compression == "none" else compression or "zstd")
+    with pa.ipc.new_file(sink, schema, options=options) as w:
+        for batch in batches:
+            w.write_batch(batch)
+            rows += batch.num_rows
+    return rows
+
+# format → (file extension, writer(chunks, binary sink, compression) → rows written)
+FORMATS: Dict[str, tuple] = {
+    "csv": (".csv", _write_csv),
+    "parquet": (".parquet", _write_parquet),
+    "arrow": (".arrow", _write_arrow),
+}
+
+def register_format(name: str, ext: str, writer: Callable[[Iterator[pd.DataFrame], object, Optional[str]], int]) -> None:
+    """Add (or replace) an export format; `writer` gets the chunk iterator, a binary sink and the compression."""
+    FORMATS[name] = (ext, writer)
+
+def format_for(path: str) -> str:
+    for name, (ext, _) in FORMATS.items():
+        if str(path).endswith(ext):
+            return name
+    raise ValueError(f"unknown export format for {path!r} (known: {', '.join(FORMATS)})")
+
+def write_table(data: Frames, sink, fmt: Optional[str] = None, compression: Optional[str] = None,
+                chunk_rows: int = CHUNK_ROWS) -> int:
+    """
+    Write a frame, or an iterable of same-shaped frames, to a path or binary file object.
+    fmt defaults to the path's extension. Returns the number of rows written.
+    """
+    fmt = fmt or format_for(sink)
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format {fmt!r} (known: {', '.join(FORMATS)})")
+    writer = FORMATS[fmt][1]
+    if hasattr(sink, "write"):
+        return writer(_chunks(data, chunk_rows), sink, compression)
+    with open(sink, "wb") as f:
+        return writer(_chunks(data, chunk_rows), f, compression)
+
+def kpi_frame(kpis: dict, **labels) -> pd.DataFrame:
+    """One-row KPI table: the labels (city, parameter, …) then compute_kpis' fields, None as NaN."""
+    return pd.DataFrame([{**labels, **{k: np.nan if v is None else v for k, v in kpis.items()}}])
+
+def export_report(out_dir, name: str, fmt: str, daily: Optional[pd.DataFrame], raw: Optional[pd.DataFrame] = None,
+                  kpis: Optional[pd.DataFrame] = None, compression: Optional[str] = None) -> Dict[str, str]:
+    """
+    Write <name>_daily / _raw / _kpis tables of one report into out_dir in `fmt` (a
+    compressed CSV also gets the compression's suffix, e.g. .csv.gz).
+    Returns {"daily": path, ...} for the tables given.
+    """
+    out = Path(out_dir); out.mkdir(parents=True, exist_ok=True)
+    ext = FORMATS[fmt][0]
+    if fmt == "csv" and compression in CSV_COMPRESSION:
+        ext += CSV_COMPRESSION[compression][0]
+    paths = {}
+    for table, df in (("daily", daily), ("raw", raw), ("kpis", kpis)):
+        if df is not None:
+            path = out / f"{name}_{table}{ext}"
+            write_table(df, path, fmt, compression)
+            paths[table] = str(path)
+    return paths
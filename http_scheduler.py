@@ -0,0 +1,159 @@
+# http_scheduler.py
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+
+import instrumentation
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """
+    Client-side rate limiter: `capacity` tokens refilled at `rate` per second.
+    OpenAQ's x-ratelimit-remaining / x-ratelimit-reset headers (reset = seconds until the
+    window resets) tighten it to what the server says is actually left.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self.paused_until - now
+                if wait <= 0 and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                if wait <= 0:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def update_from_headers(self, headers) -> None:
+        remaining, reset = headers.get("x-ratelimit-remaining"), headers.get("x-ratelimit-reset")
+        try:
+            remaining = int(remaining) if remaining is not None else None
+            reset = float(reset) if reset is not None else None
+        except ValueError:
+            return
+        if remaining is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens = min(self.tokens, remaining)
+            if remaining <= 0 and reset:
+                self.paused_until = max(self.paused_until, now + reset)
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for `seconds` (e.g. after a 429 with Retry-After)."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+class RequestScheduler:
+    """
+    Central GET path for one API:
+    - token bucket shared by all threads, steered by rate-limit headers,
+    - at most `max_per_host` requests in flight per host,
+    - retries on network errors, 429 and 5xx with jittered exponential backoff
+      (Retry-After wins when the server sends it),
+    - identical GETs already in flight are coalesced: later callers wait for
+      and share the first caller's response instead of sending their own.
+    After max_retries the last response is returned (or the last error raised),
+    so callers still see the final status.
+    """
+
+    def __init__(self, session: Callable[[], requests.Session], rate_per_min: float = 60.0,
+                 burst: Optional[float] = None, max_per_host: int = 8, max_retries: int = 5,
+                 backoff_base: float = 0.5, backoff_cap: float = 30.0):
+        self._session = session
+        self.bucket = TokenBucket(rate_per_min / 60.0, burst if burst is not None else rate_per_min)
+        self.max_per_host = max_per_host
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._hosts: Dict[str, threading.BoundedSemaphore] = {}
+        self._inflight: Dict[Any, Future] = {}
+        self._lock = threading.Lock()
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._hosts[host]
+
+    def _backoff(self, attempt: int) -> float:
+        # "full jitter": uniform over [0, min(cap, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None,
+            headers: Optional[Dict[str, str]] = None, timeout: float = 30,
+            label: Optional[str] = None) -> requests.Response:
+        key = (url, tuple(sorted((params or {}).items())), tuple(sorted((headers or {}).items())))
+        with self._lock:
+            fut = self._inflight.get(key)
+            owner = fut is None
+            if owner:
+                fut = self._inflight[key] = Future()
+        instrumentation.record_cache("http_coalesce", not owner)
+        if not owner:
+            return fut.result()
+        try:
+            resp = self._send(url, params, headers, timeout, label or urlparse(url).path)
+            fut.set_result(resp)
+            return resp
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _send(self, url, params, headers, timeout, label) -> requests.Response:
+        slot = self._host_slot(url)
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            t0, resp = time.perf_counter(), None
+            try:
+                with slot:
+                    resp = self._session().get(url, params=params, headers=headers, timeout=timeout)
+            except requests.RequestException:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+                continue
+            finally:
+                if instrumentation.enabled():
+                    instrumentation.record_http(label, resp.status_code if resp is not None else None,
+                                                time.perf_counter() - t0, len(resp.content) if resp is not None else 0)
+
+            self.bucket.update_from_headers(resp.headers)
+            if resp.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                return resp
+            delay = self._backoff(attempt)
+            retry_after = resp.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    delay = max(delay, float(retry_after))
+                except ValueError:
+                    pass
+            if resp.status_code == 429:
+                self.bucket.pause(delay)
+            time.sleep(delay)
+        return resp
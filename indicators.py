@@ -1,16 +1,67 @@
+import warnings
 import pandas as pd
 import numpy as np
 
 def daily_agg(df: pd.DataFrame) -> pd.DataFrame:
     if df.empty:
         return pd.DataFrame(columns=["date","mean","median","n"])
-    s = df.set_index("datetime")["value"]
+    s = df.set_index("datetime")["value"].astype("float64")
     daily = s.resample("D").agg(["mean","median","count"])
     daily.index = daily.index.tz_convert(None).date
     out = daily.reset_index()
     out.columns = ["date","mean","median","n"]
     return out
 
+def sensor_day_matrix(df: pd.DataFrame):
+    """
+    Pivot long readings (datetime, value, sensor_id) into a dense sensor × day float array.
+    Days are UTC calendar days from the first to the last reading, like resample("D");
+    a sensor with several readings on one day gets their mean, missing cells are NaN.
+    Returns (matrix, sensor_ids, days).
+    """
+    df = df.dropna(subset=["datetime", "value"])
+    days_utc = df["datetime"].dt.tz_convert(None).dt.floor("D")
+    first = days_utc.min()
+    day_idx = ((days_utc - first) // pd.Timedelta(days=1)).to_numpy(dtype="int64")
+    codes, sensor_ids = pd.factorize(df["sensor_id"], sort=True)
+    shape = (len(sensor_ids), int(day_idx.max()) + 1 if len(day_idx) else 0)
+
+    sums = np.zeros(shape)
+    counts = np.zeros(shape)
+    np.add.at(sums, (codes, day_idx), df["value"].to_numpy(dtype="float64"))
+    np.add.at(counts, (codes, day_idx), 1.0)
+    with np.errstate(invalid="ignore"):
+        matrix = sums / counts
+    days = pd.date_range(first, periods=shape[1], freq="D")
+    return matrix, np.asarray(sensor_ids), days
+
+def cross_sensor_daily(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    True per-day statistics across sensors, in one vectorized pass over sensor_day_matrix:
+    date, mean, median, n (sensors reporting), min, max, coverage (n / sensors).
+    """
+    if df.empty:
+        return pd.DataFrame(columns=["date","mean","median","n","min","max","coverage"])
+    return aggregate_matrix(*sensor_day_matrix(df))
+
+def aggregate_matrix(m: np.ndarray, sensor_ids, days) -> pd.DataFrame:
+    """cross_sensor_daily's statistics for an already-built sensor × day matrix."""
+    n = (~np.isnan(m)).sum(axis=0)
+
+    with warnings.catch_warnings():
+        # all-NaN days legitimately yield NaN
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        out = pd.DataFrame({
+            "date": days.date,
+            "mean": np.nanmean(m, axis=0),
+            "median": np.nanmedian(m, axis=0),
+            "n": n,
+            "min": np.nanmin(m, axis=0),
+            "max": np.nanmax(m, axis=0),
+            "coverage": n / m.shape[0],
+        })
+    return out
+
 def compute_kpis(daily_df: pd.DataFrame, who_24h_guideline: float) -> dict:
     if daily_df.empty:
         return {
@@ -40,3 +91,76 @@ def compute_kpis(daily_df: pd.DataFrame, who_24h_guideline: float) -> dict:
         "p95": round(dd["mean"].quantile(0.95), 2),
         "trend_pct_90d": trend_pct_90d
     }
+
+def compute_kpis_many(daily: pd.DataFrame, who_24h_guideline, by=("city", "parameter")) -> pd.DataFrame:
+    """
+    compute_kpis for many series in one grouped pass; one row per series with the key
+    columns followed by compute_kpis' fields (None → NaN), equal to calling compute_kpis
+    on each series' own rows.
+
+    `daily` is long (the `by` key columns plus date, mean and optionally median) or wide
+    (a date index and one column of daily means per series; the column level names are
+    the keys, "series" if unnamed). Without a median column the daily means stand in.
+    who_24h_guideline is one number or a {parameter: guideline} mapping (needs a
+    "parameter" key).
+    """
+    if "mean" not in daily.columns:
+        # wide: series-major walk of the value matrix, dates ascending within each series
+        names = [n or ("series" if daily.columns.nlevels == 1 else f"level_{i}")
+                 for i, n in enumerate(daily.columns.names)]
+        m = daily.sort_index().to_numpy(dtype="float64").T
+        present = ~np.isnan(m)
+        codes, vals = np.nonzero(present)[0], m[present]
+        medians = vals
+        keys = daily.columns.to_frame(index=False)
+        keys.columns = names
+    else:
+        by = [by] if isinstance(by, str) else list(by)
+        dd = daily.dropna(subset=["mean"])
+        dates = pd.to_datetime(dd["date"])
+        if isinstance(dates.dtype, pd.DatetimeTZDtype):
+            dates = dates.dt.tz_convert(None)
+        codes = dd.groupby(by, sort=True, observed=True, dropna=False).ngroup().to_numpy()
+        order = np.lexsort((dates.to_numpy(), codes))
+        codes = codes[order]
+        vals = dd["mean"].to_numpy(dtype="float64")[order]
+        medians = dd["median"].to_numpy(dtype="float64")[order] if "median" in dd else vals
+        first = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else codes
+        keys = dd[by].iloc[order[first]].reset_index(drop=True)
+
+    n = np.bincount(codes, minlength=len(keys)) if len(codes) else np.zeros(len(keys), dtype="int64")
+    keys = keys[n > 0].reset_index(drop=True)
+    codes = np.cumsum(n > 0)[codes] - 1 if len(codes) else codes
+    n = n[n > 0]
+    if isinstance(who_24h_guideline, dict):
+        who = keys["parameter"].map(who_24h_guideline).to_numpy(dtype="float64")[codes]
+    else:
+        who = float(who_24h_guideline)
+    exceed = np.bincount(codes, weights=vals > who, minlength=len(n)).astype("int64")
+
+    # 90-row rolling means (min_periods=30) at the last row and 90 rows before it
+    ends = np.cumsum(n)
+    last = _window_means(vals, ends - np.minimum(n, 90), ends, valid=n >= 30)
+    prev = _window_means(vals, ends - 180, ends - 90, valid=n > 180)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        trend = (last / prev - 1.0) * 100.0
+    trend[~(np.isfinite(last) & np.isfinite(prev) & (prev != 0))] = np.nan
+
+    g = pd.Series(vals).groupby(codes, sort=True)
+    out = keys
+    out["days_total"] = n
+    out["days_exceed"] = exceed
+    out["exceed_pct"] = [round(e / t * 100.0, 2) for e, t in zip(exceed.tolist(), n.tolist())]
+    out["mean"] = np.round(g.mean().to_numpy(), 2)
+    out["median"] = np.round(pd.Series(medians).groupby(codes, sort=True).median().reindex(range(len(n))).to_numpy(), 2)
+    out["p95"] = np.round(g.quantile(0.95).to_numpy(), 2)
+    out["trend_pct_90d"] = np.round(trend, 2)
+    return out
+
+def _window_means(vals: np.ndarray, lo: np.ndarray, hi: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """Mean of vals[lo:hi] for each pair (NaN where not valid), in one reduceat pass."""
+    lo, hi = np.where(valid, lo, 0), np.where(valid, hi, 1)
+    idx = np.empty(2 * len(lo), dtype="int64")
+    idx[0::2], idx[1::2] = lo, hi
+    sums = np.add.reduceat(np.append(vals, 0.0), idx)[0::2]
+    return np.where(valid, sums / np.maximum(hi - lo, 1), np.nan)
@@ -0,0 +1,225 @@
+# instrumentation.py
+import contextvars
+import functools
+import json
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Open collectors belong to the context (thread / task) that opened them, so concurrent
+# runs (batch reports, app sessions, service workers) each count only their own events.
+# Work handed to another thread reports back through propagate(). Hooks are
+# process-wide. With no collector and no hook, every entry point below returns
+# immediately, so instrumentation costs nothing when unused.
+_collectors: contextvars.ContextVar[Tuple["Metrics", ...]] = contextvars.ContextVar("collectors", default=())
+_hooks: List[Callable[[str, str, dict], None]] = []
+_lock = threading.Lock()
+_NULL = nullcontext()
+
+class Metrics:
+    """
+    Counters for one instrumented run:
+    stages: name → wall_s, cpu_s, calls (+ peak_mb when memory=True)
+    http:   endpoint → count, seconds, bytes, status {code: n}
+    cache:  name → hits, misses, hit_ratio
+    """
+
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.stages: Dict[str, dict] = {}
+        self.http: Dict[str, dict] = {}
+        self.cache: Dict[str, dict] = {}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Metrics":
+        m = cls(memory=any("peak_mb" in s for s in d.get("stages", {}).values()))
+        m.stages, m.http = dict(d.get("stages", {})), dict(d.get("http", {}))
+        m.cache = {k: {"hits": v["hits"], "misses": v["misses"]} for k, v in d.get("cache", {}).items()}
+        return m
+
+    def merge(self, other: dict) -> "Metrics":
+        """Add another run's to_dict() into this one (e.g. a report's fetch and render metrics)."""
+        for k, v in other.get("stages", {}).items():
+            s = self.stages.setdefault(k, {"wall_s": 0.0, "cpu_s": 0.0, "calls": 0})
+            s["wall_s"] = round(s["wall_s"] + v["wall_s"], 6)
+            s["cpu_s"] = round(s["cpu_s"] + v["cpu_s"], 6)
+            s["calls"] += v["calls"]
+            if "peak_mb" in v:
+                s["peak_mb"] = max(s.get("peak_mb", 0.0), v["peak_mb"])
+        for k, v in other.get("http", {}).items():
+            h = self.http.setdefault(k, {"count": 0, "seconds": 0.0, "bytes": 0, "status": {}})
+            h["count"] += v["count"]
+            h["seconds"] = round(h["seconds"] + v["seconds"], 6)
+            h["bytes"] += v["bytes"]
+            for code, n in v["status"].items():
+                h["status"][code] = h["status"].get(code, 0) + n
+        for k, v in other.get("cache", {}).items():
+            c = self.cache.setdefault(k, {"hits": 0, "misses": 0})
+            c["hits"] += v["hits"]
+            c["misses"] += v["misses"]
+        return self
+
+    def to_dict(self) -> dict:
+        cache = {k: dict(v, hit_ratio=round(v["hits"] / max(v["hits"] + v["misses"], 1), 4))
+                 for k, v in self.cache.items()}
+        return {"stages": self.stages, "http": self.http, "cache": cache}
+
+    def records(self, **labels) -> List[dict]:
+        """Flat records (one per stage / endpoint / cache), each carrying `labels`."""
+        d = self.to_dict()
+        out = [dict(labels, kind="stage", stage=k, **v) for k, v in d["stages"].items()]
+        out += [dict(labels, kind="http", endpoint=k, **v) for k, v in d["http"].items()]
+        out += [dict(labels, kind="cache", cache=k, **v) for k, v in d["cache"].items()]
+        return out
+
+    def write_jsonl(self, path: str, **labels) -> None:
+        """Append one JSON line per record."""
+        with open(path, "a", encoding="utf-8") as f:
+            for rec in self.records(**labels):
+                f.write(json.dumps(rec, default=str) + "\n")
+
+    def to_prometheus(self, **labels) -> str:
+        """Prometheus text exposition format (e.g. for node_exporter's textfile collector)."""
+        def _lbl(**kv):
+            kv = {**labels, **kv}
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in kv.items()) + "}" if kv else ""
+        lines = []
+        def _metric(name, kind, samples):
+            if samples:
+                lines.append(f"# TYPE envreport_{name} {kind}")
+                lines.extend(f"envreport_{name}{l} {v}" for l, v in samples)
+        d = self.to_dict()
+        _metric("stage_wall_seconds", "gauge", [(_lbl(stage=k), v["wall_s"]) for k, v in d["stages"].items()])
+        _metric("stage_cpu_seconds", "gauge", [(_lbl(stage=k), v["cpu_s"]) for k, v in d["stages"].items()])
+        _metric("stage_peak_megabytes", "gauge",
+                [(_lbl(stage=k), v["peak_mb"]) for k, v in d["stages"].items() if "peak_mb" in v])
+        _metric("http_requests_total", "counter",
+                [(_lbl(endpoint=k, status=code), n) for k, v in d["http"].items() for code, n in v["status"].items()])
+        _metric("http_seconds_total", "counter", [(_lbl(endpoint=k), v["seconds"]) for k, v in d["http"].items()])
+        _metric("http_bytes_total", "counter", [(_lbl(endpoint=k), v["bytes"]) for k, v in d["http"].items()])
+        _metric("cache_hits_total", "counter", [(_lbl(cache=k), v["hits"]) for k, v in d["cache"].items()])
+        _metric("cache_misses_total", "counter", [(_lbl(cache=k), v["misses"]) for k, v in d["cache"].items()])
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str, **labels) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus(**labels))
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def enabled() -> bool:
+    return bool(_collectors.get() or _hooks)
+
+def propagate(fn: Callable) -> Callable:
+    """
+    fn bound to the caller's open collectors, for running on a worker thread (which
+    otherwise starts with none): pool.map(propagate(work), items).
+    """
+    collectors = _collectors.get()
+    if not collectors:
+        return fn
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        token = _collectors.set(collectors)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _collectors.reset(token)
+    return run
+
+def add_hook(fn: Callable[[str, str, dict], None]) -> None:
+    """
+    Register fn(event, name, data), called for every "stage", "http" and "cache" event
+    (e.g. to forward to statsd or a tracer). Hooks run on the thread that raised the event.
+    """
+    _hooks.append(fn)
+
+def remove_hook(fn: Callable[[str, str, dict], None]) -> None:
+    _hooks.remove(fn)
+
+def _emit(event: str, name: str, data: dict, apply) -> None:
+    collectors = _collectors.get()
+    if collectors:
+        with _lock:
+            for m in collectors:
+                apply(m)
+    for fn in list(_hooks):
+        fn(event, name, data)
+
+@contextmanager
+def collect(memory: bool = False):
+    """
+    Collect metrics for everything run inside the block in this context (plus work
+    handed to threads through propagate()); nested blocks all receive. Yields the Metrics.
+    """
+    m = Metrics(memory=memory)
+    token = _collectors.set(_collectors.get() + (m,))
+    try:
+        yield m
+    finally:
+        _collectors.reset(token)
+
+def stage(name: str):
+    """Context manager timing one pipeline stage (wall, CPU, optional peak memory)."""
+    if not (_collectors.get() or _hooks):
+        return _NULL
+    return _stage(name)
+
+@contextmanager
+def _stage(name: str):
+    trace = any(m.memory for m in _collectors.get())
+    started_tracing = False
+    if trace:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracing = True
+        tracemalloc.reset_peak()
+    w0, c0 = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        data = {"wall_s": time.perf_counter() - w0, "cpu_s": time.process_time() - c0}
+        if trace:
+            data["peak_mb"] = tracemalloc.get_traced_memory()[1] / 1e6
+            if started_tracing:
+                tracemalloc.stop()
+
+        def _apply(m):
+            s = m.stages.setdefault(name, {"wall_s": 0.0, "cpu_s": 0.0, "calls": 0})
+            s["wall_s"] = round(s["wall_s"] + data["wall_s"], 6)
+            s["cpu_s"] = round(s["cpu_s"] + data["cpu_s"], 6)
+            s["calls"] += 1
+            if "peak_mb" in data and m.memory:
+                s["peak_mb"] = round(max(s.get("peak_mb", 0.0), data["peak_mb"]), 3)
+        _emit("stage", name, data, _apply)
+
+_ID = re.compile(r"/\d+")
+
+def record_http(path: str, status: Optional[int], seconds: float, nbytes: int) -> None:
+    """One HTTP exchange; numeric path segments are folded so endpoints group (/sensors/{id}/days)."""
+    if not (_collectors.get() or _hooks):
+        return
+    endpoint = _ID.sub("/{id}", path)
+    code = str(status) if status is not None else "error"
+
+    def _apply(m):
+        h = m.http.setdefault(endpoint, {"count": 0, "seconds": 0.0, "bytes": 0, "status": {}})
+        h["count"] += 1
+        h["seconds"] = round(h["seconds"] + seconds, 6)
+        h["bytes"] += nbytes
+        h["status"][code] = h["status"].get(code, 0) + 1
+    _emit("http", endpoint, {"status": code, "seconds": seconds, "bytes": nbytes}, _apply)
+
+def record_cache(name: str, hit: bool) -> None:
+    if not (_collectors.get() or _hooks):
+        return
+
+    def _apply(m):
+        c = m.cache.setdefault(name, {"hits": 0, "misses": 0})
+        c["hits" if hit else "misses"] += 1
+    _emit("cache", name, {"hit": hit}, _apply)
@@ -0,0 +1,122 @@
+# kpi_state.py
+import json
+from collections import deque
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from sketches import QuantileSketch
+
+# compute_kpis compares the last 90-row rolling mean with the one 90 rows earlier,
+# so the last 180 daily means are all the history the trend ever needs.
+_TAIL = 180
+
+class KpiState:
+    """
+    Incremental equivalent of indicators.compute_kpis for a daily series that only grows.
+
+    update() folds in days after the last one seen, in O(new days); kpis() returns the
+    same dict as compute_kpis. days_total, days_exceed, exceed_pct, mean and
+    trend_pct_90d are exact; median and p95 come from QuantileSketch and are within
+    `alpha` relative error (default 0.5%) of the batch values. The state round-trips
+    through to_dict()/from_dict() (JSON-safe) so it can be persisted between refreshes.
+    """
+
+    def __init__(self, who_24h_guideline: float, alpha: float = 0.005):
+        self.who_24h_guideline = float(who_24h_guideline)
+        self.days_total = 0
+        self.days_exceed = 0
+        self.total = 0.0
+        self.last_date: Optional[str] = None
+        self.tail = deque(maxlen=_TAIL)
+        self.means = QuantileSketch(alpha)
+        self.medians = QuantileSketch(alpha)
+
+    @classmethod
+    def from_daily(cls, daily_df: pd.DataFrame, who_24h_guideline: float, **kw) -> "KpiState":
+        state = cls(who_24h_guideline, **kw)
+        state.update(daily_df)
+        return state
+
+    def update(self, daily_df: pd.DataFrame) -> int:
+        """
+        Fold in rows of a daily_agg-style frame (date, mean, median). Rows on or before
+        the last date already folded in are ignored, so overlapping refreshes are safe.
+        Returns the number of days added.
+        """
+        if daily_df.empty:
+            return 0
+        dd = daily_df.dropna(subset=["mean"])
+        dates = pd.to_datetime(dd["date"])
+        if self.last_date is not None:
+            keep = dates > pd.Timestamp(self.last_date)
+            dd, dates = dd[keep], dates[keep]
+        if dd.empty:
+            return 0
+        order = np.argsort(dates.to_numpy(), kind="stable")
+        means = dd["mean"].to_numpy(dtype="float64")[order]
+
+        self.days_total += len(means)
+        self.days_exceed += int((means > self.who_24h_guideline).sum())
+        self.total += float(means.sum())
+        self.tail.extend(means[-_TAIL:].tolist())
+        self.means.add_many(means)
+        self.medians.add_many(dd["median"].to_numpy(dtype="float64"))
+        self.last_date = dates.max().date().isoformat()
+        return len(means)
+
+    def kpis(self) -> dict:
+        if not self.days_total:
+            return {
+                "days_total": 0, "days_exceed": 0, "exceed_pct": 0.0,
+                "mean": None, "median": None, "p95": None, "trend_pct_90d": None
+            }
+        tail = list(self.tail)
+        # rolling(window=90, min_periods=30) at the last row, and 90 rows before it
+        last90 = float(np.mean(tail[-90:])) if len(tail) >= 30 else None
+        prev90 = float(np.mean(tail[-180:-90])) if self.days_total > 180 else None
+        trend_pct_90d = None
+        if (last90 is not None) and (prev90 is not None) and prev90:
+            trend_pct_90d = round((last90 / prev90 - 1.0) * 100.0, 2)
+        median = self.medians.quantile(0.5)
+        return {
+            "days_total": self.days_total,
+            "days_exceed": self.days_exceed,
+            "exceed_pct": round(self.days_exceed / self.days_total * 100.0, 2),
+            "mean": round(self.total / self.days_total, 2),
+            "median": round(median, 2) if median is not None else None,
+            "p95": round(self.means.quantile(0.95), 2),
+            "trend_pct_90d": trend_pct_90d
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "who_24h_guideline": self.who_24h_guideline,
+            "days_total": self.days_total,
+            "days_exceed": self.days_exceed,
+            "total": self.total,
+            "last_date": self.last_date,
+            "tail": list(self.tail),
+            "means": self.means.to_dict(),
+            "medians": self.medians.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "KpiState":
+        state = cls(d["who_24h_guideline"], alpha=d["means"]["alpha"])
+        state.days_total = d["days_total"]
+        state.days_exceed = d["days_exceed"]
+        state.total = d["total"]
+        state.last_date = d["last_date"]
+        state.tail.extend(d["tail"])
+        state.means = QuantileSketch.from_dict(d["means"])
+        state.medians = QuantileSketch.from_dict(d["medians"])
+        return state
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def from_json(cls, s: str) -> "KpiState":
+        return cls.from_dict(json.loads(s))
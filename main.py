@@ -1,53 +1,474 @@
-import os, yaml
+import os, sys, json, time, argparse, yaml
+from contextlib import nullcontext
+from datetime import datetime, timezone
 from pathlib import Path
-from data_fetch import fetch_openaq
-from indicators import daily_agg, compute_kpis
-from plotting import plot_timeseries, plot_rolling
-from report_builder import render_markdown
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import instrumentation
+from data_fetch import fetch_city_parameter_daily, fetch_near_parameter_daily, list_cities, MAX_WORKERS
+from indicators import cross_sensor_daily, compute_kpis, compute_kpis_many
+from series_store import SeriesStore, store_path
+from export import FORMATS, export_report, kpi_frame, write_table
+# plotting (matplotlib) and report_builder (jinja2) are imported where charts or
+# reports are produced, so --kpis runs never load them.
 
-def main(cfg_path="config.example.yaml"):
+def _day(value) -> str:
+    """A config date; "today" is the current UTC date, so scheduled runs pick up new days."""
+    value = str(value)
+    return datetime.now(timezone.utc).date().isoformat() if value == "today" else value
+
+def _job_from_config(cfg: dict) -> dict:
+    """Single-report config (config.example.yaml layout) → report job."""
+    return {
+        "city":        cfg["region"]["city"],
+        "country":     cfg["region"].get("country"),
+        "start":       _day(cfg["period"]["start"]),
+        "end":         _day(cfg["period"]["end"]),
+        "parameter":   cfg["air"]["parameter"],
+        "who":         float(cfg["air"]["who_24h_guideline"]),
+        "report_name": cfg["output"]["report_name"],
+    }
+
+def _jobs_from_batch(cfg: dict) -> list:
+    """
+    Batch config (config.batch.example.yaml layout) → one job per city × parameter.
+    A city entry may narrow `parameters` or override `period` for itself.
+    `cities: all` (with a top-level `country`) means every city in that country's
+    catalog that measures the parameter. `end: today` keeps the period open-ended;
+    report names keep the literal "today" so refreshes overwrite the same files.
+    """
+    if cfg["cities"] == "all":
+        return [job for param in cfg["parameters"] for job in _jobs_from_batch(dict(
+            cfg, parameters=[param],
+            cities=[{"city": c, "country": cfg["country"]} for c in list_cities(cfg["country"], param)[0]]))]
+    jobs = []
+    for c in cfg["cities"]:
+        period = {**cfg["period"], **(c.get("period") or {})}
+        for param in c.get("parameters") or cfg["parameters"]:
+            jobs.append({
+                "city":        c["city"],
+                "country":     c.get("country"),
+                "start":       _day(period["start"]),
+                "end":         _day(period["end"]),
+                "parameter":   param,
+                "who":         float(cfg["guidelines"][param]),
+                "report_name": f"{c['city']}_{param}_{period['start']}_to_{period['end']}".replace(" ", "_"),
+                **({"near": c["near"]} if c.get("near") else {}),
+            })
+    return jobs
+
+def fetch_job(job: dict, store: SeriesStore = None):
+    """
+    Fetch one job's daily readings; with a SeriesStore, days it holds are read from it, not the API.
+    A job with "near" ({lat, lon[, radius_km]}) takes the sensors around that point instead of
+    matching the city name, which then only labels the report.
+    """
+    with instrumentation.stage("fetch"):
+        near = job.get("near")
+        if near:
+            return fetch_near_parameter_daily(job["country"], float(near["lat"]), float(near["lon"]), job["parameter"],
+                                              job["start"], job["end"], radius_km=near.get("radius_km"), store=store)
+        return fetch_city_parameter_daily(job["country"], job["city"], job["parameter"], job["start"], job["end"],
+                                          store=store)
+
+def write_report(job: dict, df, out_root: str = "outputs", verbose: bool = True,
+                 instrument: bool = False, export_fmt: str = None) -> dict:
+    """
+    Aggregate, score, plot and write one report from fetched readings; returns its artifacts.
+    With instrument=True the artifacts also hold this report's stage "metrics".
+    With export_fmt (see export.FORMATS) the daily, raw-sensor and KPI tables are also
+    written to <out_root>/exports in that format.
+    """
+    if instrument:
+        with instrumentation.collect(memory=True) as m:
+            out = write_report(job, df, out_root, verbose, export_fmt=export_fmt)
+        out["metrics"] = m.to_dict()
+        return out
+
+    from plotting import plot_timeseries, plot_rolling
+    from report_builder import render_markdown
+
+    log = print if verbose else (lambda *a, **k: None)
+    city, param, name, who_thr = job["city"], job["parameter"], job["report_name"], job["who"]
+    out_charts = Path(out_root) / "charts"; out_charts.mkdir(parents=True, exist_ok=True)
+    out_reports = Path(out_root) / "reports"; out_reports.mkdir(parents=True, exist_ok=True)
+
+    log(f"[2/4] Aggregating daily means across sensors …")
+    with instrumentation.stage("aggregate"):
+        daily = cross_sensor_daily(df)
+        daily_path = out_reports / f"{name}_daily.csv"
+        daily.to_csv(daily_path, index=False)
+
+    log(f"[3/4] Computing KPIs …")
+    with instrumentation.stage("kpi"):
+        kpis = compute_kpis(daily, who_thr)
+    log(kpis)
+
+    log(f"[4/4] Plotting charts …")
+    with instrumentation.stage("plot"):
+        ts_path = out_charts / f"{name}_timeseries.png"
+        plot_timeseries(daily, who_thr, f"{city} — {param.upper()} Daily Mean", str(ts_path))
+        roll_path = out_charts / f"{name}_rolling30.png"
+        plot_rolling(daily, 30, f"{city} — {param.upper()} 30-day Rolling Mean", str(roll_path))
+
+    log("Building Markdown report …")
+    with instrumentation.stage("render"):
+        md = render_markdown(city, param, job["start"], job["end"], kpis, who_thr, name, window=30)
+        md_path = out_reports / f"{name}.md"
+        with open(md_path, "w", encoding="utf-8") as f:
+            f.write(md)
+
+    out = {"kpis": kpis, "daily_csv": str(daily_path), "timeseries_png": str(ts_path),
+           "rolling_png": str(roll_path), "report_md": str(md_path)}
+    if export_fmt:
+        with instrumentation.stage("export"):
+            labels = {k: job[k] for k in ("city", "country", "parameter", "start", "end", "who")}
+            out["exports"] = export_report(Path(out_root) / "exports", name, export_fmt, daily, df,
+                                           kpi_frame(kpis, **labels))
+    return out
+
+def write_metrics(metrics: dict, path: str, **labels) -> None:
+    """Export a metrics dict: Prometheus text for *.prom, JSON lines (appended) otherwise."""
+    m = instrumentation.Metrics.from_dict(metrics)
+    if path.endswith(".prom"):
+        m.write_prometheus(path, **labels)
+    else:
+        m.write_jsonl(path, **labels)
+
+def main(cfg_path="config.example.yaml", metrics_path: str = None, store_path: str = None,
+         export_fmt: str = None) -> int:
+    """Build the single report of a config; exit status 1 when no data could be fetched."""
+    with open(cfg_path, "r") as f:
+        cfg = yaml.safe_load(f)
+    job = _job_from_config(cfg)
+
+    with instrumentation.collect(memory=True) if metrics_path else nullcontext() as m:
+        print(f"[1/4] Fetching OpenAQ data for {job['city']} ({job['country'] or '—'}) {job['parameter']} {job['start']}→{job['end']} …")
+        df, err = fetch_job(job, SeriesStore(store_path) if store_path else None)
+        if err or df.empty:
+            print(err or "No data returned. Try another city/date range/parameter.")
+            return 1
+
+        out = write_report(job, df, export_fmt=export_fmt)
+    if metrics_path:
+        write_metrics(m.to_dict(), metrics_path, report=job["report_name"])
+        print("Stage timings: " + ", ".join(f"{k} {v['wall_s']:.2f}s" for k, v in m.stages.items()) + f" → {metrics_path}")
+    print(f"\nDone ✅\n- Charts: {Path(out['timeseries_png']).name}, {Path(out['rolling_png']).name}\n- Daily CSV: {Path(out['daily_csv']).name}\n- Report (Markdown): {Path(out['report_md']).name}\n")
+    if out.get("exports"):
+        print("- Exports: " + ", ".join(Path(p).name for p in out["exports"].values()))
+    return 0
+
+def kpis_json(cfg_path="config.example.yaml") -> int:
+    """
+    KPI-only mode: fetch, aggregate and score one config, print the KPIs as one JSON
+    object on stdout and write nothing else. No charts or templates are loaded.
+    Exit status 1 (with {"error": ...}) when no data could be fetched.
+    """
+    with open(cfg_path, "r") as f:
+        job = _job_from_config(yaml.safe_load(f))
+    df, err = fetch_job(job)
+    out = {k: job[k] for k in ("city", "country", "parameter", "start", "end", "who")}
+    if err or df.empty:
+        print(json.dumps(dict(out, error=err or "No data returned.")))
+        return 1
+    print(json.dumps(dict(out, kpis=compute_kpis(cross_sensor_daily(df), job["who"])), default=float))
+    return 0
+
+def _timed_fetch(job: dict, instrument: bool = False, store: SeriesStore = None):
+    """(df, err, seconds, this fetch's own metrics or None) for one job."""
+    t0 = time.perf_counter()
+    with instrumentation.collect() if instrument else nullcontext() as m:
+        df, err = fetch_job(job, store)
+    return df, err, round(time.perf_counter() - t0, 3), m.to_dict() if instrument else None
+
+def run_batch(cfg_path: str, workers: int = None, out_root: str = None, metrics_path: str = None,
+              store_path: str = None, export_fmt: str = None) -> dict:
+    """
+    Build every city × parameter report of a batch config.
+    Fetching is I/O-bound and runs on threads (sharing one session, catalog and sensor cache);
+    as each fetch lands, aggregation, charts and writing go to a process pool, so rendering
+    overlaps with the remaining fetches. A failing report is recorded and never stops the batch.
+    The run ends by writing <out_root>/manifest.json, which records each report's fetch
+    time; with metrics_path it also holds each report's own metrics (stages, HTTP calls,
+    bytes and cache ratios of its fetch and render) and the batch-wide totals, exported
+    to metrics_path as well. With store_path, fetches read the days a SeriesStore there
+    already holds and write the fetched ones back. With export_fmt, every report also
+    exports its tables (see write_report).
+    """
     with open(cfg_path, "r") as f:
         cfg = yaml.safe_load(f)
+    jobs = _jobs_from_batch(cfg)
+    out_root = out_root or (cfg.get("output") or {}).get("dir", "outputs")
+    workers = workers or (cfg.get("output") or {}).get("workers") or os.cpu_count() or 1
+    store = SeriesStore(store_path) if store_path else None
 
-    city     = cfg["region"]["city"]
-    country  = cfg["region"].get("country")
-    start    = cfg["period"]["start"]
-    end      = cfg["period"]["end"]
-    param    = cfg["air"]["parameter"]
-    who_thr  = float(cfg["air"]["who_24h_guideline"])
-    name     = cfg["output"]["report_name"]
-
-    out_charts = Path("outputs/charts"); out_charts.mkdir(parents=True, exist_ok=True)
-    out_reports = Path("outputs/reports"); out_reports.mkdir(parents=True, exist_ok=True)
-
-    print(f"[1/4] Fetching OpenAQ data for {city} ({country or '—'}) {param} {start}→{end} …")
-    df = fetch_openaq(city=city, country=country, parameter=param, date_from=start, date_to=end)
-    if df.empty:
-        print("No data returned. Try another city/date range/parameter.")
-        return
-
-    print(f"[2/4] Aggregating daily means …")
-    daily = daily_agg(df)
-    daily_path = out_reports / f"{name}_daily.csv"
-    daily.to_csv(daily_path, index=False)
-
-    print(f"[3/4] Computing KPIs …")
+    started = time.time()
+    entries = {}
+
+    def _record(i, status, **extra):
+        job = jobs[i]
+        entries[i] = {"report_name": job["report_name"], "city": job["city"], "country": job["country"],
+                      "parameter": job["parameter"], "status": status, **extra}
+        print(f"[{len(entries)}/{len(jobs)}] {job['report_name']}: {extra.get('error', status)}")
+
+    instrument = bool(metrics_path)
+    with instrumentation.collect() if instrument else nullcontext() as batch_metrics, \
+         ThreadPoolExecutor(max_workers=MAX_WORKERS) as fetchers, ProcessPoolExecutor(max_workers=workers) as renderers:
+        # fetch threads report into the batch collector as well as their report's own
+        fetch = instrumentation.propagate(_timed_fetch)
+        fetches = {fetchers.submit(fetch, job, instrument, store): i for i, job in enumerate(jobs)}
+        renders = {}
+        for fut in as_completed(fetches):
+            i = fetches[fut]
+            fetch_s = fetch_metrics = None
+            try:
+                df, err, fetch_s, fetch_metrics = fut.result()
+            except Exception as e:
+                df, err = None, f"{type(e).__name__}: {e}"
+            extra = {"metrics": fetch_metrics} if fetch_metrics else {}
+            if err or df.empty:
+                _record(i, "error", error=err or "No data returned.", fetch_s=fetch_s, **extra)
+                continue
+            renders[renderers.submit(write_report, jobs[i], df, out_root, False, instrument, export_fmt)] = \
+                (i, len(df), fetch_s, fetch_metrics)
+        for fut in as_completed(renders):
+            i, n_rows, fetch_s, fetch_metrics = renders[fut]
+            extra = {"metrics": fetch_metrics} if fetch_metrics else {}
+            try:
+                out = fut.result()
+            except Exception as e:
+                _record(i, "error", error=f"{type(e).__name__}: {e}", fetch_s=fetch_s, **extra)
+                continue
+            if fetch_metrics:
+                out["metrics"] = instrumentation.Metrics.from_dict(fetch_metrics).merge(out["metrics"]).to_dict()
+            _record(i, "ok", rows=n_rows, fetch_s=fetch_s, **out)
+
+    manifest = {
+        "config": cfg_path,
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+        "seconds": round(time.time() - started, 2),
+        "ok": sum(e["status"] == "ok" for e in entries.values()),
+        "failed": sum(e["status"] != "ok" for e in entries.values()),
+        "reports": [entries[i] for i in range(len(jobs))],
+    }
+    if instrument:
+        manifest["metrics"] = batch_metrics.to_dict()
+        if not metrics_path.endswith(".prom"):
+            open(metrics_path, "w").close()
+        write_metrics(manifest["metrics"], metrics_path, report="_batch")
+        for e in manifest["reports"]:
+            if "metrics" in e and not metrics_path.endswith(".prom"):
+                write_metrics(e["metrics"], metrics_path, report=e["report_name"])
+    Path(out_root).mkdir(parents=True, exist_ok=True)
+    with open(Path(out_root) / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, default=str)
+    print(f"\nBatch done: {manifest['ok']} ok, {manifest['failed']} failed in {manifest['seconds']}s → {Path(out_root) / 'manifest.json'}")
+    return manifest
+
+def refresh_report(job: dict, df, out_root: str, stages, window: int = 30, kpi_state: dict = None) -> dict:
+    """
+    Rebuild only the given stages ("daily", "timeseries", "rolling", "report") of one
+    report from fetched readings. Each artifact is written to a temp file and renamed
+    into place, so readers never see a half-written file. KPIs are compute_kpis' values,
+    as in a batch build; the report's saved kpi_state is advanced to the settled days
+    (refresh.advance_state). Returns the KPIs, the state to save and the paths.
+    """
+    from plotting import render_png
+    from report_builder import render_markdown
+    from refresh import advance_state, atomic_write, paths
+
+    city, param, name, who_thr = job["city"], job["parameter"], job["report_name"], job["who"]
+    artifacts = paths(out_root, name, window)
+    daily = cross_sensor_daily(df)
     kpis = compute_kpis(daily, who_thr)
-    print(kpis)
-
-    print(f"[4/4] Plotting charts …")
-    ts_path = out_charts / f"{name}_timeseries.png"
-    plot_timeseries(daily, who_thr, f"{city} — {param.upper()} Daily Mean", str(ts_path))
-    roll_path = out_charts / f"{name}_rolling30.png"
-    plot_rolling(daily, 30, f"{city} — {param.upper()} 30-day Rolling Mean", str(roll_path))
-
-    print("Building Markdown report …")
-    md = render_markdown(city, param, start, end, kpis, who_thr, name, window=30)
-    md_path = out_reports / f"{name}.md"
-    with open(md_path, "w", encoding="utf-8") as f:
+    kpi_state = advance_state(kpi_state, daily, who_thr)
+    if "daily" in stages:
+        atomic_write(artifacts["daily"], daily.to_csv(index=False))
+    if "timeseries" in stages:
+        atomic_write(artifacts["timeseries"], render_png("timeseries", daily, f"{city} — {param.upper()} Daily Mean",
+                                                         who_guideline=who_thr))
+    if "rolling" in stages:
+        atomic_write(artifacts["rolling"], render_png("rolling", daily, f"{city} — {param.upper()} {window}-day Rolling Mean",
+                                                      window=window))
+    if "report" in stages:
+        atomic_write(artifacts["report"], render_markdown(city, param, job["start"], job["end"], kpis, who_thr, name,
+                                                          window=window))
+    return {"kpis": kpis, "kpi_state": kpi_state, **{stage: str(p) for stage, p in artifacts.items()}}
+
+def _update_rollups(out_root, dailies) -> "RollupCube":
+    """
+    Fold each (job, daily frame) pair's settled days into the RollupCube kept at
+    <out_root>/rollups.json under "city/parameter", save it and return it. A cube that
+    does not count one of the jobs' guidelines is rebuilt with it.
+    """
+    from rollups import ROLLUP_FILE, RollupCube
+
+    path = Path(out_root) / ROLLUP_FILE
+    thresholds = {float(job["who"]) for job, _ in dailies}
+    cube = RollupCube.load(str(path)) if path.exists() else None
+    if cube is None or not thresholds <= set(cube.thresholds):
+        cube = RollupCube(sorted(thresholds | set(cube.thresholds if cube else ())))
+    for job, daily in dailies:
+        cube.update(f"{job['city']}/{job['parameter']}", daily)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    cube.save(str(path))
+    return cube
+
+def run_refresh(cfg_path: str, workers: int = None, out_root: str = None, store_path: str = None,
+                window: int = 30) -> dict:
+    """
+    Incremental rebuild of the reports of a single or batch config, for scheduled runs.
+    Fetches go through the sensor-day cache, so only days not held yet (the newest ones)
+    reach the API. Each stage's inputs are then fingerprinted (refresh.py) and compared
+    with <out_root>/refresh_state.json: reports with no stale stage cost one fetch and a
+    hash; the others rebuild just their stale artifacts in the process pool. A failed
+    report keeps its previous artifacts and state, so the next run retries it. Each
+    report's KpiState is saved alongside, advanced by the settled days added since, and
+    every fetched series' settled days are folded into <out_root>/rollups.json.
+    """
+    import refresh
+    from plotting import CHART_VERSION, DPI, MAX_POINTS
+    from report_builder import TEMPLATE_VERSION
+
+    with open(cfg_path, "r") as f:
+        cfg = yaml.safe_load(f)
+    jobs = _jobs_from_batch(cfg) if "cities" in cfg else [_job_from_config(cfg)]
+    out_root = out_root or (cfg.get("output") or {}).get("dir", "outputs")
+    workers = workers or (cfg.get("output") or {}).get("workers") or os.cpu_count() or 1
+    store = SeriesStore(store_path) if store_path else None
+    chart_version = (CHART_VERSION, DPI, MAX_POINTS)
+    state = refresh.load_state(out_root)
+
+    started = time.time()
+    entries, dailies = {}, []
+
+    def _record(i, status, **extra):
+        entries[i] = {"report_name": jobs[i]["report_name"], "status": status, **extra}
+        if status != "unchanged":
+            print(f"[{len(entries)}/{len(jobs)}] {jobs[i]['report_name']}: {extra.get('error') or ', '.join(extra['stages'])}")
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as fetchers, ProcessPoolExecutor(max_workers=workers) as renderers:
+        fetches = {fetchers.submit(fetch_job, job, store): i for i, job in enumerate(jobs)}
+        renders = {}
+        for fut in as_completed(fetches):
+            i, job = fetches[fut], jobs[fetches[fut]]
+            try:
+                df, err = fut.result()
+            except Exception as e:
+                df, err = None, f"{type(e).__name__}: {e}"
+            if err or df.empty:
+                _record(i, "error", error=err or "No data returned.")
+                continue
+            dailies.append((job, cross_sensor_daily(df)))
+            fps = refresh.fingerprints(job, df, window, chart_version, TEMPLATE_VERSION)
+            stages = refresh.stale(state.get(job["report_name"]), fps, refresh.paths(out_root, job["report_name"], window))
+            if not stages:
+                _record(i, "unchanged", stages=[])
+                continue
+            saved = (state.get(job["report_name"]) or {}).get("kpi_state")
+            renders[renderers.submit(refresh_report, job, df, out_root, stages, window, saved)] = (i, fps, stages)
+        for fut in as_completed(renders):
+            i, fps, stages = renders[fut]
+            try:
+                out = fut.result()
+            except Exception as e:
+                _record(i, "error", error=f"{type(e).__name__}: {e}")
+                continue
+            state[jobs[i]["report_name"]] = {"fingerprints": fps, "kpis": out["kpis"], "kpi_state": out["kpi_state"],
+                                             "refreshed": time.strftime("%Y-%m-%dT%H:%M:%S"), "stages": stages}
+            _record(i, "refreshed", stages=stages)
+
+    refresh.save_state(out_root, state)
+    if dailies:
+        _update_rollups(out_root, dailies)
+    summary = {
+        "seconds": round(time.time() - started, 2),
+        "refreshed": sum(e["status"] == "refreshed" for e in entries.values()),
+        "unchanged": sum(e["status"] == "unchanged" for e in entries.values()),
+        "failed": sum(e["status"] == "error" for e in entries.values()),
+        "reports": [entries[i] for i in range(len(jobs))],
+    }
+    print(f"\nRefresh done: {summary['refreshed']} rebuilt, {summary['unchanged']} unchanged, "
+          f"{summary['failed']} failed in {summary['seconds']}s → {Path(out_root) / refresh.STATE_FILE}")
+    return summary
+
+def run_leaderboard(cfg_path: str, out_root: str = None, export_fmt: str = "csv") -> dict:
+    """
+    Rank every city × parameter of a batch config without rendering per-city reports:
+    fetch on threads, aggregate each city's daily series, then score all of them in one
+    compute_kpis_many pass. Writes <out_root>/leaderboard.md and the KPI table as
+    leaderboard_kpis.csv (or .parquet / .arrow with export_fmt). Settled days also go into
+    the rollup cube (<out_root>/rollups.json, shared with --refresh), whose seasonal rows
+    per city × parameter are written as leaderboard_seasons in the same format.
+    """
+    import pandas as pd
+    from report_builder import render_leaderboard
+
+    with open(cfg_path, "r") as f:
+        cfg = yaml.safe_load(f)
+    jobs = _jobs_from_batch(cfg)
+    out_root = Path(out_root or (cfg.get("output") or {}).get("dir", "outputs"))
+    started = time.time()
+
+    frames, failed, dailies = [], [], []
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as fetchers:
+        for job, (df, err) in zip(jobs, fetchers.map(fetch_job, jobs)):
+            if err or df.empty:
+                failed.append({"city": job["city"], "parameter": job["parameter"], "error": err or "No data returned."})
+                continue
+            daily = cross_sensor_daily(df)[["date", "mean", "median"]]
+            frames.append(daily.assign(city=job["city"], parameter=job["parameter"]))
+            dailies.append((job, daily))
+
+    table = compute_kpis_many(pd.concat(frames, ignore_index=True), cfg["guidelines"]) if frames else \
+        compute_kpis_many(pd.DataFrame(columns=["city", "parameter", "date", "mean"]), 0.0)
+    out_root.mkdir(parents=True, exist_ok=True)
+    export_report(out_root, "leaderboard", export_fmt, None, kpis=table)
+    seasons_path = out_root / f"leaderboard_seasons{FORMATS[export_fmt][0]}"
+    if dailies:
+        cube = _update_rollups(out_root, dailies)
+        seasons = pd.concat([cube.rollup(f"{job['city']}/{job['parameter']}", "season", job["start"], job["end"])
+                             .assign(city=job["city"], parameter=job["parameter"]) for job, _ in dailies],
+                            ignore_index=True)
+        write_table(seasons[["city", "parameter"] + [c for c in seasons if c not in ("city", "parameter")]],
+                    seasons_path, export_fmt)
+    md = render_leaderboard(table, cfg["guidelines"], cfg["period"]["start"], cfg["period"]["end"],
+                            country=cfg.get("country"))
+    with open(out_root / "leaderboard.md", "w", encoding="utf-8") as f:
         f.write(md)
+    print(f"Leaderboard: {len(table)} ranked, {len(failed)} failed in {time.time() - started:.1f}s → {out_root / 'leaderboard.md'}")
+    return {"ranked": len(table), "failed": failed, "leaderboard_md": str(out_root / "leaderboard.md"),
+            "seasons": str(seasons_path) if dailies else None}
 
-    print(f"\nDone ✅\n- Charts: {ts_path.name}, {roll_path.name}\n- Daily CSV: {daily_path.name}\n- Report (Markdown): {md_path.name}\n")
+def cli(argv=None):
+    ap = argparse.ArgumentParser(description="OpenAQ environmental report generator")
+    ap.add_argument("config", nargs="?", default="config.example.yaml", help="single-report config (default: %(default)s)")
+    ap.add_argument("--batch", metavar="YAML", help="batch config: every city × parameter listed in it")
+    ap.add_argument("--kpis", action="store_true", help="print the config's KPIs as JSON only (no charts, no report)")
+    ap.add_argument("--leaderboard", action="store_true", help="with --batch: only rank the cities (leaderboard.md), no per-city reports")
+    ap.add_argument("--refresh", action="store_true", help="rebuild only the artifacts whose inputs changed since the last run")
+    ap.add_argument("--workers", type=int, help="render processes for --batch (default: CPU count)")
+    ap.add_argument("--metrics", metavar="PATH", help="write stage/HTTP/cache metrics: *.prom = Prometheus text, else JSON lines")
+    ap.add_argument("--export", choices=sorted(FORMATS), metavar="FMT",
+                    help="also export daily, raw and KPI tables: %(choices)s (parquet/arrow need pyarrow)")
+    ap.add_argument("--store", nargs="?", const="", metavar="DIR",
+                    help="serve held days from a local series store and keep fetched ones there (default dir: $ENVREPORT_STORE or .cache/series)")
+    args = ap.parse_args(argv)
+    if args.store is not None:
+        args.store = args.store or store_path()
+    if args.kpis:
+        if args.batch:
+            ap.error("--kpis takes a single-report config, not --batch")
+        return kpis_json(args.config)
+    if args.refresh:
+        summary = run_refresh(args.batch or args.config, workers=args.workers, store_path=args.store)
+        return 1 if summary["failed"] else 0
+    if args.batch and args.leaderboard:
+        return 1 if run_leaderboard(args.batch, export_fmt=args.export or "csv")["failed"] else 0
+    if args.batch:
+        manifest = run_batch(args.batch, workers=args.workers, metrics_path=args.metrics, store_path=args.store,
+                             export_fmt=args.export)
+        return 1 if manifest["failed"] else 0
+    return main(args.config, metrics_path=args.metrics, store_path=args.store, export_fmt=args.export)
 
 if __name__ == "__main__":
-    main()
+    sys.exit(cli())
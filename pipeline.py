@@ -1,33 +1,71 @@
 # pipeline.py
-from data_fetch import fetch_city_parameter_daily
-from indicators import daily_agg, compute_kpis
-from report_builder import render_markdown
-from plotting import fig_timeseries, fig_rolling
+import instrumentation
+from data_fetch import fetch_city_parameter_daily, fetch_city_parameter_hourly, fetch_sensors_daily
+from indicators import cross_sensor_daily, compute_kpis
 
-def run_analysis(city: str, country, param: str,
-                 start: str, end: str, who_thr: float,
-                 report_name: str, rolling_window: int = 30):
-    df, fetch_err = fetch_city_parameter_daily(country, city, param, start, end)
+def prepare_daily(city: str, country, param: str, start: str, end: str, sensor_ids=None,
+                  min_hours=None, store=None):
+    """
+    Fetch + aggregate stage: the cross-sensor daily frame for a city (or for the chosen
+    sensor_ids), or an error string. Returns (daily, error).
+    With min_hours, the city's days are built from streamed hourly data instead, keeping
+    only sensor-days with at least that many hours (aggregation happens while fetching);
+    the frame has the same columns, with n counting sensors either way.
+    With a series_store.SeriesStore, a city's days already held there are not fetched again.
+    """
+    if min_hours is not None and not sensor_ids:
+        with instrumentation.stage("fetch"):
+            daily, err = fetch_city_parameter_hourly(country, city, param, start, end, min_hours=min_hours)
+        return (None, err) if err else (daily, None)
+
+    with instrumentation.stage("fetch"):
+        if sensor_ids:
+            df, fetch_err = fetch_sensors_daily(country, sensor_ids, start, end)
+        else:
+            df, fetch_err = fetch_city_parameter_daily(country, city, param, start, end, store=store)
     if fetch_err:
-        return {"error": fetch_err}
+        return None, fetch_err
     if df.empty:
-        return {"error": "No data returned. Try another city/parameter/date range."}
+        return None, "No data returned. Try another city/parameter/date range."
+
+    # We combined several sensors; real per-day mean/median/n (+ min/max/coverage) across them
+    with instrumentation.stage("aggregate"):
+        return cross_sensor_daily(df), None
+
+def run_analysis(city: str, country, param: str,
+                 start: str, end: str, who_thr: float,
+                 report_name: str, rolling_window: int = 30, sensor_ids=None,
+                 instrument: bool = False, memory: bool = False, min_hours=None):
+    """
+    Fetch → aggregate → KPIs → figures → markdown. With instrument=True the result also
+    carries "metrics": per-stage wall/CPU time (peak memory too with memory=True),
+    per-endpoint HTTP stats and cache hit ratios.
+    """
+    if instrument:
+        with instrumentation.collect(memory=memory) as m:
+            res = run_analysis(city, country, param, start, end, who_thr, report_name,
+                               rolling_window, sensor_ids, min_hours=min_hours)
+        res["metrics"] = m.to_dict()
+        return res
+
+    # charts and templating load matplotlib / jinja2, so only when a full analysis needs them
+    from plotting import fig_timeseries, fig_rolling
+    from report_builder import render_markdown
 
-    # We combined several sensors; aggregate to daily mean across sensors
-    daily = df.set_index("datetime")["value"].resample("D").mean().reset_index()
-    daily["date"] = daily["datetime"].dt.tz_convert(None).dt.date
-    daily = daily.rename(columns={"value": "mean"})[["date","mean"]]
-    # fabricate median/count for compatibility with the KPI/plot code
-    daily["median"] = daily["mean"]
-    daily["n"] = 1
+    daily, err = prepare_daily(city, country, param, start, end, sensor_ids, min_hours)
+    if err:
+        return {"error": err}
 
-    kpis = compute_kpis(daily, who_thr)
+    with instrumentation.stage("kpi"):
+        kpis = compute_kpis(daily, who_thr)
 
-    ts_fig = fig_timeseries(daily, who_thr, f"{city} — {param.upper()} Daily Mean")
-    roll_fig = fig_rolling(daily, rolling_window, f"{city} — {param.upper()} {rolling_window}-day Rolling Mean")
+    with instrumentation.stage("plot"):
+        ts_fig = fig_timeseries(daily, who_thr, f"{city} — {param.upper()} Daily Mean")
+        roll_fig = fig_rolling(daily, rolling_window, f"{city} — {param.upper()} {rolling_window}-day Rolling Mean")
 
-    md = render_markdown(city, param, start, end, kpis, who_thr, report_name,
-                        window=rolling_window, include_images=False)  # <-- app mode
+    with instrumentation.stage("render"):
+        md = render_markdown(city, param, start, end, kpis, who_thr, report_name,
+                            window=rolling_window, include_images=False)  # <-- app mode
 
     return {
         "daily": daily,
@@ -1,56 +1,152 @@
 # plotting.py
+import hashlib
 import os
-import matplotlib.pyplot as plt
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import Optional
+
+import numpy as np
 import pandas as pd
+# Figure + Agg canvas instead of pyplot: no global figure state, no GUI backend,
+# so charts can be rendered from worker threads and processes.
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import instrumentation
+
+DPI = 140
+# Series longer than this are downsampled (LTTB) before drawing
+MAX_POINTS = 1500
+PNG_CACHE_SIZE = 128
+# Bump when chart styling changes, so main.py --refresh redraws existing charts
+CHART_VERSION = 2
+
+_png_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_png_lock = threading.Lock()
+
+# ---------- shared helpers ----------
+def rolling_mean(daily_df: pd.DataFrame, window: int) -> pd.Series:
+    """The rolling mean drawn by the rolling chart; pass it back in via `roll=` to reuse it."""
+    return daily_df["mean"].rolling(window=window, min_periods=max(7, window//4)).mean()
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: indices of n_out points that keep the visual shape
+    of (x, y). x must be increasing and numeric; y must not contain NaN.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)   # n_out-2 inner buckets
+    idx = np.empty(n_out, dtype=int)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[nxt_lo:nxt_hi].mean(), y[nxt_lo:nxt_hi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        idx[i + 1] = a
+    return idx
+
+def _xy(dates, values) -> tuple:
+    """
+    (datetime64 x, float y) to draw. NaN stays in, so missing days break the line.
+    Longer series are LTTB-downsampled to about MAX_POINTS: each run of finite points
+    gets its share of the budget, and one NaN point still separates the runs.
+    """
+    x = pd.to_datetime(pd.Series(dates)).to_numpy(dtype="datetime64[ns]")
+    y = pd.Series(values).to_numpy(dtype="float64")
+    if len(x) <= MAX_POINTS:
+        return x, y
+    ok = ~np.isnan(y)
+    bounds = np.flatnonzero(np.diff(np.r_[0, ok.astype("int8"), 0]))
+    starts, ends = bounds[::2], bounds[1::2]
+    budget = max(MAX_POINTS - (len(starts) - 1), 3 * len(starts))
+    xs, ys = [], []
+    for lo, hi in zip(starts, ends):
+        if xs:
+            xs.append(x[lo - 1:lo]); ys.append(np.array([np.nan]))   # keep the gap
+        keep = lo + lttb(x[lo:hi].astype("int64").astype("float64"), y[lo:hi],
+                         max(3, int(budget * (hi - lo) / ok.sum())))
+        xs.append(x[keep]); ys.append(y[keep])
+    if not xs:
+        return x[:0], y[:0]
+    return np.concatenate(xs), np.concatenate(ys)
+
+# ---------- rendering engine ----------
+def _figure(kind: str, daily_df: pd.DataFrame, title: str,
+            who_guideline: Optional[float] = None, window: Optional[int] = None,
+            roll: Optional[pd.Series] = None) -> Figure:
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    if kind == "timeseries":
+        ax.plot(*_xy(daily_df["date"], daily_df["mean"]), label="Daily mean")
+        ax.axhline(y=who_guideline, linestyle="--", label=f"WHO 24h guideline ({who_guideline})")
+    else:
+        if roll is None:
+            roll = rolling_mean(daily_df, window)
+        ax.plot(*_xy(daily_df["date"], roll), label=f"{window}-day rolling mean")
+    ax.set_title(title)
+    ax.set_xlabel("Date")
+    ax.set_ylabel("µg/m³")
+    ax.legend()
+    fig.tight_layout()
+    return fig
+
+def _cache_key(kind, daily_df, title, who_guideline, window, roll) -> str:
+    h = hashlib.sha1(repr((kind, title, who_guideline, window, DPI, MAX_POINTS)).encode())
+    h.update(pd.util.hash_pandas_object(daily_df[["date", "mean"]], index=False).to_numpy().tobytes())
+    if roll is not None:
+        h.update(np.asarray(roll, dtype="float64").tobytes())
+    return h.hexdigest()
+
+def render_png(kind: str, daily_df: pd.DataFrame, title: str,
+               who_guideline: Optional[float] = None, window: Optional[int] = None,
+               roll: Optional[pd.Series] = None) -> bytes:
+    """
+    PNG bytes of a "timeseries" or "rolling" chart. Results are cached (LRU, PNG_CACHE_SIZE)
+    on a hash of the plotted data and options, so unchanged charts are never redrawn.
+    """
+    key = _cache_key(kind, daily_df, title, who_guideline, window, roll)
+    with _png_lock:
+        hit = key in _png_cache
+        if hit:
+            _png_cache.move_to_end(key)
+            png = _png_cache[key]
+    instrumentation.record_cache("png", hit)
+    if hit:
+        return png
+    buf = BytesIO()
+    _figure(kind, daily_df, title, who_guideline, window, roll).savefig(buf, format="png", dpi=DPI)
+    png = buf.getvalue()
+    with _png_lock:
+        _png_cache[key] = png
+        while len(_png_cache) > PNG_CACHE_SIZE:
+            _png_cache.popitem(last=False)
+    return png
+
+def _write(png: bytes, out_path: str):
+    if os.path.dirname(out_path):
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with open(out_path, "wb") as f:
+        f.write(png)
 
 # ---------- file-saving plots (used by CLI) ----------
 def plot_timeseries(daily_df: pd.DataFrame, who_guideline: float, title: str, out_path: str):
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    fig = plt.figure()
-    plt.plot(daily_df["date"], daily_df["mean"], label="Daily mean")
-    plt.axhline(y=who_guideline, linestyle="--", label=f"WHO 24h guideline ({who_guideline})")
-    plt.title(title)
-    plt.xlabel("Date")
-    plt.ylabel("µg/m³")
-    plt.legend()
-    plt.tight_layout()
-    fig.savefig(out_path, dpi=140)
-    plt.close(fig)
-
-def plot_rolling(daily_df: pd.DataFrame, window: int, title: str, out_path: str):
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    dd = daily_df.copy()
-    dd["roll"] = dd["mean"].rolling(window=window, min_periods=max(7, window//4)).mean()
-    fig = plt.figure()
-    plt.plot(dd["date"], dd["roll"], label=f"{window}-day rolling mean")
-    plt.title(title)
-    plt.xlabel("Date")
-    plt.ylabel("µg/m³")
-    plt.legend()
-    plt.tight_layout()
-    fig.savefig(out_path, dpi=140)
-    plt.close(fig)
+    _write(render_png("timeseries", daily_df, title, who_guideline=who_guideline), out_path)
+
+def plot_rolling(daily_df: pd.DataFrame, window: int, title: str, out_path: str,
+                 roll: Optional[pd.Series] = None):
+    _write(render_png("rolling", daily_df, title, window=window, roll=roll), out_path)
 
 # ---------- figure-returning plots (used by Streamlit) ----------
-def fig_timeseries(daily_df: pd.DataFrame, who_guideline: float, title: str):
-    fig = plt.figure()
-    plt.plot(daily_df["date"], daily_df["mean"], label="Daily mean")
-    plt.axhline(y=who_guideline, linestyle="--", label=f"WHO 24h guideline ({who_guideline})")
-    plt.title(title)
-    plt.xlabel("Date")
-    plt.ylabel("µg/m³")
-    plt.legend()
-    plt.tight_layout()
-    return fig
+def fig_timeseries(daily_df: pd.DataFrame, who_guideline: float, title: str) -> Figure:
+    return _figure("timeseries", daily_df, title, who_guideline=who_guideline)
 
-def fig_rolling(daily_df: pd.DataFrame, window: int, title: str):
-    dd = daily_df.copy()
-    dd["roll"] = dd["mean"].rolling(window=window, min_periods=max(7, window//4)).mean()
-    fig = plt.figure()
-    plt.plot(dd["date"], dd["roll"], label=f"{window}-day rolling mean")
-    plt.title(title)
-    plt.xlabel("Date")
-    plt.ylabel("µg/m³")
-    plt.legend()
-    plt.tight_layout()
-    return fig
+def fig_rolling(daily_df: pd.DataFrame, window: int, title: str,
+                roll: Optional[pd.Series] = None) -> Figure:
+    return _figure("rolling", daily_df, title, window=window, roll=roll)
@@ -0,0 +1,106 @@
+# refresh.py
+"""
+Stage fingerprints for incremental report refreshes (main.py --refresh).
+
+Each artifact of a report (daily CSV, the two charts, the markdown) is tagged with a
+fingerprint of everything it is built from: the fetched readings, the threshold, the
+rolling window, the period and the chart / template versions. A refresh compares them
+with the ones stored in <out_root>/refresh_state.json and only rebuilds the stale stages.
+"""
+import hashlib
+import json
+import math
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from kpi_state import KpiState
+from sensor_cache import SETTLE_DAYS
+
+STATE_FILE = "refresh_state.json"
+STAGES = ("daily", "timeseries", "rolling", "report")
+
+def digest(*parts) -> str:
+    """Short sha1 over scalars (by repr) and DataFrames (by content, not index)."""
+    h = hashlib.sha1()
+    for p in parts:
+        if isinstance(p, pd.DataFrame):
+            h.update(pd.util.hash_pandas_object(p, index=False).to_numpy().tobytes())
+        else:
+            h.update(repr(p).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:16]
+
+def fingerprints(job: dict, df: pd.DataFrame, window: int, chart_version, template_version) -> Dict[str, str]:
+    """stage → fingerprint of that stage's inputs for one report job and its fetched readings."""
+    data = digest(df)
+    base = (data, job["city"], job["parameter"])
+    return {
+        "daily": data,
+        "timeseries": digest(*base, "timeseries", job["who"], chart_version),
+        "rolling": digest(*base, "rolling", window, chart_version),
+        "report": digest(*base, job["start"], job["end"], job["who"], window, job["report_name"], template_version),
+    }
+
+def paths(out_root: str, name: str, window: int) -> Dict[str, Path]:
+    """stage → artifact path, the same layout main.write_report uses."""
+    charts, reports = Path(out_root) / "charts", Path(out_root) / "reports"
+    return {
+        "daily": reports / f"{name}_daily.csv",
+        "timeseries": charts / f"{name}_timeseries.png",
+        "rolling": charts / f"{name}_rolling{window}.png",
+        "report": reports / f"{name}.md",
+    }
+
+def stale(entry: dict, fps: Dict[str, str], artifacts: Dict[str, Path]) -> List[str]:
+    """Stages whose fingerprint changed since `entry` was recorded, or whose file is gone."""
+    old = (entry or {}).get("fingerprints") or {}
+    return [s for s in STAGES if old.get(s) != fps[s] or not artifacts[s].exists()]
+
+def settled_through() -> str:
+    """Last UTC day OpenAQ no longer revises (see sensor_cache.SETTLE_DAYS)."""
+    return (datetime.now(timezone.utc).date() - timedelta(days=SETTLE_DAYS)).isoformat()
+
+def advance_state(saved: Optional[dict], daily: pd.DataFrame, who: float,
+                  settled: Optional[str] = None) -> dict:
+    """
+    The KpiState to save for a report's daily frame, continuing the one saved by the
+    previous refresh: only days after its last date and up to `settled` are folded in,
+    so days OpenAQ may still revise never enter it. It is rebuilt from scratch when the
+    threshold changed or the days it holds no longer match the frame (count and sum of
+    daily means). Published KPIs come from compute_kpis, not from this state.
+    """
+    dd = daily.dropna(subset=["mean"])
+    dates = pd.to_datetime(dd["date"])
+    state = KpiState.from_dict(saved) if saved else None
+    if state is not None and state.last_date is not None:
+        held = dd["mean"].to_numpy(dtype="float64")[(dates <= pd.Timestamp(state.last_date)).to_numpy()]
+        if (state.who_24h_guideline != float(who) or len(held) != state.days_total
+                or not math.isclose(float(held.sum()), state.total, rel_tol=1e-9, abs_tol=1e-9)):
+            state = None
+    if state is None:
+        state = KpiState(who)
+    state.update(dd[(dates <= pd.Timestamp(settled or settled_through())).to_numpy()])
+    return state.to_dict()
+
+def atomic_write(path, data) -> None:
+    """Write bytes or text to a temp file beside `path`, then rename it into place."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data if isinstance(data, bytes) else data.encode("utf-8"))
+    os.replace(tmp, path)
+
+def load_state(out_root: str) -> dict:
+    path = Path(out_root) / STATE_FILE
+    if not path.exists():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_state(out_root: str, state: dict) -> None:
+    atomic_write(Path(out_root) / STATE_FILE, json.dumps(state, indent=2, default=str))
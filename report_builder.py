@@ -1,7 +1,14 @@
-from jinja2 import Template
+import hashlib
+import os
+import threading
 from datetime import datetime
+from typing import Optional
+import pandas as pd
+from jinja2 import Environment, DictLoader, FileSystemBytecodeCache
 
-TEMPLATE_WITH_IMAGES = """# Environmental Assessment Brief — {{ city }} ({{ parameter.upper() }})
+from settings import getenv
+
+BRIEF_BASE = """# Environmental Assessment Brief — {{ city }} ({{ parameter.upper() }})
 **Period:** {{ start }} to {{ end }}  
 **Source:** OpenAQ (v3)
 
@@ -10,7 +17,7 @@ TEMPLATE_WITH_IMAGES = """# Environmental Assessment Brief — {{ city }} ({{ pa
 - Days above threshold ({{ who }} µg/m³): **{{ kpis.days_exceed }}/{{ kpis.days_total }}** (**{{ kpis.exceed_pct }}%**)
 - 90-day rolling trend vs prior 90 days: **{{ trend }}**
 
-Overall, levels were {{ summary_word }} relative to the selected guideline.
+Overall, levels were {{ summary_word }} relative to the selected guideline.{% block summary_note %}{% endblock %}
 
 ## Baseline & Data
 Data pulled from OpenAQ for *{{ city }}* between **{{ start }}** and **{{ end }}**. Values are daily means across selected sensors.
@@ -23,55 +30,109 @@ Data pulled from OpenAQ for *{{ city }}* between **{{ start }}** and **{{ end }}
 ## Recommended Mitigations (generic)
 - Dust control and transport emissions management
 - Targeted hotspot monitoring; public alerts on high-pollution days
-
-## Charts
-![Daily Mean](../charts/{{ report_name }}_timeseries.png)
-
-![{{ window }}-day Rolling Mean](../charts/{{ report_name }}_rolling{{ window }}.png)
-
+{% block charts %}{% endblock %}
 ## Appendix
 - Parameter: **{{ parameter }}**
 - WHO threshold: **{{ who }} µg/m³**
 - Generated on: {{ now }}
 """
 
-TEMPLATE_NO_IMAGES = """# Environmental Assessment Brief — {{ city }} ({{ parameter.upper() }})
-**Period:** {{ start }} to {{ end }}  
-**Source:** OpenAQ (v3)
-
-## Executive Summary
-- Average {{ parameter }}: **{{ kpis.mean }} µg/m³** (median **{{ kpis.median }}**, p95 **{{ kpis.p95 }}**)
-- Days above threshold ({{ who }} µg/m³): **{{ kpis.days_exceed }}/{{ kpis.days_total }}** (**{{ kpis.exceed_pct }}%**)
-- 90-day rolling trend vs prior 90 days: **{{ trend }}**
+TEMPLATE_WITH_IMAGES = """{% extends "brief_base.md" %}
+{% block charts %}
+## Charts
+![Daily Mean](../charts/{{ report_name }}_timeseries.png)
 
-Overall, levels were {{ summary_word }} relative to the selected guideline. Charts are displayed in the app above.
+![{{ window }}-day Rolling Mean](../charts/{{ report_name }}_rolling{{ window }}.png)
+{% endblock %}"""
 
-## Baseline & Data
-Data pulled from OpenAQ for *{{ city }}* between **{{ start }}** and **{{ end }}**. Values are daily means across selected sensors.
+TEMPLATE_NO_IMAGES = """{% extends "brief_base.md" %}
+{% block summary_note %} Charts are displayed in the app above.{% endblock %}"""
 
-## Key Findings
-- Exceedance rate: **{{ kpis.exceed_pct }}%** of days
-- Peaks/seasonality visible in rolling chart
-- Locations with highest readings may warrant targeted mitigations
+TEMPLATE_LEADERBOARD = """# Air Quality Leaderboard{% if country %} — {{ country }}{% endif %}
+**Period:** {{ start }} to {{ end }}  
+**Source:** OpenAQ (v3)
 
-## Recommended Mitigations (generic)
-- Dust control and transport emissions management
-- Targeted hotspot monitoring; public alerts on high-pollution days
+Ranked by share of days above the WHO 24-hour guideline, then by average level.
+{% for param in sections %}
+## {{ param.name.upper() }} (guideline {{ param.who }} µg/m³)
 
-## Appendix
-- Parameter: **{{ parameter }}**
-- WHO threshold: **{{ who }} µg/m³**
-- Generated on: {{ now }}
+| # | City | Days | Days above | Exceed % | Mean | Median | p95 | 90-day trend |
+|---|------|-----:|-----------:|---------:|-----:|-------:|----:|-------------:|
+{% for r in param.rows -%}
+| {{ loop.index }} | {{ r.city }} | {{ r.days_total }} | {{ r.days_exceed }} | {{ r.exceed_pct }}% | {{ r.mean }} | {{ r.median }} | {{ r.p95 }} | {{ r.trend }} |
+{% endfor %}{% endfor %}
+Generated on: {{ now }}
 """
 
-def render_markdown(city: str, parameter: str, start: str, end: str,
-                    kpis: dict, who: float, report_name: str,
-                    window: int = 30, include_images: bool = True) -> str:
+# Changes whenever a report template does; main.py --refresh re-renders reports on it.
+TEMPLATE_VERSION = hashlib.sha1("\0".join([BRIEF_BASE, TEMPLATE_WITH_IMAGES]).encode("utf-8")).hexdigest()[:12]
+
+# Default bytecode cache; REPORT_TEMPLATE_CACHE (environment or .env) overrides it,
+# "" keeps compiled templates in memory only.
+TEMPLATE_CACHE_DIR = os.path.join(".cache", "jinja")
+
+_env: Optional[Environment] = None
+_env_lock = threading.Lock()
+
+def template_cache_dir() -> str:
+    """Directory for compiled template bytecode: REPORT_TEMPLATE_CACHE, else TEMPLATE_CACHE_DIR."""
+    return getenv("REPORT_TEMPLATE_CACHE", TEMPLATE_CACHE_DIR)
+
+def _environment() -> Environment:
+    """
+    One environment per process, built on the first render: each template is compiled
+    once and kept, and the compiled bytecode is shared between processes through the
+    cache dir (created then, not at import).
+    """
+    global _env
+    if _env is None:
+        with _env_lock:
+            if _env is None:
+                cache_dir = template_cache_dir()
+                if cache_dir:
+                    os.makedirs(cache_dir, exist_ok=True)
+                _env = Environment(
+                    loader=DictLoader({
+                        "brief_base.md": BRIEF_BASE,
+                        "brief_images.md": TEMPLATE_WITH_IMAGES,
+                        "brief_app.md": TEMPLATE_NO_IMAGES,
+                        "leaderboard.md": TEMPLATE_LEADERBOARD,
+                    }),
+                    bytecode_cache=FileSystemBytecodeCache(cache_dir) if cache_dir else None,
+                    auto_reload=False,
+                )
+    return _env
+
+def _context(city: str, parameter: str, start: str, end: str,
+             kpis: dict, who: float, report_name: str,
+             window: int = 30, now: str = None) -> dict:
     trend = f"{kpis['trend_pct_90d']}%" if kpis.get("trend_pct_90d") is not None else "N/A"
     summary_word = "elevated" if (kpis.get("exceed_pct") or 0) >= 10 else "moderate"
-    tpl = TEMPLATE_WITH_IMAGES if include_images else TEMPLATE_NO_IMAGES
-    return Template(tpl).render(
+    return dict(
         city=city, parameter=parameter, start=start, end=end, kpis=kpis, who=who,
         trend=trend, report_name=report_name, window=window,
-        now=datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC"), summary_word=summary_word
+        now=now or datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC"), summary_word=summary_word
     )
+
+def render_markdown(city: str, parameter: str, start: str, end: str,
+                    kpis: dict, who: float, report_name: str,
+                    window: int = 30, include_images: bool = True) -> str:
+    tpl = _environment().get_template("brief_images.md" if include_images else "brief_app.md")
+    return tpl.render(_context(city, parameter, start, end, kpis, who, report_name, window))
+
+def render_leaderboard(kpi_table, guidelines: dict, start: str, end: str,
+                       country: str = None, top: int = None) -> str:
+    """
+    Markdown ranking of cities per parameter from a compute_kpis_many table
+    (city, parameter + KPI columns): worst exceedance rate first, ties by mean.
+    """
+    sections = []
+    for param, rows in kpi_table.groupby("parameter", sort=True):
+        rows = rows.sort_values(["exceed_pct", "mean", "city"], ascending=[False, False, True])
+        rows = rows.head(top) if top else rows
+        sections.append({"name": param, "who": guidelines.get(param), "rows": [
+            dict(r, trend="N/A" if pd.isna(r["trend_pct_90d"]) else f"{r['trend_pct_90d']}%")
+            for r in rows.to_dict("records")]})
+    return _environment().get_template("leaderboard.md").render(
+        sections=sections, start=start, end=end, country=country,
+        now=datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC"))
@@ -0,0 +1,273 @@
+# report_service.py
+"""
+Long-running local report service: one warm process (imports, locations catalogs,
+sensor cache, compiled templates, PNG cache) answering report jobs over HTTP.
+
+    python report_service.py --port 8770 --workers 4 --queue 64 --warm SA,IN
+
+    POST /reports            {"city", "country", "parameter", "start", "end", "who"[, "window", "wait"]}
+                             → 202 {"id", "status"} (200 with the result when "wait": true,
+                               503 + Retry-After when the queue is full)
+    GET  /reports/{id}       → status, timings and, once done, kpis + markdown
+    GET  /reports/{id}/timeseries.png, /reports/{id}/rolling.png
+    GET  /stats              → queue depth, dedup hits, latency percentiles
+    GET  /healthz
+"""
+import argparse
+import json
+import queue
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from data_fetch import get_catalog
+from indicators import compute_kpis
+from pipeline import prepare_daily
+from plotting import render_png
+from report_builder import render_markdown
+
+class QueueFull(Exception):
+    """The job queue is at capacity; the client should retry later."""
+
+class Job:
+    def __init__(self, key: tuple, spec: Dict[str, Any]):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.spec = spec
+        self.status = "queued"
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.submitted = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.done = threading.Event()
+
+    def to_dict(self, full: bool = True) -> Dict[str, Any]:
+        d = {"id": self.id, "status": self.status, **self.spec}
+        if self.started:
+            d["queue_s"] = round(self.started - self.submitted, 4)
+        if self.finished:
+            d["run_s"] = round(self.finished - self.started, 4)
+        if self.error:
+            d["error"] = self.error
+        if full and self.result:
+            d.update(kpis=self.result["kpis"], report_md=self.result["report_md"])
+        return d
+
+def _percentiles(xs) -> Dict[str, Optional[float]]:
+    if not xs:
+        return {"n": 0, "p50": None, "p95": None, "max": None}
+    a = np.asarray(xs)
+    return {"n": len(a), "p50": round(float(np.percentile(a, 50)), 4),
+            "p95": round(float(np.percentile(a, 95)), 4), "max": round(float(a.max()), 4)}
+
+class ReportService:
+    """
+    Worker pool over a bounded job queue.
+    - submit() of a job identical to one queued or running returns that job (one execution).
+    - Finished jobs stay in memory (LRU of `keep`, `result_ttl` seconds) with their daily
+      frame, so repeats and chart requests are served without recomputing.
+    - A full queue raises QueueFull instead of blocking the caller (backpressure).
+    """
+
+    def __init__(self, workers: int = 4, max_queue: int = 64, keep: int = 256,
+                 result_ttl: float = 3600.0, window: int = 30):
+        self.window = window
+        self.keep = keep
+        self.result_ttl = result_ttl
+        self._queue: "queue.Queue[Job]" = queue.Queue(maxsize=max_queue)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()  # id → job, oldest first
+        self._active: Dict[tuple, Job] = {}                  # key → queued/running job
+        self._recent: Dict[tuple, Job] = {}                  # key → latest finished job
+        self._lock = threading.Lock()
+        self.counters = {"submitted": 0, "deduplicated": 0, "cached": 0, "rejected": 0, "done": 0, "failed": 0}
+        self._latency = {"queue_s": deque(maxlen=1000), "run_s": deque(maxlen=1000), "total_s": deque(maxlen=1000)}
+        self._threads = [threading.Thread(target=self._worker, daemon=True, name=f"report-worker-{i}")
+                         for i in range(max(1, workers))]
+        for t in self._threads:
+            t.start()
+
+    @staticmethod
+    def normalize(spec: Dict[str, Any], window: int) -> Dict[str, Any]:
+        """Validated job spec; raises ValueError on a missing or malformed field."""
+        try:
+            out = {
+                "city": str(spec["city"]).strip(),
+                "country": (str(spec.get("country") or "").strip().upper() or None),
+                "parameter": str(spec["parameter"]).strip().lower(),
+                "start": date.fromisoformat(str(spec["start"])),
+                "end": date.fromisoformat(str(spec["end"])),
+                "who": float(spec["who"]),
+                "window": int(spec.get("window") or window),
+            }
+        except KeyError as e:
+            raise ValueError(f"missing field {e.args[0]!r}")
+        except (TypeError, ValueError) as e:
+            raise ValueError(str(e))
+        if out["start"] > out["end"]:
+            raise ValueError("start must not be after end")
+        out["start"], out["end"] = out["start"].isoformat(), out["end"].isoformat()
+        out["report_name"] = f"{out['city']}_{out['parameter']}_{out['start']}_to_{out['end']}".replace(" ", "_")
+        return out
+
+    def submit(self, spec: Dict[str, Any]) -> Job:
+        spec = self.normalize(spec, self.window)
+        key = tuple(sorted(spec.items()))
+        with self._lock:
+            self.counters["submitted"] += 1
+            job = self._active.get(key)
+            if job is not None:
+                self.counters["deduplicated"] += 1
+                return job
+            job = self._recent.get(key)
+            if job is not None and time.time() - job.finished < self.result_ttl:
+                self.counters["cached"] += 1
+                return job
+            job = Job(key, spec)
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self.counters["rejected"] += 1
+                raise QueueFull(f"queue full ({self._queue.maxsize} jobs)")
+            self._active[key] = job
+            self._jobs[job.id] = job
+            return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _worker(self) -> None:
+        while True:
+            job = self._queue.get()
+            job.started, job.status = time.time(), "running"
+            try:
+                job.result = self._run(job.spec)
+                job.status = "done"
+            except Exception as e:
+                job.error, job.status = str(e) or type(e).__name__, "failed"
+            job.finished = time.time()
+            with self._lock:
+                self._active.pop(job.key, None)
+                self.counters[job.status] += 1
+                if job.status == "done":
+                    self._recent[job.key] = job
+                self._latency["queue_s"].append(job.started - job.submitted)
+                self._latency["run_s"].append(job.finished - job.started)
+                self._latency["total_s"].append(job.finished - job.submitted)
+                self._evict()
+            job.done.set()
+            self._queue.task_done()
+
+    def _evict(self) -> None:
+        # finished jobs beyond `keep` are dropped oldest first; queued/running ones never are
+        finished = [j for j in self._jobs.values() if j.finished]
+        for j in finished[:max(0, len(finished) - self.keep)]:
+            del self._jobs[j.id]
+            if self._recent.get(j.key) is j:
+                del self._recent[j.key]
+
+    def _run(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        daily, err = prepare_daily(spec["city"], spec["country"], spec["parameter"], spec["start"], spec["end"])
+        if err:
+            raise RuntimeError(err)
+        kpis = compute_kpis(daily, spec["who"])
+        md = render_markdown(spec["city"], spec["parameter"], spec["start"], spec["end"], kpis, spec["who"],
+                             spec["report_name"], window=spec["window"], include_images=False)
+        return {"daily": daily, "kpis": kpis, "report_md": md}
+
+    def chart(self, job: Job, kind: str) -> bytes:
+        spec = job.spec
+        if kind == "timeseries":
+            return render_png("timeseries", job.result["daily"], f"{spec['city']} — {spec['parameter'].upper()} Daily Mean",
+                              who_guideline=spec["who"])
+        return render_png("rolling", job.result["daily"],
+                          f"{spec['city']} — {spec['parameter'].upper()} {spec['window']}-day Rolling Mean",
+                          window=spec["window"])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                "running": sum(j.status == "running" for j in self._active.values()),
+                "workers": len(self._threads),
+                "counters": dict(self.counters),
+                "latency": {k: _percentiles(list(v)) for k, v in self._latency.items()},
+            }
+
+def make_server(service: ReportService, host: str = "127.0.0.1", port: int = 8770) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body, content_type: str = "application/json", headers=None):
+            payload = body if isinstance(body, bytes) else json.dumps(body, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/reports":
+                return self._send(404, {"detail": "Not Found"})
+            try:
+                spec = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                job = service.submit(spec)
+            except QueueFull as e:
+                return self._send(503, {"detail": str(e)}, headers={"Retry-After": "5"})
+            except (ValueError, TypeError, AttributeError) as e:
+                return self._send(400, {"detail": str(e)})
+            if spec.get("wait"):
+                job.done.wait()
+                return self._send(200 if job.status == "done" else 502, job.to_dict())
+            return self._send(202, job.to_dict(full=False), headers={"Location": f"/reports/{job.id}"})
+
+        def do_GET(self):
+            path = self.path.split("?", 1)[0].rstrip("/")
+            if path == "/healthz":
+                return self._send(200, {"ok": True})
+            if path == "/stats":
+                return self._send(200, service.stats())
+            m = re.fullmatch(r"/reports/([0-9a-f]+)(?:/(timeseries|rolling)\.png)?", path)
+            job = service.get(m.group(1)) if m else None
+            if job is None:
+                return self._send(404, {"detail": "Not Found"})
+            if not m.group(2):
+                return self._send(200, job.to_dict())
+            if job.status != "done":
+                return self._send(409, {"detail": f"job is {job.status}"})
+            return self._send(200, service.chart(job, m.group(2)), content_type="image/png")
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    return httpd
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Serve reports from one warm process")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8770)
+    ap.add_argument("--workers", type=int, default=4, help="jobs run concurrently")
+    ap.add_argument("--queue", type=int, default=64, help="max queued jobs before 503")
+    ap.add_argument("--warm", default="", help="comma-separated country ISO codes whose catalogs to load at start")
+    args = ap.parse_args()
+    for iso in filter(None, (c.strip() for c in args.warm.split(","))):
+        _, err = get_catalog(iso)
+        print(f"catalog {iso}: {err or 'ready'}")
+    svc = ReportService(workers=args.workers, max_queue=args.queue)
+    httpd = make_server(svc, args.host, args.port)
+    print(f"Report service on http://{args.host}:{args.port}  (Ctrl+C to stop)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        httpd.server_close()
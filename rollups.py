@@ -0,0 +1,314 @@
+# rollups.py
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from sensor_cache import SETTLE_DAYS
+from sketches import QuantileSketch
+
+# <out_root>/ROLLUP_FILE holds the cube main.py --refresh and --leaderboard keep current
+ROLLUP_FILE = "rollups.json"
+
+SEASONS = {12: "DJF", 1: "DJF", 2: "DJF", 3: "MAM", 4: "MAM", 5: "MAM",
+           6: "JJA", 7: "JJA", 8: "JJA", 9: "SON", 10: "SON", 11: "SON"}
+
+# a daily frame, or a function (start, end) -> daily frame, used for partial-month edges
+DailySource = Union[pd.DataFrame, Callable[[str, str], pd.DataFrame]]
+
+def _month(ts) -> int:
+    """Month number (year * 12 + month - 1) of a Timestamp/date."""
+    return ts.year * 12 + ts.month - 1
+
+def _month_label(m: int) -> str:
+    return f"{m // 12:04d}-{m % 12 + 1:02d}"
+
+class MonthCell:
+    """Rollup of one series' days in one calendar month (daily means, plus daily medians)."""
+
+    def __init__(self, thresholds: Sequence[float], alpha: float):
+        self.days = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.exceed = {float(t): 0 for t in thresholds}
+        self.means = QuantileSketch(alpha)
+        self.medians = QuantileSketch(alpha)
+
+    def add(self, means: np.ndarray, medians: np.ndarray) -> None:
+        self.days += len(means)
+        self.total += float(means.sum())
+        lo, hi = float(means.min()), float(means.max())
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+        for t in self.exceed:
+            self.exceed[t] += int((means > t).sum())
+        self.means.add_many(means)
+        self.medians.add_many(medians)
+
+    def merge(self, other: "MonthCell") -> "MonthCell":
+        self.days += other.days
+        self.total += other.total
+        for attr, pick in (("min", min), ("max", max)):
+            a, b = getattr(self, attr), getattr(other, attr)
+            setattr(self, attr, b if a is None else a if b is None else pick(a, b))
+        for t in self.exceed:
+            self.exceed[t] += other.exceed.get(t, 0)
+        self.means.merge(other.means)
+        self.medians.merge(other.medians)
+        return self
+
+    def to_dict(self) -> dict:
+        return {"days": self.days, "total": self.total, "min": self.min, "max": self.max,
+                "exceed": {str(t): n for t, n in self.exceed.items()},
+                "means": self.means.to_dict(), "medians": self.medians.to_dict()}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "MonthCell":
+        cell = cls([], d["means"]["alpha"])
+        cell.days, cell.total, cell.min, cell.max = d["days"], d["total"], d["min"], d["max"]
+        cell.exceed = {float(t): n for t, n in d["exceed"].items()}
+        cell.means = QuantileSketch.from_dict(d["means"])
+        cell.medians = QuantileSketch.from_dict(d["medians"])
+        return cell
+
+class RollupCube:
+    """
+    Materialized monthly rollups of daily series, one series per key (main.py uses
+    "city/parameter"). Each month keeps the day count, sum, min/max, exceedance counts for
+    every configured threshold and QuantileSketches of the daily means and medians;
+    seasons and years are merges of months, computed on demand; merged years are kept
+    (and dropped again when update() touches them) since long ranges are mostly whole years.
+
+    update() only folds in days after the last one seen per key and up to the settled
+    cutoff (days OpenAQ may still revise wait for a later update), so a nightly refresh
+    costs the newly settled days. kpis() over [start, end] merges the whole months inside
+    it and reads raw days only for the partial months at the edges and for the 90-day
+    trend (at most ~180 rows), so a 10-year query costs ~120 month merges, not ~3650 rows.
+    days_total, days_exceed, exceed_pct and mean match compute_kpis exactly; median and
+    p95 are within the sketches' `alpha` relative error.
+    """
+
+    def __init__(self, thresholds: Sequence[float] = (15.0,), alpha: float = 0.005):
+        self.thresholds = [float(t) for t in thresholds]
+        self.alpha = alpha
+        self.series: Dict[str, Dict[int, MonthCell]] = {}
+        self.last_date: Dict[str, str] = {}
+        self._years: Dict[tuple, MonthCell] = {}
+
+    def keys(self) -> List[str]:
+        return sorted(self.series)
+
+    # ---- building ----
+    def update(self, key: str, daily_df: pd.DataFrame, settled: Optional[str] = None) -> int:
+        """
+        Fold in a daily frame (date, mean[, median]) for `key`, up to `settled` (default:
+        SETTLE_DAYS before today, UTC); returns the number of days added.
+        """
+        if daily_df.empty:
+            return 0
+        dd = daily_df.dropna(subset=["mean"])
+        dates = pd.to_datetime(dd["date"])
+        if isinstance(dates.dtype, pd.DatetimeTZDtype):
+            dates = dates.dt.tz_convert(None)
+        if settled is None:
+            settled = (datetime.now(timezone.utc).date() - timedelta(days=SETTLE_DAYS)).isoformat()
+        keep = dates <= pd.Timestamp(settled)
+        if key in self.last_date:
+            keep &= dates > pd.Timestamp(self.last_date[key])
+        dd, dates = dd[keep.to_numpy()], dates[keep.to_numpy()]
+        if dd.empty:
+            return 0
+        means = dd["mean"].to_numpy(dtype="float64")
+        medians = dd["median"].to_numpy(dtype="float64") if "median" in dd else means
+        months = (dates.dt.year * 12 + dates.dt.month - 1).to_numpy()
+        cells = self.series.setdefault(key, {})
+        order = np.argsort(months, kind="stable")
+        uniq, starts = np.unique(months[order], return_index=True)
+        for m, part in zip(uniq.tolist(), np.split(order, starts[1:])):
+            self._years.pop((key, m // 12), None)
+            cell = cells.get(m)
+            if cell is None:
+                cell = cells[m] = MonthCell(self.thresholds, self.alpha)
+            cell.add(means[part], medians[part])
+        self.last_date[key] = dates.max().date().isoformat()
+        return len(means)
+
+    # ---- queries ----
+    def _cells(self, key: str, m0: int, m1: int) -> Dict[int, MonthCell]:
+        return {m: c for m, c in self.series.get(key, {}).items() if m0 <= m <= m1}
+
+    def _merged(self, key: str, m0: int, m1: int) -> MonthCell:
+        """Merge of months m0..m1, using the cached merge of each whole calendar year inside."""
+        cells = self.series.get(key, {})
+        acc = MonthCell(self.thresholds, self.alpha)
+        m = m0
+        while m <= m1:
+            year = m // 12
+            if m % 12 == 0 and m + 11 <= m1:
+                cached = self._years.get((key, year))
+                if cached is None:
+                    cached = self._years[(key, year)] = MonthCell(self.thresholds, self.alpha)
+                    for mm in range(m, m + 12):
+                        if mm in cells:
+                            cached.merge(cells[mm])
+                acc.merge(cached)
+                m += 12
+            else:
+                if m in cells:
+                    acc.merge(cells[m])
+                m += 1
+        return acc
+
+    def rollup(self, key: str, level: str = "month", start: Optional[str] = None,
+               end: Optional[str] = None) -> pd.DataFrame:
+        """
+        One row per month / season / year of whole months in [start, end]: period, days,
+        mean, min, max, median, p95 and exceed_<threshold> counts. Seasons are
+        meteorological (DJF counts December toward the next year's winter).
+        """
+        cells = self.series.get(key, {})
+        if not cells:
+            return pd.DataFrame(columns=["period", "days", "mean", "min", "max", "median", "p95"]
+                                + [f"exceed_{t:g}" for t in self.thresholds])
+        m0 = _month(pd.Timestamp(start)) if start else min(cells)
+        m1 = _month(pd.Timestamp(end)) if end else max(cells)
+        groups: Dict[str, MonthCell] = {}
+        for m in sorted(self._cells(key, m0, m1)):
+            year, month = m // 12, m % 12 + 1
+            if level == "month":
+                label = _month_label(m)
+            elif level == "season":
+                label = f"{year + (month == 12)}-{SEASONS[month]}"
+            elif level == "year":
+                label = str(year)
+            else:
+                raise ValueError(f"level must be month, season or year, not {level!r}")
+            acc = groups.get(label)
+            groups[label] = MonthCell.from_dict(cells[m].to_dict()) if acc is None else acc.merge(cells[m])
+        return pd.DataFrame([self._row(label, c) for label, c in groups.items()])
+
+    def _row(self, label: str, c: MonthCell) -> dict:
+        row = {"period": label, "days": c.days, "mean": c.total / c.days if c.days else None,
+               "min": c.min, "max": c.max, "median": c.medians.quantile(0.5), "p95": c.means.quantile(0.95)}
+        row.update({f"exceed_{t:g}": c.exceed.get(t, 0) for t in self.thresholds})
+        return row
+
+    def kpis(self, key: str, start: str, end: str, who_24h_guideline: float,
+             daily: Optional[DailySource] = None) -> dict:
+        """
+        compute_kpis over [start, end] from the rollups. `daily` (a frame, or a function
+        (start, end) → frame) supplies the raw days of partial edge months and the trend
+        tail; without it the range must be whole months and the trend is None.
+        """
+        who = float(who_24h_guideline)
+        if who not in self.thresholds:
+            raise ValueError(f"no rollup for threshold {who}; cube has {self.thresholds}")
+        lo, hi = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+        m0, m1 = _month(lo), _month(hi)
+        first_whole = m0 if lo.day == 1 else m0 + 1
+        last_whole = m1 if (hi + pd.Timedelta(days=1)).day == 1 else m1 - 1
+        source = self._source(daily)
+
+        acc = self._merged(key, first_whole, last_whole)
+        edges = []
+        if m0 < first_whole:
+            edges.append((lo, min(hi, _month_end(m0))))
+        if m1 > last_whole and (m1 != m0 or not edges):
+            edges.append((max(lo, _month_start(m1)), hi))
+        if edges and source is None:
+            raise ValueError("range has partial months; pass `daily` to read their days")
+        for a, b in edges:
+            d = source(a, b)
+            if len(d):
+                acc.add(d["mean"].to_numpy(dtype="float64"), d["median"].to_numpy(dtype="float64"))
+
+        if not acc.days:
+            return {"days_total": 0, "days_exceed": 0, "exceed_pct": 0.0,
+                    "mean": None, "median": None, "p95": None, "trend_pct_90d": None}
+        median = acc.medians.quantile(0.5)
+        return {
+            "days_total": acc.days,
+            "days_exceed": acc.exceed[who],
+            "exceed_pct": round(acc.exceed[who] / acc.days * 100.0, 2),
+            "mean": round(acc.total / acc.days, 2),
+            "median": round(median, 2) if median is not None else None,
+            "p95": round(acc.means.quantile(0.95), 2),
+            "trend_pct_90d": self._trend(key, lo, hi, acc.days, source),
+        }
+
+    def _trend(self, key: str, lo: pd.Timestamp, hi: pd.Timestamp, n: int, source) -> Optional[float]:
+        """compute_kpis' 90-row rolling trend, from only the last ≤180 rows of the range."""
+        if source is None or n < 30:
+            return None
+        # hi's month plus whole months before it until those hold 180 rows (or the range starts)
+        cells = self.series.get(key, {})
+        m, held = _month(hi), 0
+        while held < 180 and m > _month(lo):
+            m -= 1
+            held += cells[m].days if m in cells else 0
+        first = max(lo, _month_start(m))
+        tail = source(first, hi)["mean"].to_numpy(dtype="float64")[-180:]
+        last90 = float(tail[-90:].mean()) if len(tail) >= 30 else None
+        prev90 = float(tail[-180:-90].mean()) if n > 180 and len(tail) >= 180 else None
+        if last90 is None or not prev90:
+            return None
+        return round((last90 / prev90 - 1.0) * 100.0, 2)
+
+    @staticmethod
+    def _source(daily: Optional[DailySource]):
+        """(lo, hi) → clean rows in [lo, hi]; a frame is cleaned once and then sliced by date."""
+        if daily is None:
+            return None
+        if callable(daily):
+            return lambda a, b: _clean(daily(a.date().isoformat(), b.date().isoformat()), a, b)
+        full = _clean(daily, pd.Timestamp.min, pd.Timestamp.max)
+        dates = full["date"].to_numpy()
+        return lambda a, b: full.iloc[np.searchsorted(dates, a.to_datetime64(), "left"):
+                                      np.searchsorted(dates, b.to_datetime64(), "right")]
+
+    # ---- persistence ----
+    def to_dict(self) -> dict:
+        return {"thresholds": self.thresholds, "alpha": self.alpha, "last_date": self.last_date,
+                "series": {k: {_month_label(m): c.to_dict() for m, c in cells.items()}
+                           for k, cells in self.series.items()}}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "RollupCube":
+        cube = cls(d["thresholds"], d["alpha"])
+        cube.last_date = dict(d["last_date"])
+        for k, cells in d["series"].items():
+            cube.series[k] = {_month(pd.Timestamp(label + "-01")): MonthCell.from_dict(c) for label, c in cells.items()}
+        return cube
+
+    def save(self, path: str) -> None:
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "RollupCube":
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+def _month_start(m: int) -> pd.Timestamp:
+    return pd.Timestamp(year=m // 12, month=m % 12 + 1, day=1)
+
+def _month_end(m: int) -> pd.Timestamp:
+    return _month_start(m + 1) - pd.Timedelta(days=1)
+
+def _clean(df: pd.DataFrame, lo: pd.Timestamp, hi: pd.Timestamp) -> pd.DataFrame:
+    """Rows of a daily frame with a mean, dated within [lo, hi], oldest first (median defaults to mean)."""
+    if df is None or df.empty:
+        return pd.DataFrame({"date": pd.Series(dtype="datetime64[ns]"), "mean": [], "median": []})
+    dates = pd.to_datetime(df["date"])
+    if isinstance(dates.dtype, pd.DatetimeTZDtype):
+        dates = dates.dt.tz_convert(None)
+    out = pd.DataFrame({"date": dates.to_numpy(), "mean": df["mean"].to_numpy(dtype="float64"),
+                        "median": df["median" if "median" in df else "mean"].to_numpy(dtype="float64")})
+    out = out[out["mean"].notna() & (out["date"] >= lo) & (out["date"] <= hi)]
+    return out.sort_values("date", kind="stable").reset_index(drop=True)
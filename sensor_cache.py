@@ -0,0 +1,138 @@
+# sensor_cache.py
+import os
+import sqlite3
+from contextlib import closing
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+import pandas as pd
+
+from settings import getenv
+
+# Default location; OPENAQ_CACHE_PATH (environment or .env) overrides it, "" disables the cache.
+CACHE_PATH = os.path.join(".cache", "openaq.sqlite")
+# Days this close to "today" (UTC) are never marked as held: OpenAQ keeps
+# back-filling them, so they are re-fetched on every run until they settle.
+SETTLE_DAYS = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sensor_days (
+    sensor_id INTEGER NOT NULL,
+    datetime  TEXT    NOT NULL,
+    value     REAL,
+    unit      TEXT,
+    PRIMARY KEY (sensor_id, datetime)
+);
+CREATE TABLE IF NOT EXISTS sensor_coverage (
+    sensor_id INTEGER NOT NULL,
+    day_from  TEXT    NOT NULL,
+    day_to    TEXT    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_sensor_coverage ON sensor_coverage (sensor_id);
+"""
+
+def _day(s: str) -> date:
+    return date.fromisoformat(s[:10])
+
+def _merge_ranges(ranges: List[Tuple[date, date]]) -> List[Tuple[date, date]]:
+    """Collapse overlapping/adjacent [from, to] day ranges."""
+    out: List[Tuple[date, date]] = []
+    for lo, hi in sorted(ranges):
+        if out and lo <= out[-1][1] + timedelta(days=1):
+            out[-1] = (out[-1][0], max(out[-1][1], hi))
+        else:
+            out.append((lo, hi))
+    return out
+
+class SensorDayCache:
+    """
+    SQLite cache of OpenAQ /sensors/{id}/days results.
+    `sensor_days` holds the rows, `sensor_coverage` the UTC day ranges that
+    were fully fetched, so callers only go to the API for the gaps.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path = path or cache_path()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with closing(self._connect()) as con:
+            con.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # one short-lived connection per call keeps this safe to share across threads
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _coverage(self, con: sqlite3.Connection, sensor_id: int) -> List[Tuple[date, date]]:
+        rows = con.execute(
+            "SELECT day_from, day_to FROM sensor_coverage WHERE sensor_id = ?", (sensor_id,)
+        ).fetchall()
+        return [(_day(a), _day(b)) for a, b in rows]
+
+    def missing_ranges(self, sensor_id: int, date_from: str, date_to: str) -> List[Tuple[str, str]]:
+        """Sub-ranges of [date_from, date_to] (inclusive, YYYY-MM-DD) not held yet."""
+        lo, hi = _day(date_from), _day(date_to)
+        with closing(self._connect()) as con:
+            held = _merge_ranges(self._coverage(con, sensor_id))
+        gaps = []
+        cur = lo
+        for a, b in held:
+            if b < cur or a > hi:
+                continue
+            if a > cur:
+                gaps.append((cur, a - timedelta(days=1)))
+            cur = max(cur, b + timedelta(days=1))
+            if cur > hi:
+                break
+        if cur <= hi:
+            gaps.append((cur, hi))
+        return [(a.isoformat(), b.isoformat()) for a, b in gaps]
+
+    def store(self, sensor_id: int, df: pd.DataFrame, date_from: str, date_to: str) -> None:
+        """
+        Upsert fetched rows and record [date_from, date_to] as held, minus the
+        last SETTLE_DAYS which may still change upstream.
+        """
+        rows = []
+        if not df.empty:
+            ts = pd.to_datetime(df["datetime"], utc=True).dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+            rows = list(zip([sensor_id] * len(df), ts, df["value"].astype(float), df["unit"]))
+        settled = datetime.now(timezone.utc).date() - timedelta(days=SETTLE_DAYS)
+        lo, hi = _day(date_from), min(_day(date_to), settled)
+        with closing(self._connect()) as con, con:
+            if rows:
+                con.executemany(
+                    "INSERT OR REPLACE INTO sensor_days (sensor_id, datetime, value, unit) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+            if lo <= hi:
+                merged = _merge_ranges(self._coverage(con, sensor_id) + [(lo, hi)])
+                con.execute("DELETE FROM sensor_coverage WHERE sensor_id = ?", (sensor_id,))
+                con.executemany(
+                    "INSERT INTO sensor_coverage (sensor_id, day_from, day_to) VALUES (?, ?, ?)",
+                    [(sensor_id, a.isoformat(), b.isoformat()) for a, b in merged],
+                )
+
+    def read(self, sensor_id: int, date_from: str, date_to: str) -> List[Tuple[str, float, Optional[str]]]:
+        """(datetime_utc, value, unit) rows inside the window, oldest first."""
+        with closing(self._connect()) as con:
+            return con.execute(
+                "SELECT datetime, value, unit FROM sensor_days "
+                "WHERE sensor_id = ? AND datetime >= ? AND datetime <= ? ORDER BY datetime",
+                (sensor_id, f"{date_from}T00:00:00Z", f"{date_to}T23:59:59Z"),
+            ).fetchall()
+
+_default: Optional[SensorDayCache] = None
+
+def cache_path() -> str:
+    """SQLite file of the default cache: OPENAQ_CACHE_PATH, else CACHE_PATH ("" turns caching off)."""
+    return getenv("OPENAQ_CACHE_PATH", CACHE_PATH)
+
+def default_cache() -> Optional[SensorDayCache]:
+    """Process-wide cache at cache_path(), or None when caching is disabled."""
+    global _default
+    if _default is None:
+        path = cache_path()
+        if not path:
+            return None
+        _default = SensorDayCache(path)
+    return _default
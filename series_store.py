@@ -0,0 +1,255 @@
+# series_store.py
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from indicators import aggregate_matrix
+from sensor_cache import SETTLE_DAYS, _merge_ranges
+from settings import getenv
+
+try:
+    import fcntl
+except ImportError:     # Windows: writers are only serialised within the process
+    fcntl = None
+
+# Default root; ENVREPORT_STORE (environment or .env) overrides it.
+STORE_PATH = os.path.join(".cache", "series")
+# dtype of new files (each file's meta records its own)
+DTYPE = "float64"
+_DAY = np.timedelta64(1, "D")
+
+_path_locks: Dict[str, threading.Lock] = {}
+_path_locks_guard = threading.Lock()
+
+def _to_days(values) -> np.ndarray:
+    """Dates / timestamps (tz-aware → UTC) → datetime64[D]."""
+    s = pd.Series(values)
+    if isinstance(s.dtype, pd.DatetimeTZDtype):
+        s = s.dt.tz_convert(None)
+    return pd.to_datetime(s).to_numpy().astype("datetime64[D]")
+
+def store_path() -> str:
+    """Root directory of a SeriesStore built without one: ENVREPORT_STORE, else STORE_PATH."""
+    return getenv("ENVREPORT_STORE", STORE_PATH)
+
+@contextmanager
+def _locked(path: str):
+    """Hold path + ".lock" exclusively: a thread lock per path, plus flock across processes."""
+    with _path_locks_guard:
+        lock = _path_locks.setdefault(os.path.abspath(path), threading.Lock())
+    with lock, open(path + ".lock", "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+class SeriesStore:
+    """
+    Local store of daily values per (parameter, sensor), one memory-mapped file each:
+
+        <root>/<parameter>/<sensor_id>.bin   value of day origin + i at offset i (NaN = no data)
+        <root>/<parameter>/<sensor_id>.json  {"origin": "YYYY-MM-DD", "unit": ..., "dtype": ...,
+                                              "held": [["YYYY-MM-DD", "YYYY-MM-DD"], ...]}
+
+    "held" lists the day ranges fetched in full (minus the last SETTLE_DAYS, which OpenAQ
+    still revises), so a NaN inside them means "no data" and missing_ranges() tells the
+    fetch path what it still has to request. Reads return views into the mapped file,
+    so slicing years of many sensors copies nothing until the caller needs a dense
+    matrix. Writes extend the file in place; days before the origin rewrite it once.
+    Writes to one sensor file are serialised by a lock file next to it, so overlapping
+    jobs (e.g. "Delhi" and "New Delhi" sharing sensors) cannot lose each other's days.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or store_path()
+
+    def _paths(self, parameter: str, sensor_id: int) -> Tuple[str, str]:
+        base = os.path.join(self.root, parameter, str(int(sensor_id)))
+        return base + ".bin", base + ".json"
+
+    def _meta(self, parameter: str, sensor_id: int) -> Optional[dict]:
+        _, meta = self._paths(parameter, sensor_id)
+        if not os.path.exists(meta):
+            return None
+        with open(meta, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_meta(self, parameter: str, sensor_id: int, meta: dict) -> None:
+        _, path = self._paths(parameter, sensor_id)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _dtype(meta: Optional[dict]) -> np.dtype:
+        return np.dtype((meta or {}).get("dtype", DTYPE))
+
+    def sensors(self, parameter: str) -> List[int]:
+        d = os.path.join(self.root, parameter)
+        if not os.path.isdir(d):
+            return []
+        return sorted(int(f[:-4]) for f in os.listdir(d) if f.endswith(".bin"))
+
+    def span(self, parameter: str, sensor_id: int) -> Optional[Tuple[np.datetime64, np.datetime64]]:
+        """(first day, last day) held for a sensor, or None."""
+        meta = self._meta(parameter, sensor_id)
+        if meta is None:
+            return None
+        n = os.path.getsize(self._paths(parameter, sensor_id)[0]) // self._dtype(meta).itemsize
+        if not n:
+            return None
+        origin = np.datetime64(meta["origin"], "D")
+        return origin, origin + (n - 1) * _DAY
+
+    def missing_ranges(self, parameter: str, sensor_id: int, date_from: str, date_to: str) -> List[Tuple[str, str]]:
+        """Sub-ranges of [date_from, date_to] (inclusive, YYYY-MM-DD) not fetched into the store yet."""
+        meta = self._meta(parameter, sensor_id) or {}
+        lo, hi = date.fromisoformat(date_from), date.fromisoformat(date_to)
+        gaps, cur = [], lo
+        for a, b in _merge_ranges([(date.fromisoformat(a), date.fromisoformat(b)) for a, b in meta.get("held", [])]):
+            if b < cur or a > hi:
+                continue
+            if a > cur:
+                gaps.append((cur, a - timedelta(days=1)))
+            cur = max(cur, b + timedelta(days=1))
+            if cur > hi:
+                break
+        if cur <= hi:
+            gaps.append((cur, hi))
+        return [(a.isoformat(), b.isoformat()) for a, b in gaps]
+
+    # ---- writes ----
+    def write(self, parameter: str, sensor_id: int, days, values, unit: Optional[str] = None,
+              held: Optional[Tuple[str, str]] = None) -> int:
+        """
+        Store daily values (later writes of the same day win). With held=(from, to) the
+        range is recorded as fully fetched, even when it brought no values.
+        Returns the number written.
+        """
+        days = _to_days(days)
+        if not len(days) and held is None:
+            return 0
+        data, _ = self._paths(parameter, sensor_id)
+        os.makedirs(os.path.dirname(data), exist_ok=True)
+        with _locked(data):
+            return self._write(parameter, sensor_id, days, values, unit, held)
+
+    def _write(self, parameter: str, sensor_id: int, days: np.ndarray, values, unit: Optional[str],
+               held: Optional[Tuple[str, str]]) -> int:
+        data, _ = self._paths(parameter, sensor_id)
+        meta = self._meta(parameter, sensor_id)
+        dtype = self._dtype(meta)
+        if meta is None:
+            first = days.min() if len(days) else np.datetime64(held[0], "D")
+            meta = {"origin": str(first), "unit": unit, "dtype": dtype.name, "held": []}
+            open(data, "wb").close()
+        unit = unit if unit is not None else meta.get("unit")
+        values = np.asarray(values, dtype=dtype)
+        origin = np.datetime64(meta["origin"], "D")
+        n = os.path.getsize(data) // dtype.itemsize
+
+        if len(days):
+            lo, hi = days.min(), days.max()
+            if lo < origin:
+                # days before the current origin: rewrite with a new origin once
+                old = np.fromfile(data, dtype=dtype)
+                shift = int((origin - lo) // _DAY)
+                arr = np.full(max(shift + len(old), int((hi - lo) // _DAY) + 1), np.nan, dtype=dtype)
+                arr[shift:shift + len(old)] = old
+                arr.tofile(data + ".tmp")
+                os.replace(data + ".tmp", data)
+                origin, n = lo, len(arr)
+            elif int((hi - origin) // _DAY) >= n:
+                # append-only growth: pad the tail with NaN up to the last new day
+                with open(data, "ab") as f:
+                    f.write(np.full(int((hi - origin) // _DAY) + 1 - n, np.nan, dtype=dtype).tobytes())
+
+            mm = np.memmap(data, dtype=dtype, mode="r+")
+            mm[((days - origin) // _DAY).astype("int64")] = values
+            mm.flush()
+            del mm
+
+        held_ranges = [(date.fromisoformat(a), date.fromisoformat(b)) for a, b in meta.get("held", [])]
+        if held is not None:
+            settled = datetime.now(timezone.utc).date() - timedelta(days=SETTLE_DAYS)
+            a, b = date.fromisoformat(held[0]), min(date.fromisoformat(held[1]), settled)
+            if a <= b:
+                held_ranges.append((a, b))
+        self._write_meta(parameter, sensor_id, {
+            "origin": str(origin), "unit": unit, "dtype": dtype.name,
+            "held": [[a.isoformat(), b.isoformat()] for a, b in _merge_ranges(held_ranges)],
+        })
+        return len(days)
+
+    def ingest(self, parameter: str, df: pd.DataFrame, held: Optional[Tuple[str, str]] = None) -> int:
+        """
+        Write a long readings frame (datetime, value, sensor_id[, unit]) as fetched from OpenAQ.
+        With held=(from, to), that range counts as fully fetched for every sensor in the frame.
+        """
+        total = 0
+        for sensor_id, g in df.groupby("sensor_id", sort=False, observed=True):
+            unit = str(g["unit"].iloc[0]) if "unit" in g and len(g) else None
+            total += self.write(parameter, int(sensor_id), g["datetime"], g["value"], unit, held)
+        return total
+
+    # ---- reads ----
+    def read(self, parameter: str, sensor_id: int, start: str, end: str) -> Tuple[pd.DatetimeIndex, np.ndarray]:
+        """
+        Zero-copy slice of one sensor over [start, end], clipped to what is held:
+        (days, values) where values is a read-only view into the mapped file.
+        """
+        span = self.span(parameter, sensor_id)
+        lo, hi = np.datetime64(start, "D"), np.datetime64(end, "D")
+        if span is None or hi < span[0] or lo > span[1]:
+            return pd.DatetimeIndex([]), np.empty(0, dtype=DTYPE)
+        origin = span[0]
+        i0 = int((max(lo, origin) - origin) // _DAY)
+        i1 = int((min(hi, span[1]) - origin) // _DAY) + 1
+        dtype = self._dtype(self._meta(parameter, sensor_id))
+        view = np.memmap(self._paths(parameter, sensor_id)[0], dtype=dtype, mode="r")[i0:i1]
+        return pd.date_range(str(origin + i0 * _DAY), periods=i1 - i0, freq="D"), view
+
+    def read_many(self, parameter: str, sensor_ids: Iterable[int], start: str, end: str) -> Dict[int, Tuple[pd.DatetimeIndex, np.ndarray]]:
+        """read() for several sensors; still zero-copy, one view per sensor."""
+        return {int(s): self.read(parameter, s, start, end) for s in sensor_ids}
+
+    def read_matrix(self, parameter: str, sensor_ids: Iterable[int], start: str, end: str):
+        """Dense sensor × day matrix over [start, end] (NaN where not held), like indicators.sensor_day_matrix."""
+        sensor_ids = [int(s) for s in sensor_ids]
+        days = pd.date_range(start, end, freq="D")
+        m = np.full((len(sensor_ids), len(days)), np.nan)
+        first = np.datetime64(start, "D")
+        for row, sid in enumerate(sensor_ids):
+            d, v = self.read(parameter, sid, start, end)
+            if len(d):
+                i0 = int((d[0].to_datetime64().astype("datetime64[D]") - first) // _DAY)
+                m[row, i0:i0 + len(v)] = v
+        return m, np.array(sensor_ids), days
+
+    def read_long(self, parameter: str, sensor_ids: Iterable[int], start: str, end: str) -> pd.DataFrame:
+        """
+        Long (datetime, value, unit, sensor_id) frame, the shape fetch_daily_for_sensor
+        returns and daily_agg / cross_sensor_daily take.
+        """
+        frames = []
+        for sid, (d, v) in self.read_many(parameter, sensor_ids, start, end).items():
+            ok = ~np.isnan(v)
+            unit = (self._meta(parameter, sid) or {}).get("unit")
+            frames.append(pd.DataFrame({"datetime": d[ok].tz_localize("UTC"), "value": v[ok].astype("float64"),
+                                        "unit": pd.Categorical([unit] * int(ok.sum())),
+                                        "sensor_id": np.full(int(ok.sum()), sid, dtype="int32")}))
+        if not frames:
+            return pd.DataFrame({"datetime": pd.Series(dtype="datetime64[ns, UTC]"), "value": pd.Series(dtype="float64"),
+                                 "unit": pd.Series(dtype="category"), "sensor_id": pd.Series(dtype="int32")})
+        return pd.concat(frames, ignore_index=True)
+
+    def read_daily(self, parameter: str, sensor_ids: Iterable[int], start: str, end: str) -> pd.DataFrame:
+        """Cross-sensor daily frame (date, mean, median, n, …) straight from disk, ready for compute_kpis."""
+        m, ids, days = self.read_matrix(parameter, sensor_ids, start, end)
+        return aggregate_matrix(m, ids, days)
@@ -0,0 +1,26 @@
+# settings.py
+"""
+Environment lookups that honour .env. The file is loaded on the first lookup rather
+than at import, so modules can resolve paths lazily without pulling in python-dotenv
+on fast paths that never need a setting.
+"""
+import os
+import threading
+from typing import Optional
+
+_loaded = False
+_lock = threading.Lock()
+
+def load_env() -> None:
+    """Load .env into os.environ once (existing variables win)."""
+    global _loaded
+    if not _loaded:
+        with _lock:
+            if not _loaded:
+                from dotenv import load_dotenv
+                load_dotenv()
+                _loaded = True
+
+def getenv(name: str, default: Optional[str] = None) -> Optional[str]:
+    load_env()
+    return os.getenv(name, default)
@@ -0,0 +1,112 @@
+# sketches.py
+import math
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with relative-error buckets (the DDSketch scheme).
+
+    Accuracy: any quantile it returns is within `alpha` relative error of the true
+    order statistic at that rank (|estimate - true| <= alpha * |true|), for every
+    rank and any data distribution. Interpolated quantiles (pandas' default
+    "linear" method) inherit the same bound. Min and max are tracked exactly.
+    Size grows with log(max/min)/alpha, not with the number of values: at the
+    default alpha=0.005, 0.1 to 1000 µg/m³ needs ~920 buckets at most.
+    """
+
+    def __init__(self, alpha: float = 0.005):
+        self.alpha = alpha
+        self.gamma = (1.0 + alpha) / (1.0 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.pos: Dict[int, int] = {}
+        self.neg: Dict[int, int] = {}
+        self.zero = 0
+        self.count = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def _bucket_keys(self, mags: np.ndarray) -> np.ndarray:
+        return np.ceil(np.log(mags) / self._log_gamma).astype(np.int64)
+
+    def _value(self, key: int) -> float:
+        return 2.0 * self.gamma ** key / (self.gamma + 1.0)
+
+    def add(self, value: float) -> None:
+        self.add_many([value])
+
+    def add_many(self, values: Iterable[float]) -> None:
+        """Add values in one vectorized pass; NaNs are ignored."""
+        v = np.asarray(values, dtype="float64").ravel()
+        v = v[~np.isnan(v)]
+        if not v.size:
+            return
+        for store, mags in ((self.pos, v[v > 0]), (self.neg, -v[v < 0])):
+            if mags.size:
+                keys, counts = np.unique(self._bucket_keys(mags), return_counts=True)
+                for k, c in zip(keys.tolist(), counts.tolist()):
+                    store[k] = store.get(k, 0) + c
+        self.zero += int((v == 0).sum())
+        self.count += int(v.size)
+        lo, hi = float(v.min()), float(v.max())
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Fold `other` (same alpha) into this sketch in place and return self."""
+        if other.alpha != self.alpha:
+            raise ValueError("Cannot merge sketches with different alpha.")
+        for store, o in ((self.pos, other.pos), (self.neg, other.neg)):
+            for k, c in o.items():
+                store[k] = store.get(k, 0) + c
+        self.zero += other.zero
+        self.count += other.count
+        for attr, pick in (("min", min), ("max", max)):
+            a, b = getattr(self, attr), getattr(other, attr)
+            setattr(self, attr, b if a is None else a if b is None else pick(a, b))
+        return self
+
+    def _at_rank(self, rank: int) -> float:
+        if rank <= 0:
+            return self.min
+        if rank >= self.count - 1:
+            return self.max
+        seen = 0
+        for k in sorted(self.neg, reverse=True):
+            seen += self.neg[k]
+            if seen > rank:
+                return -self._value(k)
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for k in sorted(self.pos):
+            seen += self.pos[k]
+            if seen > rank:
+                return min(max(self._value(k), self.min), self.max)
+        return self.max
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Linearly interpolated q-quantile (0 <= q <= 1), None when empty."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        lo, hi = math.floor(rank), math.ceil(rank)
+        a = self._at_rank(lo)
+        return a if hi == lo else a + (self._at_rank(hi) - a) * (rank - lo)
+
+    def to_dict(self) -> dict:
+        return {
+            "alpha": self.alpha, "zero": self.zero, "count": self.count,
+            "min": self.min, "max": self.max,
+            "pos": {str(k): c for k, c in self.pos.items()},
+            "neg": {str(k): c for k, c in self.neg.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "QuantileSketch":
+        s = cls(d["alpha"])
+        s.zero, s.count, s.min, s.max = d["zero"], d["count"], d["min"], d["max"]
+        s.pos = {int(k): c for k, c in d["pos"].items()}
+        s.neg = {int(k): c for k, c in d["neg"].items()}
+        return s
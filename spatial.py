@@ -0,0 +1,102 @@
+# spatial.py
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+EARTH_KM = 6371.0088
+
+def haversine_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Great-circle distance (km) from one point to arrays of points."""
+    p1, p2 = math.radians(lat), np.radians(lats)
+    dphi = p2 - p1
+    dlmb = np.radians(lons) - math.radians(lon)
+    a = np.sin(dphi / 2) ** 2 + math.cos(p1) * np.cos(p2) * np.sin(dlmb / 2) ** 2
+    return 2 * EARTH_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+class GridIndex:
+    """
+    Fixed lat/lon grid over points (cell_deg degrees a side, ~55 km at the default 0.5).
+    A radius query only measures points in the cells overlapping the circle's bounding
+    box, so it costs the same for a country of 10 stations or 10,000. Items are the
+    caller's own ids (e.g. catalog row numbers); queries return them nearest first.
+    """
+
+    def __init__(self, ids: Sequence[int], lats: Sequence[float], lons: Sequence[float], cell_deg: float = 0.5):
+        self.cell_deg = cell_deg
+        self.ids = np.asarray(ids, dtype="int64")
+        self.lats = np.asarray(lats, dtype="float64")
+        self.lons = np.asarray(lons, dtype="float64")
+        self.cells: Dict[Tuple[int, int], np.ndarray] = {}
+        rows = np.floor(self.lats / cell_deg).astype("int64")
+        cols = np.floor(self.lons / cell_deg).astype("int64")
+        order = np.lexsort((cols, rows))
+        keys = np.stack([rows[order], cols[order]], axis=1)
+        if len(order):
+            starts = np.flatnonzero(np.r_[True, np.any(keys[1:] != keys[:-1], axis=1)])
+            for part in np.split(order, starts[1:]):
+                self.cells[(int(rows[part[0]]), int(cols[part[0]]))] = part
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def within(self, lat: float, lon: float, radius_km: float) -> List[Tuple[int, float]]:
+        """(id, distance_km) of points within radius_km, nearest first."""
+        dlat = radius_km / 111.2
+        coslat = max(math.cos(math.radians(min(abs(lat) + dlat, 89.9))), 1e-6)
+        dlon = min(radius_km / (111.2 * coslat), 180.0)
+        r0, r1 = math.floor((lat - dlat) / self.cell_deg), math.floor((lat + dlat) / self.cell_deg)
+        c0, c1 = math.floor((lon - dlon) / self.cell_deg), math.floor((lon + dlon) / self.cell_deg)
+        all_lons = lon - dlon < -180.0 or lon + dlon > 180.0   # crosses the antimeridian
+        if all_lons or (r1 - r0 + 1) * (c1 - c0 + 1) > len(self.cells):
+            hits = [p for (r, c), p in self.cells.items()
+                    if r0 <= r <= r1 and (all_lons or c0 <= c <= c1)]
+        else:
+            hits = [self.cells[(r, c)] for r in range(r0, r1 + 1) for c in range(c0, c1 + 1)
+                    if (r, c) in self.cells]
+        if not hits:
+            return []
+        pos = np.concatenate(hits)
+        d = haversine_km(lat, lon, self.lats[pos], self.lons[pos])
+        keep = d <= radius_km
+        pos, d = pos[keep], d[keep]
+        order = np.lexsort((self.ids[pos], d))
+        return [(int(self.ids[pos[i]]), float(d[i])) for i in order]
+
+    def nearest(self, lat: float, lon: float, n: int, max_km: Optional[float] = None) -> List[Tuple[int, float]]:
+        """Up to n (id, distance_km) nearest to (lat, lon), optionally no farther than max_km."""
+        if n <= 0 or not len(self):
+            return []
+        # widen a radius query until it holds n points: the n nearest are then all inside it
+        radius = self.cell_deg * 111.2
+        while True:
+            if max_km is not None:
+                radius = min(radius, max_km)
+            hits = self.within(lat, lon, radius)
+            if len(hits) >= n or radius >= (max_km if max_km is not None else math.pi * EARTH_KM):
+                return hits[:n]
+            radius *= 2
+
+def spread(lats: np.ndarray, lons: np.ndarray, k: int, start: int = 0) -> List[int]:
+    """
+    Greedy farthest-point selection of k positions, starting from `start`: each pick is
+    the point farthest from everything picked so far, so the set covers the area evenly
+    (the classic 2-approximation of k-center). Ties go to the lower position.
+    """
+    n = len(lats)
+    k = min(k, n)
+    if k <= 0:
+        return []
+    picked = [start]
+    dmin = haversine_km(float(lats[start]), float(lons[start]), lats, lons)
+    while len(picked) < k:
+        nxt = int(np.argmax(dmin))
+        if dmin[nxt] <= 0:
+            # only co-located points left: take them in order
+            taken = set(picked)
+            rest = [i for i in range(n) if i not in taken]
+            picked.extend(rest[:k - len(picked)])
+            break
+        picked.append(nxt)
+        dmin = np.minimum(dmin, haversine_km(float(lats[nxt]), float(lons[nxt]), lats, lons))
+    return picked
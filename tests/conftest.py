@@ -0,0 +1,40 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.datasets import SyntheticDataset, synthetic_readings
+from bench.fake_openaq import FakeOpenAQ
+
+# compute_kpis fields that incremental / rolled-up KPIs must reproduce exactly
+EXACT = ("days_total", "days_exceed", "exceed_pct", "mean", "trend_pct_90d")
+
+@pytest.fixture(scope="session")
+def daily():
+    """Cross-sensor daily frame of 20 synthetic sensors, 2015-01-01 … 2017-03-10."""
+    from indicators import cross_sensor_daily
+    return cross_sensor_daily(synthetic_readings(20, 800))
+
+@pytest.fixture
+def fake_api(tmp_path, monkeypatch, request):
+    """
+    A running FakeOpenAQ with data_fetch pointed at it and a fresh sensor-day cache.
+    Parametrize indirectly with a dict of FakeOpenAQ options (e.g. max_page_size).
+    """
+    import data_fetch
+    import sensor_cache
+
+    server = FakeOpenAQ(SyntheticDataset(12, start="2024-01-01", days=730), **getattr(request, "param", {})).start()
+    monkeypatch.setenv("OPENAQ_API_BASE", server.base_url)
+    monkeypatch.setenv("OPENAQ_API_KEY", "test")
+    monkeypatch.setenv("OPENAQ_RATE_PER_MIN", "100000")
+    monkeypatch.setenv("OPENAQ_CACHE_PATH", str(tmp_path / "openaq.sqlite"))
+    for name in ("_env", "_scheduler"):
+        monkeypatch.setattr(data_fetch, name, None)
+    monkeypatch.setattr(data_fetch, "_catalogs", {})
+    monkeypatch.setattr(sensor_cache, "_default", None)
+    yield server
+    server.httpd.shutdown()
@@ -0,0 +1,29 @@
+# tests/test_catalog.py
+import data_fetch
+from catalog import LocationsCatalog
+
+def test_one_download_serves_every_lookup(fake_api):
+    df, err = data_fetch.fetch_city_parameter_daily("SA", "Riyadh", "pm25", "2024-01-01", "2024-03-31")
+    assert err is None
+    assert data_fetch.list_cities("SA", "pm25") == (["Dammam", "Jeddah", "Riyadh"], None)
+    sensors, err = data_fetch.list_sensors_in_city("SA", "jedd", "no2")
+    assert err is None and len(sensors)
+    assert fake_api.requests["/locations"] == 1
+    assert fake_api.requests["/locations/{id}/sensors"] == 0
+
+def test_catalog_expires_after_ttl(fake_api, monkeypatch):
+    data_fetch.get_catalog("SA")
+    data_fetch.get_catalog("sa")
+    assert fake_api.requests["/locations"] == 1
+    monkeypatch.setattr(data_fetch, "CATALOG_TTL", 0)
+    data_fetch.get_catalog("SA")
+    assert fake_api.requests["/locations"] == 2
+
+def test_match_and_lookups(fake_api):
+    catalog = LocationsCatalog(fake_api.dataset.locations())
+    riyadh = [loc["id"] for loc in fake_api.dataset.locations() if loc["locality"] == "Riyadh"]
+    assert [loc["id"] for loc in catalog.match("RIYADH", "pm25")] == riyadh
+    assert [loc["id"] for loc in catalog.match("station 1", "pm25")] == [1, 10, 11, 12]   # by name, API order
+    assert catalog.match("Riyadh", "o3") == []
+    assert catalog.location_of(42)["id"] == 4 and catalog.location_of(99999) is None
+    assert [s["id"] for s in LocationsCatalog.sensors(catalog.location_of(42), "no2")] == [42]
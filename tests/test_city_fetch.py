@@ -0,0 +1,57 @@
+# tests/test_city_fetch.py
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import data_fetch
+import sensor_cache
+
+def _city(**kw):
+    return data_fetch.fetch_city_parameter_daily("SA", "Riyadh", "pm25", "2024-01-01", "2024-06-30", **kw)
+
+@pytest.mark.parametrize("fake_api", [{"latency": 0.05}], indirect=True)
+def test_sensors_are_fetched_concurrently(fake_api, monkeypatch):
+    active, peak, lock = [0], [0], threading.Lock()
+    fetch = data_fetch.fetch_daily_for_sensor
+
+    def tracked(*args, **kw):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        try:
+            time.sleep(0.05)
+            return fetch(*args, **kw)
+        finally:
+            with lock:
+                active[0] -= 1
+
+    monkeypatch.setattr(data_fetch, "fetch_daily_for_sensor", tracked)
+    df, err = _city(max_sensors=4, max_workers=4)
+    assert err is None and df["sensor_id"].nunique() == 4
+    assert peak[0] > 1
+
+    peak[0] = 0
+    _city(max_sensors=4, max_workers=1)
+    assert peak[0] == 1
+
+def test_pool_picks_the_serial_sensors(fake_api):
+    serial, err = _city(max_sensors=3, max_workers=1)
+    assert err is None
+    pooled, err = _city(max_sensors=3, max_workers=8)
+    assert err is None
+    pd.testing.assert_frame_equal(pooled, serial)
+    assert serial["sensor_id"].nunique() == 3
+
+def test_failed_sensor_is_replaced_by_the_next_candidate(fake_api, monkeypatch):
+    picked = _city(max_sensors=3)[0]["sensor_id"].unique().tolist()
+    remote = data_fetch._fetch_daily_remote
+    monkeypatch.setattr(data_fetch, "_fetch_daily_remote", lambda sid, *a: (data_fetch._empty_df(), "HTTP 500")
+                        if sid == picked[0] else remote(sid, *a))
+    monkeypatch.setenv("OPENAQ_CACHE_PATH", "")     # the first fetch cached every sensor
+    monkeypatch.setattr(sensor_cache, "_default", None)
+    df, err = _city(max_sensors=3)
+    assert err is None
+    sensors = df["sensor_id"].unique().tolist()
+    assert picked[0] not in sensors and sensors[:2] == picked[1:] and len(sensors) == 3
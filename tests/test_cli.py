@@ -0,0 +1,17 @@
+# tests/test_cli.py
+import yaml
+
+import main
+
+def _config(tmp_path, city):
+    cfg = {"region": {"city": city, "country": "SA"}, "period": {"start": "2024-01-01", "end": "2024-03-31"},
+           "air": {"parameter": "pm25", "who_24h_guideline": 15.0}, "output": {"report_name": f"{city}_pm25"}}
+    path = tmp_path / f"{city}.yaml"
+    path.write_text(yaml.safe_dump(cfg))
+    return str(path)
+
+def test_single_report_exit_status(fake_api, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert main.cli([_config(tmp_path, "Riyadh")]) == 0
+    assert (tmp_path / "outputs" / "reports" / "Riyadh_pm25.md").exists()
+    assert main.cli([_config(tmp_path, "Atlantis")]) == 1
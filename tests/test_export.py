@@ -0,0 +1,72 @@
+# tests/test_export.py
+import gzip
+import importlib.util
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from export import export_report, kpi_frame, write_table
+
+def _raw():
+    return pd.DataFrame({
+        "datetime": pd.date_range("2024-01-01", periods=6, freq="D", tz="UTC"),
+        "value": [12.5, np.nan, 30.0, 8.25, np.nan, 41.0],
+        "unit": pd.Categorical(["µg/m³", "µg/m³", "ppm", "µg/m³", "ppm", "µg/m³"]),
+        "sensor_id": np.array([101, 101, 102, 102, 103, 103], dtype="int32"),
+    })
+
+def _daily():
+    return pd.DataFrame({"date": pd.date_range("2024-01-01", periods=4, freq="D").date,
+                         "mean": [10.0, np.nan, 22.5, 16.0], "n": np.array([3, 0, 2, 3], dtype="int64")})
+
+needs_pyarrow = pytest.mark.skipif(importlib.util.find_spec("pyarrow") is None, reason="pyarrow not installed")
+
+READERS = {
+    "parquet": pd.read_parquet,
+    "arrow": pd.read_feather,
+}
+
+@needs_pyarrow
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_binary_formats_keep_dtypes_and_nan(tmp_path, fmt):
+    paths = export_report(tmp_path, "r", fmt, _daily(), raw=_raw(), kpis=kpi_frame({"mean": None, "p95": 3.5}, city="X"))
+    raw = READERS[fmt](paths["raw"])
+    assert str(raw["datetime"].dtype) == "datetime64[ns, UTC]" and raw["sensor_id"].dtype == "int32"
+    assert raw["unit"].tolist() == _raw()["unit"].astype(str).tolist()   # categories come back as plain strings
+    pd.testing.assert_series_equal(raw["value"], _raw()["value"])
+    daily = READERS[fmt](paths["daily"])
+    assert daily["date"].tolist() == _daily()["date"].tolist() and daily["n"].dtype == "int64"
+    assert np.isnan(daily["mean"][1]) and np.isnan(READERS[fmt](paths["kpis"])["mean"][0])
+
+@pytest.mark.parametrize("compression, opener", [(None, open), ("gzip", gzip.open)])
+def test_csv_round_trip(tmp_path, compression, opener):
+    paths = export_report(tmp_path, "r", "csv", _daily(), raw=_raw(), compression=compression)
+    assert paths["raw"].endswith(".csv.gz" if compression else ".csv")
+    with opener(paths["raw"], "rb") as f:
+        raw = pd.read_csv(f, parse_dates=["datetime"])
+    pd.testing.assert_series_equal(raw["value"], _raw()["value"])
+    assert raw["unit"].tolist() == _raw()["unit"].astype(str).tolist()
+    assert raw["datetime"].tolist() == _raw()["datetime"].tolist()
+    assert raw["sensor_id"].tolist() == _raw()["sensor_id"].tolist()
+
+def test_unknown_csv_compression_is_refused(tmp_path):
+    with pytest.raises(ValueError, match="compression"):
+        write_table(_daily(), tmp_path / "d.csv", compression="zstd")
+
+@needs_pyarrow
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_column_null_in_the_first_chunk(tmp_path, fmt):
+    df = pd.DataFrame({"sensor_id": range(10), "note": [None] * 4 + [f"n{i}" for i in range(4, 10)],
+                       "unit": pd.Categorical(["ppm"] * 10)})
+    path = tmp_path / f"t.{fmt}"
+    assert write_table(df, path, fmt, chunk_rows=2) == 10
+    back = READERS[fmt](path)
+    assert back["note"].tolist() == df["note"].tolist()
+    assert back["unit"].tolist() == ["ppm"] * 10
+
+@needs_pyarrow
+def test_column_null_everywhere_stays_null(tmp_path):
+    df = pd.DataFrame({"a": [1, 2, 3], "b": [None, None, None]})
+    write_table(df, tmp_path / "t.parquet", chunk_rows=1)
+    assert pd.read_parquet(tmp_path / "t.parquet")["b"].isna().all()
@@ -0,0 +1,49 @@
+# tests/test_hourly.py
+from datetime import date
+
+import pandas as pd
+
+import data_fetch
+from indicators import cross_sensor_daily
+
+def _picked(n):
+    locs, _ = data_fetch.fetch_locations_by_city("SA", "Riyadh", "pm25", spread=n)
+    return [sid for _, sid in data_fetch._sensor_candidates(locs, "pm25", interleave=True)]
+
+def _expected(dataset, sensor_ids, min_hours):
+    """Per-sensor daily means of the complete days, then combined across sensors."""
+    frames = []
+    for sid in sensor_ids:
+        h = pd.DataFrame([(r["period"]["datetimeFrom"]["utc"], r["value"])
+                          for r in dataset.hours_results(sid, date(2024, 1, 1), date(2024, 3, 31))],
+                         columns=["datetime", "value"])
+        h["datetime"] = pd.to_datetime(h["datetime"], utc=True)
+        day = h["datetime"].dt.floor("D")
+        g = h.groupby(day)["value"]
+        ok = g.size() >= min_hours      # one reading per hour in the fake data
+        frames.append(pd.DataFrame({"datetime": g.mean()[ok].index, "value": g.mean()[ok].to_numpy(), "sensor_id": sid}))
+    return cross_sensor_daily(pd.concat(frames, ignore_index=True))
+
+def test_hourly_city_daily_is_per_sensor_then_cross_sensor(fake_api):
+    daily, err = data_fetch.fetch_city_parameter_hourly("SA", "Riyadh", "pm25", "2024-01-01", "2024-03-31",
+                                                        max_sensors=3, min_hours=18)
+    assert err is None
+    expected = _expected(fake_api.dataset, _picked(3)[:3], 18)
+    pd.testing.assert_frame_equal(daily, expected)
+    assert daily["n"].max() == 3 and {"min", "max", "coverage"} <= set(daily.columns)
+
+def test_hourly_skips_a_failing_sensor(fake_api, monkeypatch):
+    picked = _picked(3)
+    stream = data_fetch.iter_hourly_for_sensor
+
+    def flaky(sensor_id, *args, **kw):
+        for i, frame in enumerate(stream(sensor_id, *args, **kw)):
+            if sensor_id == picked[0] and i == 1:
+                raise data_fetch.OpenAQError("HTTP 500")   # fails mid-stream
+            yield frame
+
+    monkeypatch.setattr(data_fetch, "iter_hourly_for_sensor", flaky)
+    daily, err = data_fetch.fetch_city_parameter_hourly("SA", "Riyadh", "pm25", "2024-01-01", "2024-03-31",
+                                                        max_sensors=3, min_hours=18)
+    assert err is None
+    pd.testing.assert_frame_equal(daily, _expected(fake_api.dataset, picked[1:4], 18))
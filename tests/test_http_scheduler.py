@@ -0,0 +1,65 @@
+# tests/test_http_scheduler.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from http_scheduler import RequestScheduler, TokenBucket
+
+def _scheduler(**kw):
+    session = requests.Session()
+    return RequestScheduler(lambda: session, rate_per_min=60_000, backoff_base=0.001, **kw)
+
+def _locations(server):
+    return f"{server.base_url}/locations"
+
+@pytest.mark.parametrize("fake_api", [{"rate_limit_every": 2}], indirect=True)
+def test_429_is_retried_after_retry_after(fake_api):
+    sched = _scheduler()
+    t0 = time.monotonic()
+    statuses = [sched.get(_locations(fake_api), {"page": p}).status_code for p in (1, 2, 3)]
+    assert statuses == [200, 200, 200]
+    assert fake_api.statuses == {200: 3, 429: 2}
+    assert time.monotonic() - t0 >= 2.0          # Retry-After: 1 on each 429, despite the ~0 backoff
+
+@pytest.mark.parametrize("fake_api", [{"fail_every": 2}], indirect=True)
+def test_5xx_is_retried_with_backoff(fake_api):
+    sched = _scheduler()
+    assert [sched.get(_locations(fake_api), {"page": p}).status_code for p in (1, 2, 3)] == [200, 200, 200]
+    assert fake_api.statuses == {200: 3, 503: 2}
+
+@pytest.mark.parametrize("fake_api", [{"fail_every": 1}], indirect=True)
+def test_final_response_is_returned_after_max_retries(fake_api):
+    resp = _scheduler(max_retries=2).get(_locations(fake_api))
+    assert resp.status_code == 503
+    assert fake_api.statuses == {503: 3}
+
+@pytest.mark.parametrize("fake_api", [{"latency": 0.3}], indirect=True)
+def test_identical_concurrent_gets_are_coalesced(fake_api):
+    sched = _scheduler()
+    barrier = threading.Barrier(6)
+
+    def get(params):
+        barrier.wait()
+        return sched.get(_locations(fake_api), params)
+
+    with ThreadPoolExecutor(6) as pool:
+        responses = list(pool.map(get, [{"page": 1}] * 5 + [{"page": 2}]))
+    assert fake_api.requests["/locations"] == 2            # five identical GETs share one request
+    assert len({id(r) for r in responses[:5]}) == 1 and responses[5] is not responses[0]
+
+def test_bucket_pauses_when_the_server_says_none_are_left():
+    bucket = TokenBucket(rate=1000.0, capacity=10)
+    bucket.update_from_headers({"x-ratelimit-remaining": "0", "x-ratelimit-reset": "0.3"})
+    t0 = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - t0 >= 0.25
+
+def test_bucket_paces_to_its_rate():
+    bucket = TokenBucket(rate=20.0, capacity=1)
+    t0 = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - t0 >= 0.19       # one burst token, then 4 at 20/s
@@ -0,0 +1,19 @@
+# tests/test_import_budget.py
+import subprocess
+import sys
+
+from bench import import_budget
+
+def test_entry_points_stay_within_their_import_budget():
+    proc = subprocess.run([sys.executable, "-m", "bench.import_budget"], cwd=import_budget.ROOT,
+                          capture_output=True, text=True)
+    lines = {line.split()[0]: line for line in proc.stdout.splitlines() if line.strip()}
+    assert set(lines) == set(import_budget.BUDGETS), proc.stdout + proc.stderr
+    for module, line in lines.items():
+        assert "loads" not in line and "OVER BUDGET" not in line, line
+    assert proc.returncode == 0
+
+def test_a_forbidden_import_fails_the_check(monkeypatch, capsys):
+    monkeypatch.setattr(import_budget, "BUDGETS", {"plotting": (60.0, ("matplotlib",))})
+    assert not import_budget.check(repeats=1)
+    assert "loads matplotlib" in capsys.readouterr().out
@@ -0,0 +1,53 @@
+# tests/test_indicators.py
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicators import compute_kpis, compute_kpis_many
+
+FIELDS = ("days_total", "days_exceed", "exceed_pct", "mean", "median", "p95", "trend_pct_90d")
+# lengths around compute_kpis' edges: < 30 rows (no rolling mean), 180 / 181 (trend needs > 180)
+LENGTHS = {"Abha": 20, "Dammam": 180, "Jeddah": 181, "Mecca": 400, "Riyadh": 730}
+
+@pytest.fixture(scope="module")
+def long_daily():
+    rng = np.random.default_rng(7)
+    frames = []
+    for city, n in LENGTHS.items():
+        for parameter, level in (("pm25", 20.0), ("no2", 30.0)):
+            mean = level + 8 * rng.standard_normal(n)
+            if n > 365:
+                mean[rng.random(n) < 0.05] = np.nan              # days without data
+            frames.append(pd.DataFrame({"city": city, "parameter": parameter,
+                                        "date": pd.date_range("2023-01-01", periods=n, freq="D").date,
+                                        "mean": mean, "median": mean + rng.normal(0, 1, n)}))
+    return pd.concat(frames, ignore_index=True).sample(frac=1.0, random_state=3)   # rows in no order
+
+def _same(row, want):
+    for k in FIELDS:
+        got = row[k]
+        if want[k] is None:
+            assert isinstance(got, float) and math.isnan(got), k
+        else:
+            assert got == want[k], k
+
+def test_many_matches_compute_kpis_long(long_daily):
+    who = {"pm25": 15.0, "no2": 25.0}
+    out = compute_kpis_many(long_daily, who)
+    assert len(out) == 2 * len(LENGTHS)
+    trend = out.groupby("city")["trend_pct_90d"].apply(lambda t: t.notna().all())
+    assert not trend["Dammam"] and trend["Jeddah"] and trend["Riyadh"]
+    for _, row in out.iterrows():
+        one = long_daily[(long_daily["city"] == row["city"]) & (long_daily["parameter"] == row["parameter"])]
+        _same(row, compute_kpis(one, who[row["parameter"]]))
+
+def test_many_matches_compute_kpis_wide(long_daily):
+    pm25 = long_daily[long_daily["parameter"] == "pm25"]
+    wide = pm25.pivot(index="date", columns="city", values="mean")
+    out = compute_kpis_many(wide, 15.0)
+    assert out["city"].tolist() == sorted(LENGTHS)
+    for _, row in out.iterrows():
+        one = pm25[pm25["city"] == row["city"]].assign(median=lambda d: d["mean"])   # wide: means stand in
+        _same(row, compute_kpis(one, 15.0))
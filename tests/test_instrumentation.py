@@ -0,0 +1,54 @@
+# tests/test_instrumentation.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+import data_fetch
+import instrumentation
+import main
+
+def test_concurrent_collectors_only_see_their_own_events():
+    seen = {}
+    barrier = threading.Barrier(2)
+
+    def run(name, n):
+        with instrumentation.collect() as m:
+            barrier.wait()
+            for _ in range(n):
+                instrumentation.record_http(f"/{name}", 200, 0.01, 10)
+            barrier.wait()
+        seen[name] = m.to_dict()["http"]
+
+    threads = [threading.Thread(target=run, args=(name, n)) for name, n in (("a", 3), ("b", 5))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert seen == {"a": {"/a": {"count": 3, "seconds": 0.03, "bytes": 30, "status": {"200": 3}}},
+                    "b": {"/b": {"count": 5, "seconds": 0.05, "bytes": 50, "status": {"200": 5}}}}
+
+def test_propagate_reports_worker_threads_into_caller():
+    with instrumentation.collect() as outer, instrumentation.collect() as inner:
+        with ThreadPoolExecutor(4) as pool:
+            list(pool.map(instrumentation.propagate(lambda i: instrumentation.record_cache("c", i % 2 == 0)), range(10)))
+            list(pool.map(lambda i: instrumentation.record_cache("c", True), range(10)))   # not propagated
+    assert outer.cache == inner.cache == {"c": {"hits": 5, "misses": 5}}
+
+def test_city_fetch_counts_every_request(fake_api):
+    with instrumentation.collect() as m:
+        df, err = data_fetch.fetch_city_parameter_daily("SA", "Riyadh", "pm25", "2024-01-01", "2024-12-31")
+    assert err is None
+    http = m.to_dict()["http"]
+    assert {k: v["count"] for k, v in http.items()} == dict(fake_api.requests)
+
+def test_batch_manifest_has_per_report_http(fake_api, tmp_path):
+    cfg = {"period": {"start": "2024-01-01", "end": "2024-06-30"}, "guidelines": {"pm25": 15.0},
+           "parameters": ["pm25"], "cities": [{"city": "Riyadh", "country": "SA"}, {"city": "Jeddah", "country": "SA"}],
+           "output": {"dir": str(tmp_path / "out"), "workers": 1}}
+    (tmp_path / "batch.yaml").write_text(yaml.safe_dump(cfg))
+    manifest = main.run_batch(str(tmp_path / "batch.yaml"), metrics_path=str(tmp_path / "m.jsonl"))
+    assert manifest["ok"] == 2
+    per_report = [r["metrics"]["http"]["/sensors/{id}/days"]["count"] for r in manifest["reports"]]
+    assert all(per_report) and sum(per_report) == manifest["metrics"]["http"]["/sensors/{id}/days"]["count"]
+    assert all("render" in r["metrics"]["stages"] and "fetch" in r["metrics"]["stages"] for r in manifest["reports"])
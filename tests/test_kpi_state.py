@@ -0,0 +1,40 @@
+# tests/test_kpi_state.py
+import pytest
+
+from conftest import EXACT
+from indicators import compute_kpis
+from kpi_state import KpiState
+from refresh import advance_state
+
+def _assert_close(got, want, alpha=0.005):
+    for k in EXACT:
+        assert got[k] == pytest.approx(want[k], abs=0.011), k
+    for k in ("median", "p95"):
+        assert got[k] == pytest.approx(want[k], rel=alpha, abs=0.011), k
+
+def test_state_agrees_with_compute_kpis(daily):
+    _assert_close(KpiState.from_daily(daily, 15.0).kpis(), compute_kpis(daily, 15.0))
+
+def test_incremental_updates_and_json_round_trip(daily):
+    state = KpiState.from_daily(daily.iloc[:500], 15.0)
+    state = KpiState.from_json(state.to_json())
+    assert state.update(daily.iloc[400:650]) == 150          # overlap is ignored
+    assert state.update(daily.iloc[650:]) == len(daily) - 650
+    _assert_close(state.kpis(), compute_kpis(daily, 15.0))
+
+def test_saved_state_continues_up_to_settled_days(daily):
+    settled = str(daily["date"].iloc[-3])
+    saved = advance_state(None, daily.iloc[:-30], 15.0, settled)
+    saved = advance_state(saved, daily, 15.0, settled)
+    _assert_close(KpiState.from_dict(saved).kpis(), compute_kpis(daily.iloc[:-2], 15.0))
+    assert saved["last_date"] == settled and saved["days_total"] == len(daily) - 2
+
+def test_saved_state_is_rebuilt_when_history_changes(daily):
+    settled = str(daily["date"].iloc[-1])
+    saved = advance_state(None, daily, 15.0, settled)
+    revised = daily.copy()
+    revised.loc[10, "mean"] += 100.0
+    _assert_close(KpiState.from_dict(advance_state(saved, revised, 15.0, settled)).kpis(),
+                  compute_kpis(revised, 15.0))
+    rethreshold = KpiState.from_dict(advance_state(saved, daily, 25.0, settled))      # threshold changed
+    _assert_close(rethreshold.kpis(), compute_kpis(daily, 25.0))
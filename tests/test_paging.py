@@ -0,0 +1,41 @@
+# tests/test_paging.py
+from datetime import date
+
+import pytest
+
+import data_fetch
+
+@pytest.mark.parametrize("fake_api", [{"max_page_size": 100}], indirect=True)
+def test_server_capped_pages_are_all_fetched(fake_api):
+    df, err = data_fetch.fetch_daily_for_sensor(100, "2024-01-01", "2025-06-30")
+    assert err is None
+    expected = fake_api.dataset.days_results(100, date(2024, 1, 1), date(2025, 6, 30))
+    assert len(df) == len(expected) > 100
+    assert fake_api.requests["/sensors/{id}/days"] == -(-len(expected) // 100)
+
+@pytest.mark.parametrize("fake_api", [{"max_page_size": 100}], indirect=True)
+def test_cached_range_holds_every_page(fake_api):
+    data_fetch.fetch_daily_for_sensor(100, "2024-01-01", "2025-06-30")
+    fake_api.reset_counters()
+    df, err = data_fetch.fetch_daily_for_sensor(100, "2024-01-01", "2025-06-30")
+    assert err is None and len(df) > 100
+    assert fake_api.requests["/sensors/{id}/days"] == 0
+
+def _sensor_range(dataset, n_rows):
+    """A range of sensor 100 with exactly n_rows daily results."""
+    rows = dataset.days_results(100, date(2024, 1, 1), date(2025, 12, 31))
+    return "2024-01-01", rows[n_rows - 1]["period"]["datetimeFrom"]["utc"][:10]
+
+@pytest.mark.parametrize("prefetch", [True, False])
+def test_found_ends_paging_without_an_empty_page(fake_api, prefetch):
+    first, last = _sensor_range(fake_api.dataset, 300)
+    params = {"datetime_from": f"{first}T00:00:00Z", "datetime_to": f"{last}T23:59:59Z"}
+    pages = list(data_fetch.iter_pages("/sensors/100/days", params, limit=100, prefetch=prefetch))
+    assert [len(p) for p in pages] == [100, 100, 100]
+    assert fake_api.requests["/sensors/{id}/days"] == 3
+
+def test_prefetch_yields_the_same_pages_in_order(fake_api):
+    params = {"datetime_from": "2024-01-01T00:00:00Z", "datetime_to": "2025-06-30T23:59:59Z"}
+    eager = list(data_fetch.iter_pages("/sensors/100/days", params, limit=50, prefetch=True))
+    lazy = list(data_fetch.iter_pages("/sensors/100/days", params, limit=50, prefetch=False))
+    assert eager == lazy and len(eager) > 2
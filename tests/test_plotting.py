@@ -0,0 +1,52 @@
+# tests/test_plotting.py
+import numpy as np
+import pandas as pd
+import pytest
+
+import instrumentation
+import plotting
+
+def test_lttb_keeps_endpoints_and_size():
+    x = np.arange(5000, dtype="float64")
+    y = np.sin(x / 50.0) + np.random.default_rng(1).normal(0, 0.1, len(x))
+    idx = plotting.lttb(x, y, 300)
+    assert len(idx) == 300 and idx[0] == 0 and idx[-1] == len(x) - 1
+    assert (np.diff(idx) > 0).all()
+    assert plotting.lttb(x[:300], y[:300], 300).tolist() == list(range(300))     # at or below n_out: all points
+
+def _series(n, gaps):
+    dates = pd.date_range("2015-01-01", periods=n, freq="D")
+    values = 20 + 5 * np.sin(np.arange(n) / 30.0)
+    values[gaps] = np.nan
+    return dates, values
+
+def test_short_series_keep_nan_gaps():
+    dates, values = _series(400, slice(100, 110))
+    x, y = plotting._xy(dates, values)
+    assert len(x) == 400 and np.isnan(y[100:110]).all() and not np.isnan(y[:100]).any()
+
+def test_downsampled_series_still_break_at_gaps():
+    dates, values = _series(4000, slice(2000, 2030))
+    x, y = plotting._xy(dates, values)
+    assert len(x) <= plotting.MAX_POINTS + 1
+    gap = np.flatnonzero(np.isnan(y))
+    assert len(gap) == 1
+    assert x[gap[0] - 1] < dates[2000] <= x[gap[0]] < x[gap[0] + 1] == dates[2030]
+    assert x[0] == dates[0] and x[-1] == dates[-1]
+
+@pytest.fixture
+def daily():
+    dates, values = _series(200, slice(50, 55))
+    return pd.DataFrame({"date": dates.date, "mean": values})
+
+def test_render_png_cache_hit_miss_and_eviction(daily, monkeypatch):
+    monkeypatch.setattr(plotting, "_png_cache", type(plotting._png_cache)())
+    monkeypatch.setattr(plotting, "PNG_CACHE_SIZE", 2)
+    with instrumentation.collect() as m:
+        first = plotting.render_png("timeseries", daily, "a", who_guideline=15.0)
+        assert plotting.render_png("timeseries", daily, "a", who_guideline=15.0) is first     # hit
+        plotting.render_png("timeseries", daily.assign(mean=daily["mean"] + 1), "a", who_guideline=15.0)   # new data
+        plotting.render_png("rolling", daily, "a", window=30)                                  # evicts "first"
+        assert plotting.render_png("timeseries", daily, "a", who_guideline=15.0) == first      # redrawn
+    assert m.cache["png"] == {"hits": 1, "misses": 4}
+    assert first[:8] == b"\x89PNG\r\n\x1a\n"
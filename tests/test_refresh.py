@@ -0,0 +1,65 @@
+# tests/test_refresh.py
+import json
+import re
+
+import yaml
+
+import main
+
+def _batch_config(tmp_path, out, **period):
+    cfg = {"period": {"start": "2024-01-01", "end": "2025-06-30", **period}, "guidelines": {"pm25": 15.0},
+           "parameters": ["pm25"], "cities": [{"city": "Riyadh", "country": "SA"}, {"city": "Jeddah", "country": "SA"}],
+           "output": {"dir": str(tmp_path / out), "workers": 1}}
+    path = tmp_path / f"{out}.yaml"
+    path.write_text(yaml.safe_dump(cfg))
+    return str(path)
+
+def _artifact(path):
+    """File bytes with the report's "Generated on" minute masked (the two runs may straddle one)."""
+    return re.sub(rb"Generated on: [^\r\n]*", b"Generated on: -", path.read_bytes())
+
+def test_refresh_publishes_the_batch_kpis_and_reports(fake_api, tmp_path):
+    batch = main.run_batch(_batch_config(tmp_path, "batch"))
+    main.run_refresh(_batch_config(tmp_path, "refresh"))
+    state = json.loads((tmp_path / "refresh" / "refresh_state.json").read_text(encoding="utf-8"))
+    for report in batch["reports"]:
+        name = report["report_name"]
+        assert state[name]["kpis"] == report["kpis"]
+        for artifact in ("reports/{}.md", "reports/{}_daily.csv"):
+            rel = artifact.format(name)
+            assert _artifact(tmp_path / "refresh" / rel) == _artifact(tmp_path / "batch" / rel), rel
+
+def _stages(summary):
+    return {r["report_name"]: (r["status"], r.get("stages")) for r in summary["reports"]}
+
+def test_unchanged_jobs_make_no_requests_and_rebuild_nothing(fake_api, tmp_path):
+    cfg = _batch_config(tmp_path, "out")
+    assert main.run_refresh(cfg)["refreshed"] == 2
+    fake_api.reset_counters()
+    summary = main.run_refresh(cfg)
+    assert summary["unchanged"] == 2 and summary["refreshed"] == 0
+    assert sum(fake_api.requests.values()) == 0
+
+def test_changed_threshold_rebuilds_only_what_uses_it(fake_api, tmp_path):
+    main.run_refresh(_batch_config(tmp_path, "out"))
+    cfg = yaml.safe_load((tmp_path / "out.yaml").read_text())
+    cfg["guidelines"]["pm25"] = 25.0
+    (tmp_path / "out.yaml").write_text(yaml.safe_dump(cfg))
+    stages = _stages(main.run_refresh(str(tmp_path / "out.yaml")))
+    assert list(stages.values()) == [("refreshed", ["timeseries", "report"])] * 2
+
+def test_new_data_rebuilds_every_stage(fake_api, tmp_path):
+    main.run_refresh(_batch_config(tmp_path, "out", end="2025-03-31"))
+    summary = main.run_refresh(_batch_config(tmp_path, "out", end="2025-06-30"))
+    assert summary["refreshed"] == 2
+    assert all(s == ["daily", "timeseries", "rolling", "report"] for _, s in _stages(summary).values())
+
+def test_missing_artifact_is_rebuilt(fake_api, tmp_path):
+    cfg = _batch_config(tmp_path, "out")
+    first = main.run_refresh(cfg)
+    name = first["reports"][0]["report_name"]
+    chart = tmp_path / "out" / "charts" / f"{name}_rolling30.png"
+    chart.unlink()
+    stages = _stages(main.run_refresh(cfg))
+    assert stages[name] == ("refreshed", ["rolling"]) and chart.exists()
+    assert [s for n, s in stages.items() if n != name] == [("unchanged", [])]
@@ -0,0 +1,36 @@
+# tests/test_report_builder.py
+import datetime as dt
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import report_builder
+
+GOLDEN = Path(__file__).parent / "golden"
+ROOT = Path(__file__).parent.parent
+KPIS = {"days_total": 365, "days_exceed": 120, "exceed_pct": 32.88, "mean": 24.5, "median": 23.1,
+        "p95": 41.2, "trend_pct_90d": -3.5}
+
+class _Fixed(dt.datetime):
+    @classmethod
+    def utcnow(cls):
+        return cls(2025, 1, 2, 3, 4)
+
+@pytest.mark.parametrize("golden, include_images", [("brief_images.md", True), ("brief_app.md", False)])
+def test_briefs_match_the_original_templates(monkeypatch, golden, include_images):
+    """Golden files were rendered by the single-template report_builder these briefs replaced."""
+    monkeypatch.setattr(report_builder, "datetime", _Fixed)
+    md = report_builder.render_markdown("Riyadh", "pm25", "2024-01-01", "2024-12-31", KPIS, 15.0, "Riyadh_pm25",
+                                        window=30, include_images=include_images)
+    assert md == (GOLDEN / golden).read_text(encoding="utf-8")
+
+def test_import_has_no_side_effects_and_cache_dir_is_resolved_on_render(tmp_path):
+    code = ("import os, sys; import report_builder as rb; "
+            "assert 'dotenv' not in sys.modules and not os.path.exists('.cache'); "
+            "rb.render_markdown('A', 'pm25', 's', 'e', {}, 15.0, 'n'); "
+            "assert os.listdir('tpl') and not os.path.exists('.cache')")
+    env = dict(os.environ, PYTHONPATH=str(ROOT), REPORT_TEMPLATE_CACHE="tpl")
+    subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env, check=True)
@@ -0,0 +1,84 @@
+# tests/test_report_service.py
+import threading
+import time
+
+import pytest
+import requests
+
+from report_service import ReportService, make_server
+
+SPEC = {"city": "Riyadh", "country": "SA", "parameter": "pm25", "start": "2024-01-01", "end": "2024-03-31", "who": 15}
+
+@pytest.fixture
+def serve():
+    """serve(service) → base URL of a running report server; stopped after the test."""
+    servers = []
+
+    def start(service):
+        httpd = make_server(service, port=0)
+        servers.append(httpd)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{httpd.server_address[1]}"
+
+    yield start
+    for httpd in servers:
+        httpd.shutdown()
+        httpd.server_close()
+
+def _wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+@pytest.mark.parametrize("fake_api", [{"latency": 0.05}], indirect=True)
+def test_identical_in_flight_jobs_run_once(fake_api, serve):
+    service = ReportService(workers=2)
+    url = serve(service)
+    first = requests.post(f"{url}/reports", json=SPEC)
+    again = requests.post(f"{url}/reports", json=dict(SPEC, country="sa", who="15.0"))   # same job, spelled differently
+    assert first.status_code == again.status_code == 202
+    assert first.json()["id"] == again.json()["id"]
+    job = service.get(first.json()["id"])
+    assert job.done.wait(30) and job.status == "done"
+    assert service.stats()["counters"]["deduplicated"] == 1
+    assert fake_api.requests["/locations"] == 1
+
+@pytest.mark.parametrize("fake_api", [{"latency": 0.05}], indirect=True)
+def test_full_queue_answers_503_with_retry_after(fake_api, serve):
+    service = ReportService(workers=1, max_queue=1)
+    url = serve(service)
+    running = requests.post(f"{url}/reports", json=SPEC).json()
+    _wait_for(lambda: service.get(running["id"]).status != "queued")
+    assert requests.post(f"{url}/reports", json=dict(SPEC, city="Jeddah")).status_code == 202
+    full = requests.post(f"{url}/reports", json=dict(SPEC, city="Dammam"))
+    assert full.status_code == 503 and full.headers["Retry-After"] == "5"
+    assert service.stats()["counters"]["rejected"] == 1
+
+@pytest.mark.parametrize("ttl, cached", [(3600.0, True), (0.0, False)])
+def test_finished_results_are_reused_within_their_ttl(fake_api, serve, ttl, cached):
+    url = serve(ReportService(workers=1, result_ttl=ttl))
+    first = requests.post(f"{url}/reports", json=dict(SPEC, wait=True))
+    assert first.status_code == 200 and first.json()["status"] == "done"
+    again = requests.post(f"{url}/reports", json=SPEC).json()
+    assert (again["id"] == first.json()["id"]) is cached
+    counters = requests.get(f"{url}/stats").json()["counters"]
+    assert counters["cached"] == int(cached)
+    png = requests.get(f"{url}/reports/{first.json()['id']}/timeseries.png")
+    assert png.status_code == 200 and png.content.startswith(b"\x89PNG")
+
+@pytest.mark.parametrize("change", [
+    {"city": None},                     # missing field (dropped below)
+    {"start": "2024-13-01"},
+    {"end": "31/03/2024"},
+    {"start": "2024-04-01"},            # after end
+    {"who": "fifteen"},
+])
+def test_malformed_jobs_are_rejected_with_400(serve, change):
+    service = ReportService(workers=1)
+    url = serve(service)
+    spec = {k: v for k, v in dict(SPEC, **change).items() if v is not None}
+    resp = requests.post(f"{url}/reports", json=spec)
+    assert resp.status_code == 400 and resp.json()["detail"]
+    assert requests.post(f"{url}/reports", data=b"{not json").status_code == 400
+    assert service.stats()["counters"]["submitted"] == 0
@@ -0,0 +1,96 @@
+# tests/test_rollups.py
+import pandas as pd
+import pytest
+import yaml
+
+import data_fetch
+import main
+from conftest import EXACT
+from indicators import compute_kpis, cross_sensor_daily
+from rollups import ROLLUP_FILE, RollupCube
+from sensor_cache import SETTLE_DAYS
+
+@pytest.fixture(scope="module")
+def daily(daily):
+    d = daily.copy()
+    d.loc[d.index % 17 == 0, "mean"] = float("nan")        # days without data
+    return d
+
+@pytest.fixture(scope="module")
+def cube(daily):
+    c = RollupCube(thresholds=(15.0, 25.0))
+    c.update("city", daily.iloc[:400])
+    c.update("city", daily.iloc[350:])                      # overlap is ignored
+    return RollupCube.from_dict(c.to_dict())
+
+def _between(daily, start, end):
+    dates = pd.to_datetime(daily["date"])
+    return daily[(dates >= start) & (dates <= end)]
+
+@pytest.mark.parametrize("start, end", [
+    ("2015-01-01", "2016-12-31"),   # whole years
+    ("2015-02-14", "2016-11-09"),   # mid-month at both ends
+    ("2016-03-05", "2016-03-20"),   # a single partial month
+    ("2016-03-01", "2016-03-20"),   # one month, starting on the 1st
+    ("2015-06-17", "2015-12-31"),   # mid-month start, whole months after
+])
+def test_kpis_match_compute_kpis(cube, daily, start, end):
+    got = cube.kpis("city", start, end, 15.0, daily=daily)
+    want = compute_kpis(_between(daily, start, end), 15.0)
+    for k in EXACT:
+        assert got[k] == want[k], k
+    for k in ("median", "p95"):
+        assert got[k] == pytest.approx(want[k], rel=cube.alpha, abs=0.011), k
+
+def test_trend_needs_more_than_180_rows(cube, daily):
+    rows = _between(daily, "2016-01-01", "2016-12-31").dropna(subset=["mean"])
+    for n in (179, 180, 181, 200):
+        end = pd.Timestamp(rows["date"].iloc[n - 1]).date().isoformat()
+        got = cube.kpis("city", "2016-01-01", end, 25.0, daily=lambda a, b: _between(daily, a, b))
+        want = compute_kpis(_between(daily, "2016-01-01", end), 25.0)
+        assert got["days_total"] == n
+        assert got["trend_pct_90d"] == want["trend_pct_90d"]
+        assert (got["trend_pct_90d"] is None) == (n <= 180)
+
+def test_partial_months_need_daily(cube):
+    assert cube.kpis("city", "2016-01-01", "2016-06-30", 15.0)["trend_pct_90d"] is None
+    with pytest.raises(ValueError):
+        cube.kpis("city", "2016-01-05", "2016-06-30", 15.0)
+
+def test_update_folds_only_settled_days(daily):
+    means = daily.dropna(subset=["mean"])
+    cube = RollupCube()
+    assert cube.update("city", daily, settled=str(means["date"].iloc[-3])) == len(means) - 2
+    assert cube.update("city", daily, settled=str(means["date"].iloc[-3])) == 0
+    assert cube.update("city", daily, settled=str(means["date"].iloc[-1])) == 2
+    whole = RollupCube()
+    whole.update("city", daily, settled=str(means["date"].iloc[-1]))
+    assert cube.to_dict() == whole.to_dict()
+
+def test_update_defaults_to_the_settle_window():
+    today = pd.Timestamp.now(tz="UTC").normalize().tz_localize(None)
+    recent = pd.DataFrame({"date": pd.date_range(end=today, periods=10, freq="D").date, "mean": 20.0})
+    cube = RollupCube()
+    assert cube.update("city", recent) == 10 - SETTLE_DAYS
+    assert cube.last_date["city"] == (today - pd.Timedelta(days=SETTLE_DAYS)).date().isoformat()
+
+def test_refresh_and_leaderboard_keep_one_cube(fake_api, tmp_path):
+    cfg = tmp_path / "batch.yaml"
+    cfg.write_text(yaml.safe_dump({
+        "period": {"start": "2024-01-01", "end": "2024-06-30"}, "guidelines": {"pm25": 15.0},
+        "parameters": ["pm25"], "cities": [{"city": "Riyadh", "country": "SA"}, {"city": "Jeddah", "country": "SA"}],
+        "output": {"dir": str(tmp_path / "out"), "workers": 1}}))
+    main.run_refresh(str(cfg))
+    main.run_leaderboard(str(cfg))
+    out = main.run_leaderboard(str(cfg))            # nothing new: no day is counted twice
+    cube = RollupCube.load(str(tmp_path / "out" / ROLLUP_FILE))
+    assert cube.keys() == ["Jeddah/pm25", "Riyadh/pm25"]
+
+    df, err = data_fetch.fetch_city_parameter_daily("SA", "Riyadh", "pm25", "2024-01-01", "2024-06-30")
+    want = compute_kpis(cross_sensor_daily(df), 15.0)
+    got = cube.kpis("Riyadh/pm25", "2024-01-01", "2024-06-30", 15.0)
+    assert {k: got[k] for k in EXACT[:-1]} == {k: want[k] for k in EXACT[:-1]}
+    seasons = pd.read_csv(out["seasons"])
+    riyadh = seasons[seasons["city"] == "Riyadh"]
+    assert riyadh["period"].tolist() == ["2024-DJF", "2024-MAM", "2024-JJA"]
+    assert riyadh["days"].sum() == want["days_total"] and riyadh["exceed_15"].sum() == want["days_exceed"]
@@ -0,0 +1,51 @@
+# tests/test_series_store.py
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import data_fetch
+from indicators import cross_sensor_daily
+from series_store import SeriesStore
+
+def test_read_daily_matches_cross_sensor_daily(fake_api, tmp_path):
+    df, err = data_fetch.fetch_city_parameter_daily("SA", "Riyadh", "pm25", "2024-01-01", "2024-06-30")
+    assert err is None
+    store = SeriesStore(str(tmp_path / "series"))
+    store.ingest("pm25", df)
+    daily = store.read_daily("pm25", df["sensor_id"].unique(), "2024-01-01", "2024-06-30")
+    pd.testing.assert_frame_equal(daily, cross_sensor_daily(df))
+
+def test_city_fetch_serves_held_days_from_store(fake_api, tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAQ_CACHE_PATH", "")   # no sensor-day cache: repeats can only come from the store
+    store = SeriesStore(str(tmp_path / "series"))
+    first, err = data_fetch.fetch_city_parameter_daily("SA", "Riyadh", "pm25", "2024-01-01", "2024-06-30", store=store)
+    assert err is None
+    plain, _ = data_fetch.fetch_city_parameter_daily("SA", "Riyadh", "pm25", "2024-01-01", "2024-06-30")
+    pd.testing.assert_frame_equal(first, plain)
+
+    fake_api.reset_counters()
+    again, err = data_fetch.fetch_city_parameter_daily("SA", "Riyadh", "pm25", "2024-01-01", "2024-06-30", store=store)
+    assert err is None and fake_api.requests["/sensors/{id}/days"] == 0
+    pd.testing.assert_frame_equal(again, first)
+
+def test_missing_ranges_track_fetched_days(tmp_path):
+    store = SeriesStore(str(tmp_path / "series"))
+    store.write("pm25", 7, [], [], held=("2024-01-01", "2024-01-31"))   # fetched, no values
+    store.write("pm25", 7, ["2024-03-01"], [12.5], "µg/m³", held=("2024-03-01", "2024-03-31"))
+    assert store.missing_ranges("pm25", 7, "2024-01-15", "2024-04-10") == [("2024-02-01", "2024-02-29"),
+                                                                            ("2024-04-01", "2024-04-10")]
+    assert store.read_long("pm25", [7], "2024-01-01", "2024-12-31")["value"].tolist() == [12.5]
+
+def test_overlapping_writers_keep_every_day(tmp_path):
+    store = SeriesStore(str(tmp_path / "series"))
+    days = pd.date_range("2024-01-01", "2024-12-31", freq="D")
+    chunks = [days[i::8] for i in range(8)]         # interleaved: every writer grows and patches the file
+
+    def write(chunk):
+        store.write("pm25", 7, chunk, chunk.dayofyear.astype("float64"), "µg/m³", held=(str(chunk[0].date()), str(chunk[-1].date())))
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(write, chunks[::-1]))
+    got = store.read_long("pm25", [7], "2024-01-01", "2024-12-31")
+    assert got["value"].tolist() == days.dayofyear.astype("float64").tolist()
+    assert store.missing_ranges("pm25", 7, "2024-01-01", "2024-12-31") == []
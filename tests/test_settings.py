@@ -0,0 +1,31 @@
+# tests/test_settings.py
+import os
+
+import dotenv
+
+import settings
+import sensor_cache
+import series_store
+
+def test_paths_set_in_dotenv_are_honoured(monkeypatch):
+    # stands in for a .env file: the values only appear once load_dotenv runs
+    def fake_load_dotenv(*a, **k):
+        os.environ.setdefault("OPENAQ_CACHE_PATH", "from-dotenv.sqlite")
+        os.environ.setdefault("ENVREPORT_STORE", "store-from-dotenv")
+    monkeypatch.delenv("OPENAQ_CACHE_PATH", raising=False)
+    monkeypatch.delenv("ENVREPORT_STORE", raising=False)
+    monkeypatch.setattr(dotenv, "load_dotenv", fake_load_dotenv)
+    monkeypatch.setattr(settings, "_loaded", False)
+    monkeypatch.setattr(sensor_cache, "_default", None)
+    monkeypatch.setattr(sensor_cache.SensorDayCache, "__init__", lambda self, path=None: setattr(self, "path", path))
+    try:
+        assert sensor_cache.default_cache().path == "from-dotenv.sqlite"
+        assert series_store.SeriesStore().root == "store-from-dotenv"
+    finally:
+        os.environ.pop("OPENAQ_CACHE_PATH", None)
+        os.environ.pop("ENVREPORT_STORE", None)
+
+def test_empty_cache_path_disables_cache(monkeypatch):
+    monkeypatch.setenv("OPENAQ_CACHE_PATH", "")
+    monkeypatch.setattr(sensor_cache, "_default", None)
+    assert sensor_cache.default_cache() is None
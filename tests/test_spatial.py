@@ -0,0 +1,95 @@
+# tests/test_spatial.py
+import itertools
+import math
+
+import numpy as np
+import pytest
+
+import main
+from catalog import LocationsCatalog, coordinates
+from spatial import GridIndex, haversine_km, spread
+
+def _points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    lats = np.degrees(np.arcsin(rng.uniform(-1, 1, n)))      # uniform on the sphere, poles included
+    lons = rng.uniform(-180, 180, n)
+    return np.arange(100, 100 + n), lats, lons
+
+def _brute_within(ids, lats, lons, lat, lon, radius_km):
+    d = haversine_km(lat, lon, lats, lons)
+    return sorted((float(d[i]), int(ids[i])) for i in np.flatnonzero(d <= radius_km))
+
+@pytest.mark.parametrize("radius_km", [50, 800, 5000, 25000])
+def test_within_matches_brute_force(radius_km):
+    ids, lats, lons = _points(2000)
+    grid = GridIndex(ids, lats, lons, cell_deg=2.0)
+    for lat, lon in [(24.7, 46.7), (-33.9, 151.2), (89.5, 10.0), (-88.0, -170.0), (10.0, 179.9), (0.0, -179.95)]:
+        got = grid.within(lat, lon, radius_km)
+        want = _brute_within(ids, lats, lons, lat, lon, radius_km)
+        assert [i for i, _ in got] == [i for _, i in want]
+        assert np.allclose([d for _, d in got], [d for d, _ in want])
+
+@pytest.mark.parametrize("n", [1, 7, 60])
+def test_nearest_matches_brute_force(n):
+    ids, lats, lons = _points(3000, seed=1)
+    grid = GridIndex(ids, lats, lons)
+    for lat, lon in [(24.7, 46.7), (70.0, -179.0), (-60.0, 20.0)]:
+        want = _brute_within(ids, lats, lons, lat, lon, math.inf)
+        assert [i for i, _ in grid.nearest(lat, lon, n)] == [i for _, i in want[:n]]
+        capped = [i for d, i in want[:n] if d <= 300]
+        assert [i for i, _ in grid.nearest(lat, lon, n, max_km=300)] == capped
+
+def test_nearest_on_an_empty_grid():
+    assert GridIndex([], [], []).nearest(0.0, 0.0, 5) == []
+
+def _cover_radius(lats, lons, picked):
+    """Farthest any point is from its nearest picked point."""
+    return np.min([haversine_km(float(lats[i]), float(lons[i]), lats, lons) for i in picked], axis=0).max()
+
+def test_spread_is_greedy_farthest_point():
+    _, lats, lons = _points(300, seed=2)
+    picked = spread(lats, lons, 12, start=5)
+    # reference: recompute every distance from scratch at each step
+    want = [5]
+    while len(want) < 12:
+        dmin = [min(haversine_km(float(lats[j]), float(lons[j]), lats[[i]], lons[[i]])[0] for j in want)
+                for i in range(len(lats))]
+        want.append(int(np.argmax(dmin)))
+    assert picked == want
+
+def test_spread_is_within_twice_the_best_cover():
+    _, lats, lons = _points(10, seed=3)
+    best = min(_cover_radius(lats, lons, c) for c in itertools.combinations(range(10), 3))
+    assert _cover_radius(lats, lons, spread(lats, lons, 3)) <= 2 * best + 1e-9
+
+def test_spread_takes_co_located_points_in_order():
+    lats, lons = np.array([1.0, 1.0, 1.0, 2.0]), np.array([1.0, 1.0, 1.0, 2.0])
+    assert spread(lats, lons, 4) == [0, 3, 1, 2]
+    assert spread(lats, lons, 0) == []
+
+def test_catalog_spread_orders_by_coverage(fake_api):
+    locs = fake_api.dataset.locations()
+    blind = dict(locs[3], id=999, coordinates=None)
+    ordered = LocationsCatalog.spread(locs[:3] + [blind] + locs[3:], k=4)
+    assert ordered[-1]["id"] == 999 and len(ordered) == len(locs) + 1
+
+    lats = np.array([coordinates(l)[0] for l in locs])
+    lons = np.array([coordinates(l)[1] for l in locs])
+    start = int(np.argmin(haversine_km(float(lats.mean()), float(lons.mean()), lats, lons)))
+    picked = spread(lats, lons, 4, start=start)
+    assert [l["id"] for l in ordered[:4]] == [locs[i]["id"] for i in picked]
+    assert [l["id"] for l in ordered[4:-1]] == [l["id"] for i, l in enumerate(locs) if i not in picked]
+    assert LocationsCatalog.spread(locs, k=2, start=0)[0]["id"] == locs[0]["id"]
+
+def test_batch_job_near_a_point_uses_the_sensors_around_it(fake_api):
+    anchor = fake_api.dataset.locations()[4]
+    lat, lon = coordinates(anchor)
+    cfg = {"period": {"start": "2024-01-01", "end": "2024-03-31"}, "guidelines": {"pm25": 15.0},
+           "parameters": ["pm25"],
+           "cities": [{"city": "Around 5", "country": "SA", "near": {"lat": lat, "lon": lon, "radius_km": 400}}]}
+    job, = main._jobs_from_batch(cfg)
+    df, err = main.fetch_job(job)
+    assert err is None and len(df)
+    catalog = LocationsCatalog(fake_api.dataset.locations())
+    around = {l["id"] for l, _ in catalog.within(lat, lon, 400, "pm25")}
+    assert set(df["location_id"]) <= around and anchor["id"] in set(df["location_id"])
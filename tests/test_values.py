@@ -0,0 +1,13 @@
+# tests/test_values.py
+from datetime import date
+
+import data_fetch
+
+def test_values_keep_full_precision_through_the_cache(fake_api):
+    expected = [r["value"] for r in fake_api.dataset.days_results(100, date(2024, 1, 1), date(2024, 12, 31))]
+    fresh, err = data_fetch.fetch_daily_for_sensor(100, "2024-01-01", "2024-12-31")
+    assert err is None and fresh["value"].tolist() == expected
+    fake_api.reset_counters()
+    cached, err = data_fetch.fetch_daily_for_sensor(100, "2024-01-01", "2024-12-31")
+    assert fake_api.requests["/sensors/{id}/days"] == 0
+    assert cached["value"].dtype == "float64" and cached["value"].tolist() == expected